@@ -0,0 +1,175 @@
+"""One entry point for the ADC tools, without the input() menus.
+
+    python adc_cli.py eval eval.adcb data/normal/5/adc_normal5_1.data [--config eval_config.json] [--json] [--chunked]
+    python adc_cli.py capture --type sport --cycle 10 [--port replay:eval.adcb] [--no-live] [--no-plot]
+    python adc_cli.py clean adc_test.data
+    python adc_cli.py plot capture.adcb [-o capture.png]
+    python adc_cli.py batch [data_dir] [--config eval_config.json]   # batch_eval.py's options
+    python adc_cli.py jnd [-o jnd.png]
+    python adc_cli.py psychometric report.json [--by mode]   # psychometric.py's options
+
+batch, sweep, rates, replay, serve, store and psychometric hand the rest of the command
+line to the main() of the script they name. Every subcommand imports what it
+needs when it runs, so eval never loads matplotlib, pyserial or scipy and
+starts in a fraction of the time the menu scripts take.
+"""
+import argparse
+import json
+import os
+import sys
+
+ASSESSMENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "performance_assessment")
+
+# subcommand -> (module whose main() takes the remaining arguments, help)
+DELEGATED = {
+    "batch": ("batch_eval", "score the pipeline on every labelled recording"),
+    "sweep": ("param_sweep", "search the pipeline settings"),
+    "rates": ("breath_rate_series", "breath rate over time of one recording"),
+    "replay": ("replay", "feed a recording through the live path"),
+    "serve": ("capture_server", "capture several ports at once"),
+    "store": ("session_store", "inspect, recover or export a session store"),
+    "psychometric": ("psychometric", "psychometric fits and bootstrap intervals of batch reports"),
+}
+
+
+def cmd_eval(args):
+    if args.chunked and args.plot:
+        print("--plot needs the normalised channels, which --chunked does not keep", file=sys.stderr)
+        return 2
+    from breath_pipeline import EVAL_CONFIG, evaluate_file, evaluate_file_chunked, load_eval_config
+    config = args.config if args.config is not None else EVAL_CONFIG
+    settings = load_eval_config(config)
+    if args.window is not None:
+        settings["window_size"] = args.window
+    if args.chunked and settings["decimate"] > 1:
+        print(f"--chunked finds peaks at the full rate, but {config} sets decimate={settings['decimate']}",
+              file=sys.stderr)
+        return 2
+    evaluate = evaluate_file_chunked if args.chunked else evaluate_file
+    rows = []
+    for filename in args.files:
+        result = evaluate(filename, **settings)
+        rows.append({"file": filename, "breaths": result["breaths"], "duration": result["duration"],
+                     "bpm": result["bpm"], "mode": result["mode"], "quality": result["quality"]})
+        if args.plot:
+            _plot_result(filename, result)
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    else:
+        for row in rows:
+            flags = " ".join(row["quality"]["flags"])
+            print(f"{row['file']}: {row['breaths']} breaths in {row['duration']:.1f}s, {row['bpm']:.2f} breaths/minute "
+                  f"[{row['mode']}{': ' + flags if flags else ''}]")
+    return 0
+
+
+def _plot_result(filename, result):
+    import matplotlib.pyplot as plt
+    from live_plot import minmax_downsample
+    peaks = result["peaks"]
+    adc1, adc2 = result["adc1_normalized"], result["adc2_normalized"]
+    marked = adc2 if adc2 is not None else adc1
+    plt.figure(figsize=(12, 6))
+    if adc1 is not None:
+        plt.plot(*minmax_downsample(adc1), label='ADC1 Normalized', color='red')
+    if marked is not None:
+        plt.plot(peaks, marked[peaks], 'go', label='Detected Breaths')
+    if adc2 is not None:
+        plt.plot(*minmax_downsample(adc2), label='ADC2 Normalized', color='blue')
+    plt.legend()
+    plt.title(f"{filename} ({result['mode']})")
+    plt.show()
+
+
+def cmd_capture(args):
+    import adc_data_collection
+    port = args.port or adc_data_collection.SERIAL_PORT
+    adc_data_collection.collect_data(args.type, args.cycle, port, live_plot=not args.no_live, plot=not args.no_plot)
+    return 0
+
+
+def cmd_clean(args):
+    from extract_clean import extract_and_clean
+    for filename in args.files:
+        extract_and_clean(filename)
+    return 0
+
+
+def cmd_plot(args):
+    from live_plot import plot_capture
+    plot_capture(args.file, title=args.title or args.file, output=args.output)
+    return 0
+
+
+def cmd_jnd(args):
+    _assessment_path()
+    import jnd
+    fits = jnd.plot_jnd(jnd.delta, jnd.CONDITIONS, args.output)
+    for (_, name, _, _), popt in zip(jnd.CONDITIONS, fits):
+        print(f"JND {name}: {popt[1]:.2f} bpm")
+    return 0
+
+
+def _assessment_path():
+    # The performance_assessment scripts import each other as siblings
+    if ASSESSMENT_DIR not in sys.path:
+        sys.path.append(ASSESSMENT_DIR)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ADC breathing sensor tools.")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+
+    p = commands.add_parser("eval", help="breath count and rate of recordings, without plots")
+    p.add_argument("files", nargs="+", help="text, binary or session captures")
+    p.add_argument("--config", help="pipeline settings written by param_sweep.py (default: eval_config.json "
+                                     "next to the scripts if it exists, else the built-in settings)")
+    p.add_argument("--window", type=int, help="moving average window in samples, overrides the config")
+    p.add_argument("--json", action="store_true", help="print the results as JSON")
+    p.add_argument("--chunked", action="store_true", help="read the files in chunks of bounded memory (no --plot)")
+    p.add_argument("--plot", action="store_true", help="also plot each result")
+    p.set_defaults(run=cmd_eval)
+
+    p = commands.add_parser("capture", help="record from the board into data/<type>/<cycle>/")
+    p.add_argument("--type", default="normal", choices=["normal", "sport"], help="breath type")
+    p.add_argument("--cycle", type=int, default=5, help="breath cycles in the recording")
+    p.add_argument("--port", help='serial port or "replay:<recording>" (default: SERIAL_PORT)')
+    p.add_argument("--no-live", action="store_true", help="no live view, stop with Ctrl-C")
+    p.add_argument("--no-plot", action="store_true", help="do not plot the capture afterwards")
+    p.set_defaults(run=cmd_capture)
+
+    p = commands.add_parser("clean", help='reduce raw "Ca=... Cb=..." logs to "v1 v2" lines in place')
+    p.add_argument("files", nargs="+")
+    p.set_defaults(run=cmd_clean)
+
+    p = commands.add_parser("plot", help="plot both raw channels of a capture")
+    p.add_argument("file")
+    p.add_argument("--title")
+    p.add_argument("-o", "--output", help="save the figure here instead of showing it")
+    p.set_defaults(run=cmd_plot)
+
+    p = commands.add_parser("jnd", help="fit and plot the JND psychometric curves")
+    p.add_argument("-o", "--output", help="save the figure here instead of showing it")
+    p.set_defaults(run=cmd_jnd)
+
+    for name, (module, help_text) in DELEGATED.items():
+        p = commands.add_parser(name, help=f"{help_text} ({module}.py)", add_help=False)
+        p.set_defaults(module=module)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if hasattr(args, "module"):
+        _assessment_path()
+        module = __import__(args.module)
+        return module.main(rest)
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
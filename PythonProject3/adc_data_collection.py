@@ -1,107 +1,86 @@
-import serial
 import os
 import time
 from datetime import datetime
 import numpy as np
-import matplotlib.pyplot as plt
+from serial_ingest import SerialIngest
+from replay import open_serial
+from frame_parser import FrameSink
+from capture_format import CAPTURE_EXT
+from session_store import SESSION_EXT, SessionWriter
+from live_plot import LiveMonitor, SampleHistory, SampleTap, plot_capture
 
 # === Settings ===
-SERIAL_PORT = "COM5"
+SERIAL_PORT = "COM5"  # or "replay:<recording>" to run without the board
 BAUDRATE = 115200
-READ_BYTES = 14
+LIVE_PLOT = True  # scrolling view with detected breaths while collecting
 SAVE_BASE_DIR = "./data"  # Base directory
 
 object_types = ['normal', 'sport']
 current_breath_type = 'normal'
 current_breath_cycle = 5
 
-# === Ensure base directory exists ===
-os.makedirs(SAVE_BASE_DIR, exist_ok=True)
-
-# === Cleaning Function ===
-def extract_and_clean(filename):
-    output_lines = []
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("Ca=") and "Cb=" in line:
-                try:
-                    parts = line.replace("Ca=", "").replace("Cb=", "").split()
-                    val1 = int(parts[0])
-                    val2 = int(parts[1])
-                    output_lines.append(f"{val1} {val2}")
-                except (IndexError, ValueError):
-                    continue  # Skip malformed lines
-
-    # Overwrite the original file with the cleaned output
-    with open(filename, 'w') as f:
-        f.write("\n".join(output_lines))
-
-    print(f"✅ Cleaned {len(output_lines)} lines and saved back to {filename}")
-    
-def load_adc_data(filename):
-    adc1 = []
-    adc2 = []
-    with open(filename, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) == 2:
-                try:
-                    val1 = int(parts[0])
-                    val2 = int(parts[1])
-                    adc1.append(val1)
-                    adc2.append(val2)
-                except ValueError:
-                    continue  # skip malformed lines
-    return adc1, adc2
-
 def plot_adc(filename):
-    # Read and convert to integers
-    adc1, adc2 = load_adc_data(filename)
-    # print(f"ADC values: {adc_values}")
-    # Plotting
-    plt.figure(figsize=(12, 6))
-    plt.plot(adc1, marker='o', linestyle='-', markersize=0.5, linewidth=0.1, color='blue')
-    plt.plot(adc2, marker='x', linestyle='-', markersize=0.5, linewidth=0.1, color='red')
-    # plt.plot(x_values, voltage_value, marker='x', linestyle='-', markersize=2, color='red')
-    plt.title("ADC Data Plot")
-    plt.xlabel("Sample Number")
-    plt.ylabel("ADC Value")
-    plt.legend(['ADC1', 'ADC2'])
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
-    
+    # Min/max per pixel instead of every raw sample, so long captures plot instantly
+    plot_capture(filename)
+
 # === Main collection function ===
-def collect_data(breath_type, breath_cycle):
+def collect_data(breath_type, breath_cycle, port=SERIAL_PORT, live_plot=LIVE_PLOT, plot=True):
+    # Creates SAVE_BASE_DIR too, so importing this module touches nothing on disk
     dir_path = os.path.join(SAVE_BASE_DIR, breath_type, str(breath_cycle))
     os.makedirs(dir_path, exist_ok=True)
 
-    existing_files = [f for f in os.listdir(dir_path) if f.startswith("adc_") and f.endswith(".data")]
-    file_number = len(existing_files) + 1
-
-    filename = os.path.join(dir_path, f"adc_{breath_type}{str(breath_cycle)}_{file_number}.data")
+    # Next number after the highest one in use, so a deleted capture never gets overwritten
+    prefix = f"adc_{breath_type}{str(breath_cycle)}_"
+    numbers = []
+    for f in os.listdir(dir_path):
+        stem, ext = os.path.splitext(f)
+        if stem.startswith(prefix) and stem[len(prefix):].isdigit() and ext in (".data", CAPTURE_EXT, SESSION_EXT):
+            numbers.append(int(stem[len(prefix):]))
+    file_number = max(numbers, default=0) + 1
+
+    # Append-only session store: chunks are fsync'd as they fill, so a crash loses seconds, not the capture
+    filename = os.path.join(dir_path, f"{prefix}{file_number}{SESSION_EXT}")
     print(f"Saving ADC data to {filename}")
 
-    ser = serial.Serial(port=SERIAL_PORT, baudrate=BAUDRATE, bytesize=8, parity="N", stopbits=1, timeout=0.01)
-    count = 0
+    ser = open_serial(port, BAUDRATE, timeout=0.01)
     start_time = time.time()
 
     try:
-        with open(filename, "wb") as file_1:
-            while True:
-                data = ser.read(READ_BYTES)
-                if data:
-                    file_1.write(data)
-                    print(f"{count}: Received {data}")
-                    count += 1
-
-    except KeyboardInterrupt:
+        # Reader and writer threads do the I/O and frames are decoded as they are
+        # written, this thread only prints progress and draws the live view
+        with SessionWriter(filename, breath_type=breath_type, breath_cycle=breath_cycle) as capture:
+            history = SampleHistory()
+            sink = FrameSink(SampleTap(capture, history))
+            with SerialIngest(ser, sink) as ingest:
+                if live_plot:
+                    print("Collecting, press Ctrl-C or close the plot to stop.")
+                    LiveMonitor(history).run(ingest)
+                else:
+                    print("Collecting, press Ctrl-C to stop.")
+                    ingest.run_until_interrupt()
+            # The rate measured on arrival gives evaluation a sample-accurate duration
+            timing = ingest.clock.header_fields(getattr(ser, "speed", 1.0))
+            if timing:
+                capture.update_header(**timing)
         end_time = time.time()
         elapsed_time = end_time - start_time
-        print("\nUser stopped the data collection.")
+        stats = ingest.stats()
+        clock = ingest.clock.summary()
+        if ingest.error is not None:
+            print(f"\nSerial read failed: {ingest.error}")
+        else:
+            print("\nUser stopped the data collection.")
         print(f"Data collection time: {elapsed_time:.5f} seconds")
-        print(f"Total data points collected: {count}")
+        print(f"Total bytes collected: {stats['bytes_read']} in {stats['reads']} reads")
+        print(f"Overruns: {stats['overruns']} ({stats['dropped_bytes']} bytes dropped), "
+              f"max serial backlog: {stats['max_in_waiting']} bytes")
+        framing = sink.parser.stats()
+        print(f"Total data points collected: {framing['frames']}")
+        print(f"Framing errors: {framing['bad_frames']} ({framing['skipped_bytes']} bytes skipped)")
+        if clock["rate"]:
+            print(f"Measured sample rate: {clock['rate']:.3f} Hz, jitter {clock['jitter'] * 1000:.1f} ms, "
+                  f"{clock['stalls']} stalls ({clock['stalled']:.2f} s without data)")
+            print(f"Signal duration: {framing['frames'] / clock['rate']:.3f} seconds")
 
     finally:
         # This always runs no matter how the try block ends
@@ -109,12 +88,12 @@ def collect_data(breath_type, breath_cycle):
             ser.close()
             print("Serial connection closed.")
 
-        # Cleaning and plotting
-        try:
-            extract_and_clean(filename)
-            plot_adc(filename)
-        except Exception as e:
-            print(f"Cleaning or plotting failed: {e}")
+        # Plotting, the capture is already decoded so there is nothing to clean
+        if plot:
+            try:
+                plot_adc(filename)
+            except Exception as e:
+                print(f"Plotting failed: {e}")
 
 
 def change_breath_cycle():
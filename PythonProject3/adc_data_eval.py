@@ -1,97 +1,71 @@
-import serial
 import os
 import time
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.signal import find_peaks
+from adc_loader import load_adc_array, read_header
+from breath_pipeline import EVAL_CONFIG, default_config, evaluate_samples, load_eval_config
+from serial_ingest import SerialIngest
+from replay import is_raw_capture, open_serial
+from frame_parser import FrameSink
+from capture_format import CAPTURE_EXT, CaptureWriter, effective_sample_rate
+from metrics import stage
+from live_plot import LiveMonitor, SampleHistory, SampleTap, minmax_downsample, plot_capture
 
 # === Settings ===
-SERIAL_PORT = "COM5"
+SERIAL_PORT = "COM5"  # or "replay:<recording>" to run without the board
 BAUDRATE = 115200
-READ_BYTES = 14
-WINDOW_SIZE = 1200
-COLLECTION_TIME = 30  # seconds
-
-# === Cleaning Function ===
-def extract_and_clean(filename):
-    output_lines = []
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("Ca=") and "Cb=" in line:
-                try:
-                    parts = line.replace("Ca=", "").replace("Cb=", "").split()
-                    val1 = int(parts[0])
-                    val2 = int(parts[1])
-                    output_lines.append(f"{val1} {val2}")
-                except (IndexError, ValueError):
-                    continue  # Skip malformed lines
-
-    # Overwrite the original file with the cleaned output
-    with open(filename, 'w') as f:
-        f.write("\n".join(output_lines))
-
-    print(f"✅ Cleaned {len(output_lines)} lines and saved back to {filename}")
-    
-def load_adc_data(filename):
-    adc1 = []
-    adc2 = []
-    with open(filename, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) == 2:
-                try:
-                    val1 = int(parts[0])
-                    val2 = int(parts[1])
-                    adc1.append(val1)
-                    adc2.append(val2)
-                except ValueError:
-                    continue  # skip malformed lines
-    return adc1, adc2
+LIVE_PLOT = True  # scrolling view with detected breaths while collecting
+EVAL_SETTINGS = default_config()  # replaced at startup by EVAL_CONFIG (tuned by param_sweep.py) if it exists
+WINDOW_SIZE = EVAL_SETTINGS["window_size"]
+EVAL_FILE = "eval" + CAPTURE_EXT
+LEGACY_EVAL_FILE = "eval.data"  # cleaned text captures from before the binary format, evaluated at the nominal rate
 
 def plot_adc_before_processing(filename):
-    # Read and convert to integers
-    adc1, adc2 = load_adc_data(filename)
-    # print(f"ADC values: {adc_values}")
-    # Plotting
-    plt.figure(figsize=(12, 6))
-    plt.plot(adc1, marker='o', linestyle='-', markersize=0.5, linewidth=0.1, color='blue')
-    plt.plot(adc2, marker='x', linestyle='-', markersize=0.5, linewidth=0.1, color='red')
-    # plt.plot(x_values, voltage_value, marker='x', linestyle='-', markersize=2, color='red')
-    plt.title("ADC Data Plot")
-    plt.xlabel("Sample Number")
-    plt.ylabel("ADC Value")
-    plt.legend(['ADC1', 'ADC2'])
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
-    
+    # Min/max per pixel instead of every raw sample, so long captures plot instantly
+    plot_capture(filename)
+
 # === Main collection function ===
 def collect_data():
-    global COLLECTION_TIME
-    filename = "eval.data"
+    filename = EVAL_FILE
     print(f"Saving ADC data to {filename}")
 
-    ser = serial.Serial(port=SERIAL_PORT, baudrate=BAUDRATE, bytesize=8, parity="N", stopbits=1, timeout=0.01)
-    count = 0
+    ser = open_serial(SERIAL_PORT, BAUDRATE, timeout=0.01)
     start_time = time.time()
 
     try:
-        with open(filename, "wb") as file_1:
-            while True:
-                data = ser.read(READ_BYTES)
-                if data:
-                    file_1.write(data)
-                    print(f"{count}: Received {data}")
-                    count += 1
-
-    except KeyboardInterrupt:
+        # Reader and writer threads do the I/O and frames are decoded as they are
+        # written, this thread only prints progress and draws the live view
+        with CaptureWriter(filename) as capture:
+            history = SampleHistory()
+            sink = FrameSink(SampleTap(capture, history))
+            with SerialIngest(ser, sink) as ingest:
+                if LIVE_PLOT:
+                    print("Collecting, press Ctrl-C or close the plot to stop.")
+                    LiveMonitor(history).run(ingest)
+                else:
+                    print("Collecting, press Ctrl-C to stop.")
+                    ingest.run_until_interrupt()
+            # Store the rate measured on arrival, so eval_data gets the duration from the sample count
+            timing = ingest.clock.header_fields(getattr(ser, "speed", 1.0))
+            if timing:
+                capture.update_header(**timing)
         end_time = time.time()
         elapsed_time = end_time - start_time
-        COLLECTION_TIME = elapsed_time
-        print("\nUser stopped the data collection.")
+        stats = ingest.stats()
+        clock = ingest.clock.summary()
+        if ingest.error is not None:
+            print(f"\nSerial read failed: {ingest.error}")
+        else:
+            print("\nUser stopped the data collection.")
         print(f"Data collection time: {elapsed_time:.5f} seconds")
-        print(f"Total data points collected: {count}")
+        print(f"Total bytes collected: {stats['bytes_read']} in {stats['reads']} reads")
+        print(f"Overruns: {stats['overruns']} ({stats['dropped_bytes']} bytes dropped), "
+              f"max serial backlog: {stats['max_in_waiting']} bytes")
+        framing = sink.parser.stats()
+        print(f"Total data points collected: {framing['frames']}")
+        print(f"Framing errors: {framing['bad_frames']} ({framing['skipped_bytes']} bytes skipped)")
+        if clock["rate"]:
+            print(f"Measured sample rate: {clock['rate']:.3f} Hz, jitter {clock['jitter'] * 1000:.1f} ms, "
+                  f"{clock['stalls']} stalls ({clock['stalled']:.2f} s without data)")
+            print(f"Signal duration: {framing['frames'] / clock['rate']:.3f} seconds")
 
     finally:
         # This always runs no matter how the try block ends
@@ -99,96 +73,67 @@ def collect_data():
             ser.close()
             print("Serial connection closed.")
 
-        # Cleaning and plotting
+        # Plotting, the capture is already decoded so there is nothing to clean
         try:
-            extract_and_clean(filename)
             plot_adc_before_processing(filename)
         except Exception as e:
-            print(f"Cleaning or plotting failed: {e}")
-
-def MA_filter(data, window_size):
-    """Apply a moving average filter to the data."""
-    return np.convolve(data, np.ones(window_size)/window_size, mode='valid')
-
-def find_match_from_adc1(plateau_mids1, cur_adc2_peak, acceptable_dist):
-    for i in range(len(plateau_mids1)):
-        # print("plateau_mids1[i] - cur_adc2_peak: ", plateau_mids1[i] - cur_adc2_peak)
-        if abs(plateau_mids1[i] - cur_adc2_peak) < acceptable_dist: 
-            return plateau_mids1[i]
-    return None
-
-def insert_abnormal(data, gap):
-    if not data:
-        return []
-    result = [data[0]]
-    for prev, curr in zip(data, data[1:]):
-        if abs(curr - prev) > gap:
-            result.append("abnormal")
-        result.append(curr)
-    return result
+            print(f"Plotting failed: {e}")
 
 def eval_data():
     global WINDOW_SIZE
-    filename = "eval.data"
+    filename = EVAL_FILE
+    if not os.path.exists(filename) and os.path.exists(LEGACY_EVAL_FILE):
+        print(f"{EVAL_FILE} not found, evaluating the older text capture {LEGACY_EVAL_FILE}")
+        filename = LEGACY_EVAL_FILE
+        if is_raw_capture(filename):
+            print(f'{filename} still holds raw "Ca=.. Cb=.." lines, clean it first: python adc_cli.py clean {filename}')
+            return
     if not os.path.exists(filename):
         print(f"File {filename} does not exist. Please collect data first.")
         return
-    adc1, adc2 = load_adc_data(filename)
-    adc1_filtered = MA_filter(adc1, WINDOW_SIZE)
-    adc2_filtered = MA_filter(adc2, WINDOW_SIZE)
-    adc1_normalized = (adc1_filtered - np.mean(adc1_filtered)) / np.std(adc1_filtered)
-    adc2_normalized = (adc2_filtered - np.mean(adc2_filtered)) / np.std(adc2_filtered)
-    # reflect adc2_normalized in the y-axis
-    adc2_normalized = -adc2_normalized
-    _, props1 = find_peaks(adc1_normalized, prominence=0.1, distance=1000, plateau_size=1)
-    plateau_mids1 = [int((l + r) / 2) for l, r in zip(props1["left_edges"], props1["right_edges"])]
-    _, props2 = find_peaks(adc2_normalized, prominence=0.1, distance=1000, plateau_size=1)
-    plateau_mids2 = [int((l + r) / 2) for l, r in zip(props2["left_edges"], props2["right_edges"])]
-    sorted_distances_peak_2 = sorted(np.diff(plateau_mids2))
-    median_distance_peak_2 = np.median(sorted_distances_peak_2)
-    percentile_25_peak_2 = np.percentile(sorted_distances_peak_2, 25)
-    percentile_75_peak_2 = np.percentile(sorted_distances_peak_2, 75)
-    iqr_peak_2 = percentile_75_peak_2 - percentile_25_peak_2
-    # iqr_acceptable = iqr_peak_2*2.5
-    iqr_acceptable = median_distance_peak_2/2
-    acceptable_distance = median_distance_peak_2 + iqr_acceptable
-    final_peak_index = insert_abnormal(plateau_mids2, acceptable_distance)
-    for i in range(len(final_peak_index)):
-        if final_peak_index[i] == "abnormal":
-            try:
-                front = final_peak_index[i-1]
-                back = final_peak_index[i+1]
-                middle = (front + back)/2
-                adc1_match = find_match_from_adc1(plateau_mids1, middle, iqr_acceptable)
-                if adc1_match is not None:
-                    print("Found match:", adc1_match)
-                    final_peak_index[i] = adc1_match 
-                else:
-                    print("No match found")
-                    final_peak_index[i] = int(middle)
-            except IndexError:
-                final_peak_index[i] = final_peak_index[i-1] + median_distance_peak_2
-    plt.figure(figsize=(12, 6))
-    plt.plot(adc1_normalized, label='ADC1 Normalized', color='red')
-    plt.plot(final_peak_index, adc2_normalized[final_peak_index], 'go', label='Detected Breaths')
-    plt.plot(adc2_normalized, label='ADC2 Normalized', color='blue')
-    plt.legend()
-    plt.title("Final Peak Index")
+    with stage("load") as timer:
+        samples = load_adc_array(filename)
+        timer.count(len(samples))
+    settings = dict(EVAL_SETTINGS, window_size=WINDOW_SIZE)
+    # The duration is the sample count at the rate measured while collecting, not the wall-clock time
+    header = read_header(filename)
+    sample_rate = effective_sample_rate(header)
+    result = evaluate_samples(samples, sample_rate=sample_rate, verbose=True, **settings)
+    adc1_normalized = result["adc1_normalized"]
+    adc2_normalized = result["adc2_normalized"]
+    final_peak_index = result["peaks"]
+    # Channels the signal quality check skipped are None
+    marked = adc2_normalized if adc2_normalized is not None else adc1_normalized
+    with stage("plot", len(samples)):
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(12, 6))
+        if adc1_normalized is not None:
+            plt.plot(*minmax_downsample(adc1_normalized), label='ADC1 Normalized', color='red')
+        if marked is not None:
+            plt.plot(final_peak_index, marked[final_peak_index], 'go', label='Detected Breaths')
+        if adc2_normalized is not None:
+            plt.plot(*minmax_downsample(adc2_normalized), label='ADC2 Normalized', color='blue')
+        plt.legend()
+        plt.title(f"Final Peak Index ({result['mode']})")
     plt.show()
-    breath_cycle = len(final_peak_index) + 1 if WINDOW_SIZE == 1200 else len(final_peak_index) + 2
-    print("Total breaths detected:", breath_cycle, "cycles")
-    print("Breath rate: ", breath_cycle / (COLLECTION_TIME / 60), "breaths/minute")
+    print("Signal quality:", result["mode"], ", ".join(result["quality"]["flags"]))
+    measured = "measured" if header is not None and header["measured_rate"] else "nominal"
+    print(f"Duration: {result['duration']:.3f} seconds at {sample_rate:.3f} Hz ({measured})")
+    print("Total breaths detected:", result["breaths"], "cycles")
+    print("Breath rate: ", result["bpm"], "breaths/minute")
     
 
 def change_eval_settings():
     print("Change evaluation settings here.")
-    global WINDOW_SIZE
+    global WINDOW_SIZE, EVAL_SETTINGS
     while True:
         print("\n=== EVALUATION SETTINGS ===")
         print(f"Current window size: {WINDOW_SIZE}")
+        print("Peak and fusion settings:", ", ".join(f"{k}={v}" for k, v in EVAL_SETTINGS.items() if k != "window_size"))
         print("1. Change to 5 cycle settings")
         print("2. Change to 30s settings")
-        print("3. Back to main menu")
+        print(f"3. Load tuned settings from {EVAL_CONFIG}")
+        print("4. Back to main menu")
 
         choice = input("Enter your choice: ")
 
@@ -202,12 +147,17 @@ def change_eval_settings():
                     print(f"Window size changed to {WINDOW_SIZE}")
                     break
         elif choice == '3':
+            EVAL_SETTINGS = load_eval_config()
+            WINDOW_SIZE = EVAL_SETTINGS["window_size"]
+        elif choice == '4':
             break
         else:
-            print("Invalid choice. Please select 1, 2, or 3.")
+            print("Invalid choice. Please select 1, 2, 3, or 4.")
     
 # === Program Entry ===
 if __name__ == "__main__":
+    EVAL_SETTINGS = load_eval_config()
+    WINDOW_SIZE = EVAL_SETTINGS["window_size"]
     while True:
         print("\n=== MAIN MENU ===")
         print("1. Start Collecting Data")
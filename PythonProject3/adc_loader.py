@@ -0,0 +1,136 @@
+import io
+
+import numpy as np
+
+from capture_format import is_capture_file, open_capture, read_capture_header
+from session_store import SessionReader, is_session_file, read_session_header
+
+_MAX_DIGITS = 18  # anything longer could overflow int64, leave it to int()
+CHUNK_SAMPLES = 1 << 18  # rows per chunk for iter_adc_chunks, about 7 minutes at 650 Hz
+_TEXT_ROW_BYTES = 11  # typical "dddd dddd\r\n" line
+
+
+def _load_adc_lines(raw):
+    """Line-by-line parser with the original int() semantics (signs, odd whitespace)."""
+    rows = []
+    for line in io.StringIO(raw.decode(errors='replace'), newline=None):
+        parts = line.strip().split()
+        if len(parts) == 2:
+            try:
+                rows.append((int(parts[0]), int(parts[1])))
+            except ValueError:
+                continue  # skip malformed lines
+    return np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+
+def _parse_adc_bytes(raw):
+    """Parse cleaned "v1 v2" text into an int64 (N, 2) array without a Python loop.
+
+    Returns None if the buffer holds anything besides unsigned digits and
+    whitespace, in which case the caller falls back to the line parser.
+    """
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    is_digit = (buf - np.uint8(ord('0'))) <= 9
+    is_newline = buf == ord('\n')
+    is_cr = buf == ord('\r')
+    is_blank = (buf == ord(' ')) | (buf == ord('\t')) | is_cr | (buf == ord('\v')) | (buf == ord('\f'))
+    if not np.all(is_digit | is_newline | is_blank):
+        return None
+    # A bare '\r' is a line break in text mode; only '\r\n' endings take the fast path
+    cr = np.flatnonzero(is_cr)
+    if cr.size and (cr[-1] == buf.size - 1 or not np.all(is_newline[cr + 1])):
+        return None
+
+    # A token is a maximal run of digits
+    starts = np.flatnonzero(is_digit[1:] & ~is_digit[:-1]) + 1
+    if is_digit[:1].any():
+        starts = np.concatenate(([0], starts))
+    if starts.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    ends = np.flatnonzero(is_digit[:-1] & ~is_digit[1:]) + 1
+    if is_digit[-1:].any():
+        ends = np.concatenate((ends, [buf.size]))
+    if (ends - starts).max() > _MAX_DIGITS:
+        return None
+    values = np.fromstring(raw, dtype=np.int64, sep=' ')
+
+    # Keep only lines with exactly two tokens, like the original split() check
+    line_of_token = np.searchsorted(np.flatnonzero(is_newline), starts)
+    tokens_per_line = np.bincount(line_of_token)
+    keep = tokens_per_line[line_of_token] == 2
+    return values[keep].reshape(-1, 2)
+
+
+def load_adc_array(filename):
+    """Load a capture file as a contiguous (N, 2) array of ADC samples.
+
+    Binary captures come back as a read-only np.memmap without copying, session
+    stores as one array assembled from their chunks. For
+    cleaned text captures malformed lines are skipped, and the array is uint16
+    when every value fits (always the case for 12-bit captures), otherwise
+    int64 so nothing wraps.
+    """
+    if is_capture_file(filename):
+        return open_capture(filename)[1]
+    if is_session_file(filename):
+        with SessionReader(filename) as reader:
+            return reader.read()
+    with open(filename, 'rb') as f:
+        return _parse_adc_text(f.read())
+
+
+def _parse_adc_text(raw):
+    samples = _parse_adc_bytes(raw)
+    if samples is None:
+        samples = _load_adc_lines(raw)
+    if samples.size == 0 or (samples.min() >= 0 and samples.max() <= np.iinfo(np.uint16).max):
+        samples = samples.astype(np.uint16)
+    return np.ascontiguousarray(samples)
+
+
+def iter_adc_chunks(filename, chunk_samples=CHUNK_SAMPLES):
+    """Yield a capture as consecutive (n, 2) sample arrays of at most about chunk_samples rows.
+
+    Binary captures are sliced from the memmap, session stores read chunk by
+    chunk; text captures are read in
+    blocks that end on a line break. Either way memory stays bounded by the
+    chunk size however long the recording is.
+    """
+    if is_capture_file(filename):
+        samples = open_capture(filename)[1]
+        for start in range(0, len(samples), chunk_samples):
+            yield samples[start:start + chunk_samples]
+        return
+    if is_session_file(filename):
+        with SessionReader(filename) as reader:
+            yield from reader.iter_chunks(chunk_samples)
+        return
+    block_bytes = chunk_samples * _TEXT_ROW_BYTES
+    carry = b""
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            buf = carry + block
+            end = buf.rfind(b"\n") + 1
+            carry = buf[end:]
+            if end:
+                yield _parse_adc_text(buf[:end])
+    if carry:
+        yield _parse_adc_text(carry)
+
+
+def read_header(filename):
+    """Header dict of a binary capture or session store, None for a text capture."""
+    if is_capture_file(filename):
+        return read_capture_header(filename)
+    if is_session_file(filename):
+        return read_session_header(filename)
+    return None
+
+
+def load_adc_data(filename):
+    """Load a cleaned capture file and return the two ADC channels as arrays."""
+    samples = load_adc_array(filename)
+    return samples[:, 0], samples[:, 1]
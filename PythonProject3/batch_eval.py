@@ -0,0 +1,191 @@
+"""Score the breath-rate pipeline across the labelled recordings in data/.
+
+Recordings live at data/<type>/<cycles>/adc_*.data (or .adcb/.adcs); the true
+breath count is the <cycles> directory name. Files outside such a directory
+fall back to the count in their adc_<type><cycles>_<n> filename.
+
+    python batch_eval.py [data_dir] [--window 1200] [--decimate 26] [--workers N] [--format csv|json] [-o out]
+    python batch_eval.py --config eval_config.json   # settings chosen by param_sweep.py
+    python batch_eval.py --chunked   # same report, recordings read in chunks of bounded memory
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from breath_pipeline import (DECIMATE, PEAK_DISTANCE, PROMINENCE, WINDOW_SIZE, evaluate_file, evaluate_file_chunked,
+                             load_eval_config)
+from convert_captures import RECORDING_EXTS, capture_labels
+from fusion import ABNORMAL_GAP, MATCH_TOLERANCE
+
+SAVE_BASE_DIR = "./data"  # Base directory
+CSV_FIELDS = ["file", "breath_type", "true_breaths", "detected_breaths", "error", "abs_error",
+              "squared_error", "detection_rate", "duration", "bpm", "true_bpm", "mode", "flags"]
+
+
+def find_recordings(base_dir=SAVE_BASE_DIR):
+    """Return sorted (path, breath_type, true_breaths) for every labelled capture under base_dir.
+
+    A recording stored in several formats (a .data file converted to .adcb
+    next to it, say) is counted once, in the first of RECORDING_EXTS.
+    """
+    recordings = []
+    for root, _, files in os.walk(base_dir):
+        formats = {}
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if name.startswith("adc_") and ext in RECORDING_EXTS:
+                formats.setdefault(stem, []).append(ext)
+        for stem, exts in formats.items():
+            name = stem + min(exts, key=RECORDING_EXTS.index)
+            path = os.path.join(root, name)
+            parts = os.path.relpath(path, base_dir).split(os.sep)
+            if len(parts) == 3 and parts[1].isdigit():
+                breath_type, true_breaths = parts[0], int(parts[1])
+            else:
+                breath_type, true_breaths = capture_labels(name)
+            if true_breaths:
+                recordings.append((path, breath_type, true_breaths))
+    return sorted(recordings)
+
+
+def score_recording(recording, window_size=WINDOW_SIZE, prominence=PROMINENCE, distance=PEAK_DISTANCE,
+                    decimate=DECIMATE, match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP, chunked=False):
+    """Evaluate one recording and return its metrics row."""
+    path, breath_type, true_breaths = recording
+    evaluate = evaluate_file_chunked if chunked else evaluate_file
+    result = evaluate(path, window_size, prominence=prominence, distance=distance, decimate=decimate,
+                      match_tolerance=match_tolerance, abnormal_gap=abnormal_gap)
+    detected = result["breaths"]
+    error = detected - true_breaths
+    duration = result["duration"]
+    return {
+        "file": path,
+        "breath_type": breath_type,
+        "true_breaths": true_breaths,
+        "detected_breaths": detected,
+        "error": error,
+        "abs_error": abs(error),
+        "squared_error": error * error,
+        "detection_rate": min(detected, true_breaths) / true_breaths,
+        "duration": duration,
+        "bpm": result["bpm"],
+        "true_bpm": true_breaths / (duration / 60) if duration else 0.0,
+        "mode": result["mode"],
+        "flags": " ".join(result["quality"]["flags"]),
+    }
+
+
+def _score_star(args):
+    return score_recording(*args)
+
+
+def run_batch(recordings, window_size=WINDOW_SIZE, prominence=PROMINENCE, distance=PEAK_DISTANCE,
+              workers=None, decimate=DECIMATE, match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP,
+              chunked=False):
+    """Score recordings in a process pool (workers=1 runs in this process). Rows keep input order."""
+    jobs = [(recording, window_size, prominence, distance, decimate, match_tolerance, abnormal_gap, chunked)
+            for recording in recordings]
+    if workers == 1 or len(jobs) <= 1:
+        return [_score_star(job) for job in jobs]
+    workers = workers or os.cpu_count() or 1
+    # A few chunks per worker keeps IPC overhead low while still balancing uneven file sizes
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_score_star, jobs, chunksize=chunksize))
+
+
+def summarize(rows):
+    """Aggregate error metrics over rows, overall and per breath type."""
+    def metrics(group):
+        errors = np.array([r["error"] for r in group], dtype=float)
+        return {
+            "files": len(group),
+            "mse": float(np.mean(errors ** 2)),
+            "mae": float(np.mean(np.abs(errors))),
+            "mean_error": float(np.mean(errors)),
+            "detection_rate": float(np.mean([r["detection_rate"] for r in group])),
+            "exact": int(np.sum(errors == 0)),
+            "modes": {mode: sum(r["mode"] == mode for r in group) for mode in sorted({r["mode"] for r in group})},
+        }
+
+    if not rows:
+        return {"overall": {"files": 0}, "by_type": {}}
+    by_type = {}
+    for row in rows:
+        by_type.setdefault(row["breath_type"], []).append(row)
+    return {
+        "overall": metrics(rows),
+        "by_type": {breath_type: metrics(group) for breath_type, group in sorted(by_type.items())},
+    }
+
+
+def write_report(rows, summary, out, fmt):
+    if fmt == "json":
+        json.dump({"files": rows, "summary": summary}, out, indent=2)
+        out.write("\n")
+    else:
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the breath-rate pipeline on every labelled recording.")
+    parser.add_argument("data_dir", nargs="?", default=SAVE_BASE_DIR)
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="moving average window in samples")
+    parser.add_argument("--prominence", type=float, default=PROMINENCE)
+    parser.add_argument("--distance", type=int, default=PEAK_DISTANCE)
+    parser.add_argument("--decimate", type=int, default=DECIMATE,
+                        help="find peaks at 1/N of the sample rate (26 gives 25 Hz at 650 Hz)")
+    parser.add_argument("--match-tolerance", type=float, default=MATCH_TOLERANCE,
+                        help="ADC1 match distance in median ADC2 gaps")
+    parser.add_argument("--abnormal-gap", type=float, default=ABNORMAL_GAP,
+                        help="ADC2 gaps longer than this many median gaps are missed breaths")
+    parser.add_argument("--config", help="take the defaults of the settings above from this config file")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunked", action="store_true",
+                        help="read recordings in chunks, for files too long to hold in memory (needs --decimate 1)")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("-o", "--output", help="write the report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.config:
+        # Settings given on the command line still win over the config file
+        config = load_eval_config(args.config)
+        parser.set_defaults(window=config["window_size"], prominence=config["prominence"],
+                            distance=config["distance"], decimate=config["decimate"],
+                            match_tolerance=config["match_tolerance"], abnormal_gap=config["abnormal_gap"])
+        args = parser.parse_args(argv)
+    if args.chunked and args.decimate > 1:
+        parser.error(f"--chunked finds peaks at the full rate and needs decimate 1, got {args.decimate}"
+                     + (" (--decimate 1 overrides the config)" if args.config else ""))
+
+    recordings = find_recordings(args.data_dir)
+    if not recordings:
+        print(f"No labelled recordings found under {args.data_dir}", file=sys.stderr)
+        return 1
+    start = time.perf_counter()
+    rows = run_batch(recordings, args.window, args.prominence, args.distance, args.workers, args.decimate,
+                     args.match_tolerance, args.abnormal_gap, args.chunked)
+    elapsed = time.perf_counter() - start
+    summary = summarize(rows)
+
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            write_report(rows, summary, out, args.format)
+    else:
+        write_report(rows, summary, sys.stdout, args.format)
+    overall = summary["overall"]
+    print(f"{overall['files']} files in {elapsed:.2f}s: MSE {overall['mse']:.3f}, MAE {overall['mae']:.3f}, "
+          f"detection rate {overall['detection_rate']:.3f}, modes "
+          + ", ".join(f"{mode} {n}" for mode, n in overall["modes"].items()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
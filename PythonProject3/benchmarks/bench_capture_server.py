@@ -0,0 +1,141 @@
+"""Many simulated 650 Hz devices on one CaptureServer: does it keep up?
+
+Run from the repository root (Linux/macOS, the devices are pseudo-terminals):
+    python PythonProject3/benchmarks/bench_capture_server.py [--devices 32] [--seconds 20]
+
+Each device is a pty whose master end a feeder thread writes synthetic
+"Ca=.. Cb=.." frames to in real time, in 20 ms bursts. The server opens the
+slave ends with pyserial exactly like real ports. At the end every session
+must have received every frame intact, the largest unread backlog must stay
+a small fraction of a second, and the rates served over HTTP must match the
+sessions' own estimates.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from capture_server import READ_TIMEOUT, CaptureServer, CaptureSession  # noqa: E402
+from synthetic import SAMPLE_RATE, breathing_signal  # noqa: E402
+
+BURST = 0.02  # seconds of frames per write
+FRAME_BYTES = 17  # "Ca=2700 Cb=2000\r\n"
+MAX_BACKLOG_S = 0.5  # seconds of data allowed to sit unread in a port
+
+
+class PtyDevice:
+    """A pseudo-terminal that plays back samples at the sample rate from a thread."""
+
+    def __init__(self, samples, sample_rate=SAMPLE_RATE):
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        self._slave = slave  # kept open so the pty survives until the reader opens it
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.sent = 0
+        self.max_lag = 0.0  # seconds the feeder fell behind its schedule
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        per_burst = int(BURST * self.sample_rate)
+        start = time.monotonic()
+        for i in range(0, len(self.samples), per_burst):
+            block = self.samples[i:i + per_burst]
+            data = b"".join(b"Ca=%d Cb=%d\r\n" % (a, b) for a, b in block.tolist())
+            due = start + i / self.sample_rate
+            now = time.monotonic()
+            if now < due:
+                time.sleep(due - now)
+            else:
+                self.max_lag = max(self.max_lag, now - due)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.master, view):]
+            self.sent += len(block)
+
+    def join(self):
+        self._thread.join()
+
+    def close(self):
+        os.close(self.master)
+        os.close(self._slave)
+
+
+def query(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+        return json.load(response)
+
+
+async def run(server, devices, seconds, http_port):
+    loop = asyncio.get_running_loop()
+    task = asyncio.create_task(server.run())
+    await asyncio.sleep(0.2)  # let every read loop start before the devices talk
+    started = time.process_time()
+    for device in devices:
+        device.start()
+    await loop.run_in_executor(None, lambda: [device.join() for device in devices])
+    await asyncio.sleep(4 * READ_TIMEOUT)  # drain the last reads
+    cpu = time.process_time() - started
+    served = await loop.run_in_executor(None, query, http_port, "/sessions")
+    one = await loop.run_in_executor(None, query, http_port, "/sessions/dev0")
+    server.stop()
+    await task
+    return cpu, served, one
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the capture server with pty devices.")
+    parser.add_argument("--devices", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--http-port", type=int, default=18650)
+    args = parser.parse_args(argv)
+
+    devices = [PtyDevice(breathing_signal(args.seconds, seed=i)["samples"]) for i in range(args.devices)]
+    sessions = [CaptureSession(f"dev{i}", serial.Serial(device.port, timeout=READ_TIMEOUT))
+                for i, device in enumerate(devices)]
+    server = CaptureServer(sessions, http_port=args.http_port)
+    cpu, served, one = asyncio.run(run(server, devices, args.seconds, args.http_port))
+
+    failures = []
+    max_backlog = 0
+    for device, session, row in zip(devices, sessions, served):
+        status = session.status()
+        backlog_s = status["max_in_waiting"] / FRAME_BYTES / SAMPLE_RATE
+        max_backlog = max(max_backlog, backlog_s)
+        if status["frames"] != device.sent or status["bad_frames"]:
+            failures.append(f"{session.name}: {status['frames']} of {device.sent} frames, "
+                            f"{status['bad_frames']} bad")
+        if backlog_s > MAX_BACKLOG_S:
+            failures.append(f"{session.name}: backlog reached {backlog_s:.2f} s")
+        if row["frames"] != status["frames"] or row["breaths"] != status["breaths"]:
+            failures.append(f"{session.name}: HTTP status {row} differs from {status}")
+        session.close()
+        device.close()
+    if one["name"] != "dev0":
+        failures.append(f"/sessions/dev0 returned {one}")
+
+    total = sum(device.sent for device in devices)
+    print(f"{args.devices} devices x {args.seconds:.0f} s at {SAMPLE_RATE} Hz: {total:,} frames")
+    print(f"process CPU (feeders included) {cpu:.2f} s for {args.seconds:.0f} s of capture ({cpu / args.seconds:.0%} of one core), "
+          f"{cpu / total * 1e6:.1f} us per frame")
+    print(f"max unread backlog {max_backlog * 1000:.0f} ms, "
+          f"max feeder lag {max(d.max_lag for d in devices) * 1000:.0f} ms")
+    print(f"dev0: {one['breaths']} breaths, {one['bpm']:.1f} bpm")
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    print("All sessions kept up." if not failures else f"{len(failures)} failures.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Peak memory and time of evaluate_file_chunked against the in-memory evaluate_file.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_chunked_eval.py [--hours 0.5,2,4]
+
+Each length of synthetic recording is written as a cleaned text capture and
+evaluated both ways. The results must be identical; the in-memory peak grows
+with the recording, the chunked one should not.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from breath_pipeline import evaluate_file, evaluate_file_chunked  # noqa: E402
+from synthetic import breathing_signal, write_clean_text  # noqa: E402
+
+
+def measure(fn):
+    """(result, seconds, peak traced MB); the time is taken without tracing."""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def comparable(result):
+    return json.dumps({k: v for k, v in result.items() if not k.endswith("_normalized")}, default=int)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark chunked evaluation.")
+    parser.add_argument("--hours", default="0.5,2,4", help="comma separated recording lengths")
+    args = parser.parse_args(argv)
+
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        for hours in (float(h) for h in args.hours.split(",")):
+            path = os.path.join(workdir, "recording.data")
+            samples = breathing_signal(hours * 3600, seed=0)["samples"]
+            write_clean_text(path, samples)
+            del samples
+            memory, memory_s, memory_mb = measure(lambda: evaluate_file(path))
+            chunked, chunked_s, chunked_mb = measure(lambda: evaluate_file_chunked(path))
+            same = comparable(memory) == comparable(chunked)
+            ok &= same
+            print(f"{hours:g} h ({os.path.getsize(path) / 1e6:.0f} MB text): in memory {memory_s:.2f} s, "
+                  f"peak {memory_mb:.0f} MB; chunked {chunked_s:.2f} s, peak {chunked_mb:.0f} MB; "
+                  f"{chunked['breaths']} breaths, identical: {same}")
+            del memory, chunked
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
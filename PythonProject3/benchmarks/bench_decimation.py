@@ -0,0 +1,68 @@
+"""Peak detection with and without decimation: breath counts on data/ and timing on an hour of signal.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_decimation.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from adc_loader import load_adc_array  # noqa: E402
+from batch_eval import find_recordings  # noqa: E402
+from breath_pipeline import SAMPLE_RATE, decimated_peaks, evaluate_samples, normalize, plateau_peaks  # noqa: E402
+from ma_filters import MA_filter  # noqa: E402
+
+TARGET_RATES = [25, 10]  # Hz
+WINDOW_SIZES = [1200, 500, 250]
+N_SAMPLES = SAMPLE_RATE * 3600  # one hour for the timing run
+REPEATS = 3
+
+
+def best_time(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_channels(n, rng):
+    """Two anti-phase breathing signals at 12-20 bpm with sensor noise, already filtered and normalised."""
+    t = np.arange(n) / SAMPLE_RATE
+    bpm = 16 + 4 * np.sin(2 * np.pi * t / 900)
+    phase = 2 * np.pi * np.cumsum(bpm / 60) / SAMPLE_RATE
+    samples = np.stack((3000 + 300 * np.sin(phase), 3000 - 300 * np.sin(phase)), axis=1)
+    samples = (samples + rng.normal(0, 20, samples.shape)).astype(np.uint16)
+    normalized = normalize(MA_filter(samples, 1200))
+    normalized[:, 1] *= -1
+    return normalized
+
+
+if __name__ == "__main__":
+    recordings = [(load_adc_array(path), true_breaths) for path, _, true_breaths in find_recordings("./data")]
+    print(f"{len(recordings)} recordings: breath counts against full-rate detection and the labels")
+    print(f"{'window':>7} {'rate':>6} {'same':>6} {'MAE':>6} {'MSE':>7}")
+    for window_size in WINDOW_SIZES:
+        full = [evaluate_samples(samples, window_size)["breaths"] for samples, _ in recordings]
+        truth = np.array([true_breaths for _, true_breaths in recordings])
+        for rate in [SAMPLE_RATE] + TARGET_RATES:
+            factor = SAMPLE_RATE // rate
+            counts = np.array([evaluate_samples(samples, window_size, decimate=factor)["breaths"]
+                               for samples, _ in recordings])
+            errors = counts - truth
+            print(f"{window_size:7d} {SAMPLE_RATE / factor:5.0f}Hz {int(np.sum(counts == full)):3d}/{len(full)} "
+                  f"{np.mean(np.abs(errors)):6.2f} {np.mean(errors ** 2):7.2f}")
+
+    signals = synthetic_channels(N_SAMPLES, np.random.default_rng(0))
+    t_full = best_time(lambda: [plateau_peaks(signals[:, c]) for c in range(2)])
+    print(f"\nPeak detection on {N_SAMPLES} samples x 2 channels (best of {REPEATS})")
+    print(f"{'rate':>6} {'time':>10} {'speedup':>8}")
+    print(f"{SAMPLE_RATE:5d}Hz {t_full * 1000:8.1f}ms {1.0:7.1f}x")
+    for rate in TARGET_RATES:
+        factor = SAMPLE_RATE // rate
+        t_dec = best_time(lambda: decimated_peaks(signals, factor))
+        print(f"{SAMPLE_RATE / factor:5.0f}Hz {t_dec * 1000:8.1f}ms {t_full / t_dec:7.1f}x")
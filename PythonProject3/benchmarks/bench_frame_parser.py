@@ -0,0 +1,36 @@
+"""Throughput of the incremental Ca=/Cb= frame parser at several read sizes.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_frame_parser.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from frame_parser import FrameParser  # noqa: E402
+
+SAMPLE_RATE = 650  # Hz, the STM32 frame rate the parser has to keep up with
+N_FRAMES = 100000
+READ_SIZES = [1, 14, 256, 4096, 65536]
+
+
+def make_stream(n_frames):
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 4096, size=(n_frames, 2))
+    return values, b"".join(b"Ca=%d Cb=%d\r\n" % (a, b) for a, b in values.tolist())
+
+
+if __name__ == "__main__":
+    values, stream = make_stream(N_FRAMES)
+    print(f"{N_FRAMES} frames, {len(stream)} bytes, target {10 * SAMPLE_RATE} frames/s")
+    for read_size in READ_SIZES:
+        parser = FrameParser()
+        start = time.perf_counter()
+        chunks = [parser.feed(stream[i:i + read_size]) for i in range(0, len(stream), read_size)]
+        elapsed = time.perf_counter() - start
+        assert np.array_equal(np.concatenate(chunks), values), f"Parser lost frames at read size {read_size}"
+        rate = N_FRAMES / elapsed
+        print(f"read size {read_size:6d}: {rate:12,.0f} frames/s ({rate / SAMPLE_RATE:7.0f}x real time)")
@@ -0,0 +1,92 @@
+"""Check the vectorized fusion step against the original list-based one and time both.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_fusion.py
+"""
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from breath_pipeline import WINDOW_SIZE, evaluate_file  # noqa: E402
+from fusion import fuse_peaks  # noqa: E402
+
+DATA_DIRS = ["./data/normal", "./data/sport"]
+SAMPLE_RATE = 650
+BREATH_PERIOD = 3 * SAMPLE_RATE  # samples between synthetic breaths
+DURATIONS_H = [0.5, 1, 4]
+
+
+def find_match_from_adc1(plateau_mids1, cur_adc2_peak, acceptable_dist):
+    for i in range(len(plateau_mids1)):
+        if abs(plateau_mids1[i] - cur_adc2_peak) < acceptable_dist:
+            return plateau_mids1[i]
+    return None
+
+
+def insert_abnormal(data, gap):
+    if not data:
+        return []
+    result = [data[0]]
+    for prev, curr in zip(data, data[1:]):
+        if abs(curr - prev) > gap:
+            result.append("abnormal")
+        result.append(curr)
+    return result
+
+
+def fuse_peaks_lists(plateau_mids1, plateau_mids2):
+    """The fusion loop eval_data used to run inline."""
+    median_distance_peak_2 = np.median(sorted(np.diff(plateau_mids2)))
+    iqr_acceptable = median_distance_peak_2/2
+    acceptable_distance = median_distance_peak_2 + iqr_acceptable
+    final_peak_index = insert_abnormal(plateau_mids2, acceptable_distance)
+    for i in range(len(final_peak_index)):
+        if final_peak_index[i] == "abnormal":
+            try:
+                front = final_peak_index[i-1]
+                back = final_peak_index[i+1]
+                middle = (front + back)/2
+                adc1_match = find_match_from_adc1(plateau_mids1, middle, iqr_acceptable)
+                if adc1_match is not None:
+                    final_peak_index[i] = adc1_match
+                else:
+                    final_peak_index[i] = int(middle)
+            except IndexError:
+                final_peak_index[i] = final_peak_index[i-1] + median_distance_peak_2
+    return final_peak_index
+
+
+def synthetic_peaks(hours, rng):
+    """Breath peaks with jitter, 5% missed on ADC2 and ADC1 peaks near most true breaths."""
+    n = int(hours * 3600 * SAMPLE_RATE / BREATH_PERIOD)
+    truth = np.cumsum(rng.normal(BREATH_PERIOD, BREATH_PERIOD * 0.05, n)).astype(np.int64)
+    mids2 = truth[rng.random(n) > 0.05]
+    mids1 = np.sort((truth + rng.integers(-100, 100, n))[rng.random(n) > 0.2])
+    return mids1.tolist(), mids2.tolist()
+
+
+if __name__ == "__main__":
+    files = sorted(f for d in DATA_DIRS for f in glob.glob(os.path.join(d, "**", "*.data"), recursive=True))
+    for window_size in (WINDOW_SIZE, 500, 250):
+        for filename in files:
+            result = evaluate_file(filename, window_size, adaptive=False)  # both channels' peaks
+            expected = fuse_peaks_lists(result["plateau_mids1"], result["plateau_mids2"])
+            assert fuse_peaks(result["plateau_mids1"], result["plateau_mids2"]) == expected, filename
+    print(f"Identical fusion on {len(files)} recordings x 3 window sizes")
+
+    rng = np.random.default_rng(0)
+    for hours in DURATIONS_H:
+        mids1, mids2 = synthetic_peaks(hours, rng)
+        start = time.perf_counter()
+        expected = fuse_peaks_lists(mids1, mids2)
+        t_lists = time.perf_counter() - start
+        start = time.perf_counter()
+        fused = fuse_peaks(mids1, mids2)
+        t_numpy = time.perf_counter() - start
+        assert fused == expected
+        print(f"{hours:4}h, {len(mids2):6d} peaks: lists {t_lists * 1000:9.1f} ms, "
+              f"numpy {t_numpy * 1000:7.2f} ms ({t_lists / t_numpy:6.0f}x)")
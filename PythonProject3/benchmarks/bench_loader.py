@@ -0,0 +1,62 @@
+"""Compare the shared NumPy loader against the original per-line loader.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_loader.py
+"""
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from adc_loader import load_adc_data  # noqa: E402
+
+DATA_DIRS = ["./data/normal", "./data/sport"]
+REPEATS = 3
+
+
+def load_adc_data_lists(filename):
+    """The loader every script used to carry a copy of."""
+    adc1 = []
+    adc2 = []
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) == 2:
+                try:
+                    val1 = int(parts[0])
+                    val2 = int(parts[1])
+                    adc1.append(val1)
+                    adc2.append(val2)
+                except ValueError:
+                    continue  # skip malformed lines
+    return adc1, adc2
+
+
+def time_loader(loader, files):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for filename in files:
+            loader(filename)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    files = sorted(f for d in DATA_DIRS for f in glob.glob(os.path.join(d, "**", "*.data"), recursive=True))
+    if not files:
+        sys.exit("No .data files found, run from the repository root.")
+
+    for filename in files:
+        old1, old2 = load_adc_data_lists(filename)
+        new1, new2 = load_adc_data(filename)
+        assert old1 == new1.tolist() and old2 == new2.tolist(), f"Loader mismatch on {filename}"
+
+    lines = sum(len(load_adc_data(f)[0]) for f in files)
+    t_old = time_loader(load_adc_data_lists, files)
+    t_new = time_loader(load_adc_data, files)
+    print(f"{len(files)} files, {lines} samples (best of {REPEATS})")
+    print(f"per-line lists : {t_old * 1000:8.1f} ms")
+    print(f"numpy bulk     : {t_new * 1000:8.1f} ms")
+    print(f"speedup        : {t_old / t_new:8.1f}x")
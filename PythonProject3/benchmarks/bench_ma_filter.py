@@ -0,0 +1,41 @@
+"""Moving average backends across window sizes, against the original np.convolve.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_ma_filter.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ma_filters import MA_filter  # noqa: E402
+
+WINDOW_SIZES = [250, 500, 1200, 5000]
+N_SAMPLES = 650 * 60 * 10  # ten minutes of both channels at 650 Hz
+REPEATS = 3
+
+
+def best_time(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    samples = rng.integers(2800, 3600, size=(N_SAMPLES, 2)).astype(np.uint16)
+    print(f"{N_SAMPLES} samples x 2 channels (best of {REPEATS})")
+    print(f"{'window':>7} {'convolve':>10} {'lfilter':>10} {'cumsum':>10} {'speedup':>8} {'max diff':>10}")
+    for window_size in WINDOW_SIZES:
+        reference = MA_filter(samples, window_size, backend="convolve")
+        result = MA_filter(samples, window_size)
+        t_conv = best_time(lambda: MA_filter(samples, window_size, backend="convolve"))
+        t_lfilter = best_time(lambda: MA_filter(samples, window_size, backend="lfilter"))
+        t_cumsum = best_time(lambda: MA_filter(samples, window_size))
+        print(f"{window_size:7d} {t_conv * 1000:8.1f}ms {t_lfilter * 1000:8.1f}ms {t_cumsum * 1000:8.1f}ms "
+              f"{t_conv / t_cumsum:7.1f}x {np.abs(result - reference).max():10.2e}")
@@ -0,0 +1,65 @@
+"""Bootstrap psychometric fits: one curve_fit per replicate against the batched fitter.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_psychometric.py [--recordings 40] [--replicates 5000]
+
+Errors are drawn like a batch_eval report of that many recordings from an
+estimator that is a few bpm off, as the sport recordings are. The
+per-replicate curve_fit loop is timed on --loop replicates and scaled up;
+the fitted parameters of those replicates are compared with the batched fit.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "performance_assessment"))
+from psychometric import DELTAS, P0, bootstrap, fit_sigmoids, responses, sigmoid  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bootstrap psychometric fits.")
+    parser.add_argument("--recordings", type=int, default=40)
+    parser.add_argument("--replicates", type=int, default=5000)
+    parser.add_argument("--loop", type=int, default=300, help="replicates timed with curve_fit")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    errors = rng.normal(3, 2, args.recordings).round()
+    curves = responses(errors[rng.integers(0, errors.size, (args.loop, errors.size))], DELTAS)
+
+    start = time.perf_counter()
+    looped, failed = [], 0
+    for y in curves:
+        try:
+            looped.append(curve_fit(sigmoid, DELTAS, y, p0=list(P0), maxfev=2000)[0])
+        except RuntimeError:
+            looped.append(np.full(4, np.nan))
+            failed += 1
+    loop_s = (time.perf_counter() - start) / args.loop
+
+    start = time.perf_counter()
+    params, cost, converged = fit_sigmoids(DELTAS, curves)
+    batch_s = (time.perf_counter() - start) / args.loop
+    looped = np.array(looped)
+    ok = ~np.isnan(looped).any(axis=1) & converged
+    loop_cost = ((sigmoid(DELTAS, *looped[ok].T[:, :, None]) - curves[ok]) ** 2).sum(axis=1)
+    worse = int(np.sum(cost[ok] > loop_cost * (1 + 1e-6) + 1e-12))
+    print(f"{args.loop} replicates of {args.recordings} recordings: curve_fit {loop_s * 1e6:.0f} us/fit "
+          f"({failed} failed), batched {batch_s * 1e6:.0f} us/fit ({int(np.sum(~converged))} not converged), "
+          f"{loop_s / batch_s:.0f}x, {worse} fits with a higher cost than curve_fit")
+
+    start = time.perf_counter()
+    boot = bootstrap({"a": errors, "b": errors * 1.5}, DELTAS, args.replicates, args.workers, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"bootstrap, 2 conditions x {args.replicates} replicates: {elapsed:.2f}s "
+          f"(curve_fit loop would take about {2 * args.replicates * loop_s:.1f}s)")
+    return 0 if worse == 0 and all(len(p) == args.replicates for p in boot.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Session store write rate, crash recovery and time-range reads against whole-file loads.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_session_store.py [--hours 4]
+
+A synthetic recording is written to a session store in 0.5 s blocks, the
+way SerialIngest delivers it, and as a cleaned text capture. Slicing a
+minute out of the text file means loading all of it; the store reads the
+one or two chunks involved. The store is then torn mid-chunk and recovered.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from adc_loader import load_adc_array  # noqa: E402
+from session_store import SessionReader, SessionWriter, recover_session  # noqa: E402
+from synthetic import SAMPLE_RATE, breathing_signal, write_clean_text  # noqa: E402
+
+BLOCK = int(0.5 * SAMPLE_RATE)
+SLICE_S = 60
+SLICES = 20
+
+
+def best_time(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the session store.")
+    parser.add_argument("--hours", type=float, default=4.0)
+    args = parser.parse_args(argv)
+    seconds = args.hours * 3600
+    samples = breathing_signal(seconds, seed=0)["samples"]
+    n = len(samples)
+    rng = np.random.default_rng(1)
+    starts = rng.uniform(0, seconds - SLICE_S, SLICES)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = os.path.join(workdir, "session.adcs")
+        text = os.path.join(workdir, "session.data")
+        start_time = time.time() - seconds
+        t = time.perf_counter()
+        with SessionWriter(store, start_time=start_time) as writer:
+            for i in range(0, n, BLOCK):
+                writer.write(samples[i:i + BLOCK], timestamp=start_time + min(i + BLOCK, n) / SAMPLE_RATE)
+        write_s = time.perf_counter() - t
+        write_clean_text(text, samples)
+        print(f"{args.hours:g} h, {n:,} rows, {writer.chunks_written} chunks: written in {write_s:.2f} s "
+              f"({n / write_s / SAMPLE_RATE:,.0f}x real time, fsync per chunk)")
+
+        t = time.perf_counter()
+        with SessionReader(store) as reader:
+            open_s = time.perf_counter() - t
+            ok = all((reader.read_time(s, s + SLICE_S) ==
+                      samples[reader.time_to_sample(s):reader.time_to_sample(s + SLICE_S)]).all() for s in starts)
+            slice_s = best_time(lambda: [reader.read_time(s, s + SLICE_S) for s in starts], 3) / SLICES
+            full_s = best_time(reader.read, 1)
+        text_s = best_time(lambda: load_adc_array(text)[int(starts[0] * SAMPLE_RATE):], 1)
+        print(f"open (index load) {open_s * 1000:.2f} ms")
+        print(f"{SLICE_S} s slice: store {slice_s * 1000:.2f} ms, text capture {text_s * 1000:.0f} ms "
+              f"(whole file), {text_s / slice_s:,.0f}x")
+        print(f"whole store read {full_s * 1000:.0f} ms, slices match: {ok}")
+
+        size = os.path.getsize(store)
+        os.truncate(store, size - 1000)
+        t = time.perf_counter()
+        result = recover_session(store)
+        recover_s = time.perf_counter() - t
+        print(f"torn tail recovered in {recover_s * 1000:.1f} ms: kept {result['rows']:,} rows, "
+              f"dropped {result['dropped_bytes']} bytes")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Adaptive channel selection against always fusing both channels.
+
+Run from the repository root:
+    python PythonProject3/benchmarks/bench_signal_quality.py [--hours 1]
+
+On data/ the breath counts must not change; the time saved comes from the
+recordings whose ADC2 peaks leave fusion nothing to fill. On a synthetic
+recording the same comparison is made with both channels live, with ADC1
+reading a flat 0 and with ADC2 reading a flat 0.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from adc_loader import load_adc_array  # noqa: E402
+from batch_eval import find_recordings  # noqa: E402
+from breath_pipeline import evaluate_samples  # noqa: E402
+from signal_quality import window_quality  # noqa: E402
+from synthetic import SAMPLE_RATE, breathing_signal  # noqa: E402
+
+REPEATS = 3
+
+
+def best_time(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark adaptive channel selection.")
+    parser.add_argument("--hours", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    recordings = [load_adc_array(path) for path, _, _ in find_recordings("./data")]
+    ok = True
+    if recordings:
+        fused = [evaluate_samples(samples, adaptive=False)["breaths"] for samples in recordings]
+        results = [evaluate_samples(samples) for samples in recordings]
+        same = sum(r["breaths"] == b for r, b in zip(results, fused))
+        ok = same == len(recordings)
+        modes = {}
+        for r in results:
+            modes[r["mode"]] = modes.get(r["mode"], 0) + 1
+        fused_s = best_time(lambda: [evaluate_samples(samples, adaptive=False) for samples in recordings])
+        adaptive_s = best_time(lambda: [evaluate_samples(samples) for samples in recordings])
+        print(f"data/: {len(recordings)} recordings, {same} same counts, modes {modes}")
+        print(f"  always fused {fused_s * 1000:.0f} ms, adaptive {adaptive_s * 1000:.0f} ms "
+              f"({fused_s / adaptive_s:.2f}x)")
+
+    samples = breathing_signal(args.hours * 3600, seed=0)["samples"]
+    quality_s = best_time(lambda: window_quality(samples, SAMPLE_RATE))
+    print(f"synthetic {args.hours:g} h, {len(samples):,} rows: quality index {quality_s * 1000:.0f} ms")
+    for label, dead in (("both live", None), ("ADC1 flat", 0), ("ADC2 flat", 1)):
+        case = samples.copy()
+        if dead is not None:
+            case[:, dead] = 0
+        result = evaluate_samples(case)
+        fused_s = best_time(lambda: evaluate_samples(case, adaptive=False))
+        adaptive_s = best_time(lambda: evaluate_samples(case))
+        print(f"  {label}: mode {result['mode']}, {result['breaths']} breaths "
+              f"(always fused {evaluate_samples(case, adaptive=False)['breaths']}), "
+              f"{fused_s * 1000:.0f} ms -> {adaptive_s * 1000:.0f} ms ({fused_s / adaptive_s:.2f}x)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
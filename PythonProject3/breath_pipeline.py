@@ -0,0 +1,408 @@
+"""The evaluation pipeline of eval_data without plotting, globals or menus:
+moving average, z-score, optional decimation, peak finding on ADC1 and
+inverted ADC2, fusion.
+
+evaluate_file_chunked runs the same pipeline over a file read in chunks, for
+recordings too long to hold in memory, with an identical result.
+"""
+import json
+import os
+
+import numpy as np
+
+from adc_loader import CHUNK_SAMPLES, iter_adc_chunks, load_adc_array, read_header
+from capture_format import effective_sample_rate
+from fusion import (ABNORMAL_GAP, MATCH_TOLERANCE, FusedPeaks, count_breaths, fuse, fuse_peaks, has_abnormal_gap,
+                    print_fills)
+from ma_filters import MA_filter, RunningMovingAverage, RunningStats, window_sums
+from metrics import stage
+from peak_finding import ChunkedPlateauPeaks, find_plateau_peaks
+from signal_quality import (MODE_ADC1, MODE_ADC2, MODE_FUSED, MODE_REJECT, QualityTracker, channel_usable,
+                            overall_mode, quality_summary, window_modes, window_quality, with_regularity)
+
+SAMPLE_RATE = 650  # Hz, STM32 ADC sampling rate
+WINDOW_SIZE = 1200
+PROMINENCE = 0.1  # in standard deviations of the filtered signal
+PEAK_DISTANCE = 1000  # samples
+DECIMATE = 1  # peak detection at the full rate unless asked otherwise
+DECIMATION_HALF_TAPS = 4
+ADAPTIVE = True  # skip channels signal_quality finds unusable, and ADC1 when fusion would not use it
+# Tuned settings written by param_sweep.py, kept next to the scripts so every working directory finds them
+EVAL_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_config.json")
+CONFIG_KEYS = ("window_size", "prominence", "distance", "match_tolerance", "abnormal_gap", "decimate")
+
+
+def default_config():
+    return {"window_size": WINDOW_SIZE, "prominence": PROMINENCE, "distance": PEAK_DISTANCE,
+            "match_tolerance": MATCH_TOLERANCE, "abnormal_gap": ABNORMAL_GAP, "decimate": DECIMATE}
+
+
+def load_eval_config(path=EVAL_CONFIG):
+    """Pipeline settings from a config file, with the defaults for anything it does not set.
+
+    A missing file gives the defaults. Keys other than CONFIG_KEYS (the
+    sweep's scores, say) are ignored.
+    """
+    config = default_config()
+    if path and os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+        config.update({key: stored[key] for key in CONFIG_KEYS if key in stored})
+    return config
+
+
+def save_eval_config(config, path=EVAL_CONFIG, **extra):
+    """Write the CONFIG_KEYS of config, plus any extra entries, as JSON."""
+    stored = {key: config[key] for key in CONFIG_KEYS}
+    stored.update(extra)
+    with open(path, "w") as f:
+        json.dump(stored, f, indent=2)
+        f.write("\n")
+
+
+def normalize(filtered, mean=None, std=None):
+    """Z-score each channel. A flat channel becomes NaN, which find_peaks ignores.
+
+    mean and std default to those of filtered; pass filtered_stats() to get
+    the values the chunked path uses.
+    """
+    if mean is None:
+        mean = np.mean(filtered, axis=0)
+    if std is None:
+        std = np.std(filtered, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (filtered - mean) / std
+
+
+def _moments(stats, window_size):
+    return stats.mean() / window_size, stats.std() / window_size
+
+
+def filtered_stats(samples, window_size):
+    """Mean and std of MA_filter(samples, window_size) for each channel, from its exact integer window sums.
+
+    The chunked path gathers the same sums chunk by chunk, so both normalise
+    to the same values bit for bit. Float samples (and recordings shorter
+    than the window) give (None, None), leaving the statistics to normalize.
+    """
+    samples = np.asarray(samples)
+    if not np.issubdtype(samples.dtype, np.integer) or not 1 <= window_size <= len(samples):
+        return None, None
+    sums = window_sums(samples, window_size)
+    moments = []
+    for column in sums.reshape(len(sums), -1).T:
+        stats = RunningStats()
+        stats.update(column)
+        moments.append(_moments(stats, window_size))
+    if samples.ndim == 1:
+        return moments[0]
+    return np.array([m for m, _ in moments]), np.array([s for _, s in moments])
+
+
+def plateau_peaks(signal, prominence=PROMINENCE, distance=PEAK_DISTANCE):
+    """Plateau midpoints of the peaks find_peaks reports for signal (see peak_finding).
+
+    distance is kept between plateau edges. A channel clipped at the ADC
+    limit gives the exact moving average flat tops hundreds of samples
+    wide; measured from their midpoints, a neighbour half a plateau closer
+    than distance would count as a breath of its own.
+    """
+    return find_plateau_peaks(signal, prominence, distance, from_edges=True)
+
+
+def decimation_factor(sample_rate, target_rate):
+    """Largest integer factor that keeps sample_rate / factor at or above target_rate."""
+    return max(1, int(sample_rate // target_rate))
+
+
+def decimate_signal(signal, factor):
+    """Anti-aliased polyphase decimation along axis 0.
+
+    The moving average has already removed most of the band, so a short
+    Kaiser FIR (DECIMATION_HALF_TAPS taps per output sample on each side)
+    is enough and costs less than half of scipy's default. The filter is
+    zero-phase, so sample k of the result lines up with sample k * factor of
+    the input. The edges are padded with a fitted line rather than zeros,
+    which would otherwise dip into fake peaks.
+    """
+    from scipy.signal import firwin, resample_poly  # slow to import, only needed when decimating
+    taps = firwin(2 * DECIMATION_HALF_TAPS * factor + 1, 1 / factor, window=('kaiser', 5.0))
+    return resample_poly(signal, 1, factor, axis=0, window=taps, padtype='line')
+
+
+def decimated_peaks(signals, factor, prominence=PROMINENCE, distance=PEAK_DISTANCE):
+    """plateau_peaks for each column of signals, found at 1/factor of the rate.
+
+    distance is rescaled to the reduced rate and prominence, being in
+    standard deviations, carries over. The returned indices are mapped back
+    to the full rate, so they are accurate to about factor / 2 samples.
+    """
+    return reduced_peaks(decimate_signal(signals, factor), factor, prominence, distance)
+
+
+def reduced_peaks(reduced, factor, prominence=PROMINENCE, distance=PEAK_DISTANCE):
+    """decimated_peaks for signals already decimated by factor."""
+    distance = max(1.0, distance / factor)
+    return [[mid * factor for mid in plateau_peaks(reduced[:, c], prominence, distance)]
+            for c in range(reduced.shape[1])]
+
+
+def channel_peaks(samples, channel, window_size=WINDOW_SIZE, prominence=PROMINENCE, distance=PEAK_DISTANCE,
+                  decimate=DECIMATE):
+    """Filter, normalise and find the peaks of one raw channel; return (normalised signal, peaks).
+
+    ADC2 (channel 1) is reflected in the y-axis, as in evaluate_samples.
+    """
+    with stage("ma_filter", len(samples)) as timer:
+        filtered = MA_filter(samples[:, channel], window_size)
+        timer.output(filtered)
+    with stage("normalize", len(filtered)) as timer:
+        normalized = normalize(filtered, *filtered_stats(samples[:, channel], window_size))
+        if channel == 1:
+            normalized = -normalized
+        timer.output(normalized)
+    with stage("find_peaks", len(normalized)):
+        if decimate > 1:
+            mids = decimated_peaks(normalized[:, None], decimate, prominence, distance)[0]
+        else:
+            mids = plateau_peaks(normalized, prominence, distance)
+    return normalized, mids
+
+
+def fuse_channels(mode, plateau_mids1, plateau_mids2, match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP):
+    """fusion.fuse's peaks for a signal_quality mode.
+
+    A lone usable channel still goes through fusion, with nothing to match
+    against, so its abnormal gaps are filled with interpolated midpoints.
+    """
+    if mode == MODE_REJECT:
+        return fuse([], [])
+    if mode == MODE_ADC1:
+        return fuse([], plateau_mids1, match_tolerance, abnormal_gap)
+    return fuse(plateau_mids1 if mode == MODE_FUSED else [], plateau_mids2, match_tolerance, abnormal_gap)
+
+
+def choose_window_modes(quality, usable, plateau_mids1, plateau_mids2, window_size=WINDOW_SIZE,
+                        abnormal_gap=ABNORMAL_GAP):
+    """Return (quality with the peaks' regularity, the mode of every quality window).
+
+    plateau_mids1 or plateau_mids2 is None for a channel not searched (yet),
+    whose regularity is then unknown. usable masks out whole channels, as
+    channel_usable gives them. A window that would be fused takes ADC2 alone
+    when ADC2 has no abnormal gap, since fusion would not use ADC1.
+    """
+    quality = with_regularity(quality, (plateau_mids1, plateau_mids2), (window_size - 1) / 2, abnormal_gap)
+    modes = window_modes(quality, usable)
+    if not has_abnormal_gap(plateau_mids2 if plateau_mids2 is not None else [], abnormal_gap):
+        modes[modes == MODE_FUSED] = MODE_ADC2
+    return quality, modes
+
+
+def fuse_windows(quality, modes, plateau_mids1, plateau_mids2, window_size=WINDOW_SIZE,
+                 match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP):
+    """FusedPeaks of a recording whose quality windows took modes: in each window, those of its mode's fuse_channels.
+
+    A peak belongs to the window holding the middle of its moving average.
+    Where the mode changes, the two channels may each have found the same
+    breath, one on either side of the window edge, so a peak within
+    match_tolerance median gaps after one of another mode is dropped.
+    """
+    offset = (window_size - 1) / 2
+    index, source, origin = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int8)], [np.zeros(0, dtype=int)]
+    for j, mode in enumerate(np.unique(modes)):
+        fused = fuse_channels(mode, plateau_mids1, plateau_mids2, match_tolerance, abnormal_gap)
+        window = np.searchsorted(quality["start"], fused.index + offset, side='right') - 1
+        keep = modes[np.clip(window, 0, len(modes) - 1)] == mode
+        index.append(fused.index[keep])
+        source.append(fused.source[keep])
+        origin.append(np.full(np.count_nonzero(keep), j))
+    index, source, origin = np.concatenate(index), np.concatenate(source), np.concatenate(origin)
+    order = np.argsort(index, kind='stable')
+    index, source, origin = index[order], source[order], origin[order]
+    if index.size > 2:
+        gaps = np.diff(index)
+        seam = (origin[1:] != origin[:-1]) & (gaps < np.median(gaps) * match_tolerance)
+        keep = np.concatenate(([True], ~seam))
+        index, source = index[keep], source[keep]
+    return FusedPeaks(index, source)
+
+
+def evaluate_samples(samples, window_size=WINDOW_SIZE, prominence=PROMINENCE, distance=PEAK_DISTANCE,
+                     sample_rate=SAMPLE_RATE, duration=None, verbose=False, decimate=DECIMATE,
+                     match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP, adaptive=ADAPTIVE):
+    """Run the pipeline on an (N, 2) array of raw ADC samples.
+
+    duration defaults to the sample count divided by sample_rate. With
+    decimate > 1 peaks are searched on the normalised channels decimated by
+    that factor (see decimated_peaks); window_size and distance stay in
+    full-rate samples either way. match_tolerance and abnormal_gap go to
+    fusion.fuse. Returns a dict with the normalised channels,
+    the per-channel and fused peak indices, the breath count and the breath
+    rate, plus the mode and a quality summary from signal_quality.
+
+    With adaptive, a channel signal_quality finds unusable is neither
+    filtered nor searched, and the mode is chosen for every quality window
+    from the channels' quality there and the regularity of their peaks (see
+    choose_window_modes and fuse_windows). ADC2 is processed first, so ADC1
+    is skipped when no window needs it, such as when ADC2 is regular
+    throughout and has no abnormal gap for fusion to fill. Skipped channels
+    are None in the result. A recording with no usable channel is rejected
+    with 0 breaths.
+    """
+    samples = np.asarray(samples)
+    if duration is None:
+        duration = len(samples) / sample_rate
+    with stage("quality", len(samples)):
+        quality = window_quality(samples, sample_rate)
+    if adaptive:
+        return _adaptive_eval(quality, duration,
+                              lambda channel: channel_peaks(samples, channel, window_size, prominence, distance,
+                                                            decimate),
+                              window_size, verbose, match_tolerance, abnormal_gap)
+
+    with stage("ma_filter", len(samples)) as timer:
+        filtered = MA_filter(samples, window_size)
+        timer.output(filtered)
+    with stage("normalize", len(filtered)) as timer:
+        normalized = normalize(filtered, *filtered_stats(samples, window_size))
+        adc1_normalized = normalized[:, 0]
+        # reflect adc2_normalized in the y-axis
+        adc2_normalized = -normalized[:, 1]
+        timer.output(normalized)
+        timer.output(adc2_normalized)
+    with stage("find_peaks", len(normalized)):
+        if decimate > 1:
+            plateau_mids1, plateau_mids2 = decimated_peaks(np.stack((adc1_normalized, adc2_normalized), axis=1),
+                                                           decimate, prominence, distance)
+        else:
+            plateau_mids1 = plateau_peaks(adc1_normalized, prominence, distance)
+            plateau_mids2 = plateau_peaks(adc2_normalized, prominence, distance)
+    with stage("fusion", len(plateau_mids2)):
+        final_peak_index = fuse_peaks(plateau_mids1, plateau_mids2, verbose, match_tolerance, abnormal_gap)
+    return _result(quality, duration, MODE_FUSED, None, window_size, final_peak_index,
+                   (adc1_normalized, plateau_mids1), (adc2_normalized, plateau_mids2))
+
+
+def adaptive_fuse(quality, find, window_size=WINDOW_SIZE, match_tolerance=MATCH_TOLERANCE,
+                  abnormal_gap=ABNORMAL_GAP):
+    """The adaptive choice of channels, with find(channel) giving (normalised signal, peaks) when called.
+
+    Returns (quality with regularity, window modes, FusedPeaks, adc1, adc2),
+    adc1 and adc2 being find's results or (None, None) for a channel skipped.
+    """
+    usable = channel_usable(quality)
+    adc1 = adc2 = (None, None)
+    if usable[1]:
+        adc2 = find(1)
+    quality, modes = choose_window_modes(quality, usable, None, adc2[1], window_size, abnormal_gap)
+    if usable[0] and np.isin(modes, (MODE_FUSED, MODE_ADC1)).any():
+        adc1 = find(0)
+        quality, modes = choose_window_modes(quality, usable, adc1[1], adc2[1], window_size, abnormal_gap)
+    with stage("fusion", len(adc2[1] or adc1[1] or [])):
+        fused = fuse_windows(quality, modes, adc1[1], adc2[1], window_size, match_tolerance, abnormal_gap)
+    return quality, modes, fused, adc1, adc2
+
+
+def _adaptive_eval(quality, duration, find, window_size, verbose, match_tolerance, abnormal_gap):
+    """The adaptive branch of evaluate_samples (see adaptive_fuse)."""
+    quality, modes, fused, adc1, adc2 = adaptive_fuse(quality, find, window_size, match_tolerance, abnormal_gap)
+    if verbose:
+        print_fills(fused)
+    return _result(quality, duration, overall_mode(modes), modes, window_size, fused.index.tolist(), adc1, adc2)
+
+
+def _result(quality, duration, mode, modes, window_size, final_peak_index, adc1, adc2):
+    """evaluate_samples' result dict; adc1 and adc2 are (normalised signal, peaks), None where skipped.
+
+    mode is the recording's and modes those of its quality windows, None
+    when the mode was not chosen window by window.
+    """
+    breaths = count_breaths(len(final_peak_index), window_size) if mode != MODE_REJECT else 0
+    return {
+        "adc1_normalized": adc1[0],
+        "adc2_normalized": adc2[0],
+        "plateau_mids1": adc1[1],
+        "plateau_mids2": adc2[1],
+        "peaks": final_peak_index,
+        "breaths": breaths,
+        "duration": duration,
+        "bpm": breaths / (duration / 60) if duration else 0.0,
+        "mode": mode,
+        "quality": quality_summary(quality, mode, modes),
+    }
+
+
+def evaluate_file(filename, window_size=WINDOW_SIZE, **kwargs):
+    """evaluate_samples on a text or binary capture, at the rate its header measured or states, if it has one.
+
+    A capture whose rate was measured while recording (see sample_clock)
+    gets a duration from its sample count that no wall-clock timing matches.
+    """
+    header = None if "sample_rate" in kwargs else read_header(filename)
+    if header is not None:
+        kwargs["sample_rate"] = effective_sample_rate(header)
+    with stage("load") as timer:
+        samples = load_adc_array(filename)
+        timer.count(len(samples))
+        timer.output(samples)
+    return evaluate_samples(samples, window_size, **kwargs)
+
+
+def _chunked_channel_peaks(filename, channel, window_size, mean, std, prominence, distance, chunk_samples):
+    """channel_peaks' peaks for one channel of a file, read in chunks."""
+    ma = RunningMovingAverage(window_size)
+    peaks = ChunkedPlateauPeaks(prominence, distance, from_edges=True)
+    for chunk in iter_adc_chunks(filename, chunk_samples):
+        # The moving average carries the last window_size - 1 samples over to the next chunk
+        normalized = normalize(ma.update(chunk[:, channel]) / window_size, mean, std)
+        peaks.extend(-normalized if channel == 1 else normalized)
+    return peaks.finish()
+
+
+def evaluate_file_chunked(filename, window_size=WINDOW_SIZE, prominence=PROMINENCE, distance=PEAK_DISTANCE,
+                          sample_rate=None, duration=None, verbose=False, decimate=DECIMATE,
+                          match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP, adaptive=ADAPTIVE,
+                          chunk_samples=CHUNK_SAMPLES):
+    """evaluate_file for recordings of any length, reading the file chunk_samples rows at a time.
+
+    The result is the one evaluate_file gives, except that the normalised
+    channels, which would be as long as the recording, are None. A first
+    pass gathers the quality windows and the exact filter statistics; every
+    channel the mode needs then gets a pass of its own, collecting peak
+    candidates for ChunkedPlateauPeaks to select from at the end. Memory
+    is a few chunks plus the filter window and the peak candidates, a few
+    numbers per second of signal, so a day-long file fits easily.
+    Peaks are found at the full rate, so decimate must be 1.
+    """
+    if decimate > 1:
+        raise ValueError(f"Chunked evaluation finds peaks at the full rate, got decimate={decimate}")
+    if sample_rate is None:
+        sample_rate = effective_sample_rate(read_header(filename), SAMPLE_RATE)
+    tracker = QualityTracker(sample_rate)
+    ma = RunningMovingAverage(window_size, channels=2)
+    stats = (RunningStats(), RunningStats())
+    n = 0
+    with stage("quality") as timer:
+        for chunk in iter_adc_chunks(filename, chunk_samples):
+            n += len(chunk)
+            tracker.feed(chunk)
+            sums = ma.update(chunk)
+            for c in range(2):
+                stats[c].update(sums[:, c])
+        timer.count(n)
+    quality = tracker.result()
+    if duration is None:
+        duration = n / sample_rate
+
+    def find(channel):
+        mean, std = _moments(stats[channel], window_size)
+        with stage("find_peaks", n):
+            return None, _chunked_channel_peaks(filename, channel, window_size, mean, std, prominence, distance,
+                                                chunk_samples)
+
+    if adaptive:
+        return _adaptive_eval(quality, duration, find, window_size, verbose, match_tolerance, abnormal_gap)
+    adc1, adc2 = find(0), find(1)
+    with stage("fusion", len(adc2[1])):
+        final_peak_index = fuse_peaks(adc1[1], adc2[1], verbose, match_tolerance, abnormal_gap)
+    return _result(quality, duration, MODE_FUSED, None, window_size, final_peak_index, adc1, adc2)
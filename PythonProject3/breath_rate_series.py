@@ -0,0 +1,136 @@
+"""Breath rate as a function of time over overlapping windows of a long session.
+
+Peaks are found once for the whole recording (streamed in bounded memory
+through breath_stream), then every window just counts the peaks that fall in
+it, so overlapping windows share the work instead of reprocessing samples.
+
+    python breath_rate_series.py capture.adcb [--span 60] [--hop 10] [-o series.csv]
+
+Each window also gets the signal_quality mode of the raw samples it covers
+(fused, adc1, adc2 or reject), so a rate from a dead or noisy stretch can be
+told apart from a good one.
+"""
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from adc_loader import CHUNK_SAMPLES, iter_adc_chunks, read_header
+from breath_pipeline import PEAK_DISTANCE, PROMINENCE, SAMPLE_RATE, WINDOW_SIZE
+from breath_stream import StreamingBreathRate
+from capture_format import effective_sample_rate
+from fusion import SOURCE_ORIGINAL
+from signal_quality import span_modes
+
+SPAN_S = 60.0  # length of each rate window
+HOP_S = 10.0  # time between window starts
+MIN_INTERVALS = 3  # breath intervals a window needs for full confidence
+
+# Columns of the (M, 3) array rate_series returns
+TIME, BPM, CONFIDENCE = range(3)
+
+
+def peak_times(peaks, window_size=WINDOW_SIZE, sample_rate=SAMPLE_RATE):
+    """Seconds from the start of the recording for peak indices into the 'valid' filtered signal."""
+    # Filtered sample i averages raw samples i .. i + window_size - 1
+    return (np.asarray(peaks, dtype=np.float64) + (window_size - 1) / 2) / sample_rate
+
+
+def rate_series(peaks, duration, sources=None, span=SPAN_S, hop=HOP_S,
+                window_size=WINDOW_SIZE, sample_rate=SAMPLE_RATE):
+    """Breath rate over windows of span seconds starting every hop seconds.
+
+    peaks are sorted fused peak indices as the pipeline returns them and
+    sources their fusion.SOURCE_* codes (all treated as original ADC2 peaks
+    if None). Returns an (M, 3) float array of (window end time, bpm,
+    confidence) rows. bpm comes from the mean interval between the peaks in
+    the window, so it needs no edge correction; it is NaN with fewer than
+    two peaks. confidence in [0, 1] drops with interval irregularity, with
+    the share of peaks fusion had to fill in, and with fewer than
+    MIN_INTERVALS intervals.
+
+    All windows are computed together from prefix sums over the peak list,
+    costing O(M log P) for P peaks regardless of span.
+    """
+    times = peak_times(peaks, window_size, sample_rate)
+    if sources is None:
+        original = np.ones(times.size, dtype=bool)
+    else:
+        original = np.asarray(sources) == SOURCE_ORIGINAL
+    n_windows = max(1, int(np.floor((duration - span) / hop)) + 1) if duration > 0 else 0
+    starts = np.arange(n_windows) * hop
+    ends = np.minimum(starts + span, duration)
+
+    lo = np.searchsorted(times, starts, side='left')
+    hi = np.searchsorted(times, ends, side='left')
+    count = hi - lo
+    intervals = count - 1
+
+    gaps = np.diff(times)
+    gap_sq_total = np.concatenate(([0.0], np.cumsum(gaps * gaps)))
+    original_total = np.concatenate(([0], np.cumsum(original)))
+
+    out = np.full((n_windows, 3), np.nan)
+    out[:, TIME] = ends
+    out[:, CONFIDENCE] = 0.0
+    ok = intervals > 0
+    first, last, m = lo[ok], hi[ok] - 1, intervals[ok]
+    total = times[last] - times[first]
+    mean = total / m
+    var = np.maximum((gap_sq_total[last] - gap_sq_total[first]) / m - mean * mean, 0.0)
+    regularity = np.maximum(1 - np.sqrt(var) / mean, 0.0)
+    original_share = (original_total[last + 1] - original_total[first]) / count[ok]
+    out[ok, BPM] = 60 / mean
+    out[ok, CONFIDENCE] = regularity * original_share * np.minimum(m / MIN_INTERVALS, 1.0)
+    return out
+
+
+def file_rate_series(filename, span=SPAN_S, hop=HOP_S, window_size=WINDOW_SIZE, sample_rate=None,
+                     prominence=PROMINENCE, distance=PEAK_DISTANCE, chunk_samples=CHUNK_SAMPLES):
+    """rate_series for a text or binary capture, read chunk by chunk, and the quality mode of each window.
+
+    Memory is bounded by chunk_samples plus a few numbers per local maximum
+    of the filtered signal, so multi-hour recordings are fine. The peaks are
+    the ones evaluate_file finds on the whole file, from the channels its
+    signal_quality modes use, and each window's mode comes from the same
+    quality windows, with the regularity of those peaks. Returns (series,
+    modes).
+    """
+    if sample_rate is None:
+        sample_rate = effective_sample_rate(read_header(filename), SAMPLE_RATE)
+    estimator = StreamingBreathRate(window_size, sample_rate, prominence, distance, live=False)
+    for chunk in iter_adc_chunks(filename, chunk_samples):
+        estimator.feed(chunk)
+    result = estimator.finalize()
+    series = rate_series(result["peaks"], result["duration"], result["sources"], span, hop,
+                         window_size, sample_rate)
+    ends = np.round(series[:, TIME] * sample_rate).astype(np.int64)
+    starts = np.round(np.maximum(series[:, TIME] - span, 0.0) * sample_rate).astype(np.int64)
+    return series, span_modes(estimator.quality, starts, ends)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Breath rate over sliding windows of a capture.")
+    parser.add_argument("filename")
+    parser.add_argument("--span", type=float, default=SPAN_S, help="window length in seconds")
+    parser.add_argument("--hop", type=float, default=HOP_S, help="seconds between window starts")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="moving average window in samples")
+    parser.add_argument("-o", "--output", help="write CSV here instead of stdout")
+    args = parser.parse_args(argv)
+
+    series, modes = file_rate_series(args.filename, args.span, args.hop, args.window)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["time", "bpm", "confidence", "quality"])
+        for (time_s, bpm, confidence), mode in zip(series.tolist(), modes.tolist()):
+            writer.writerow([f"{time_s:.2f}", f"{bpm:.2f}", f"{confidence:.3f}", mode])
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+from collections import deque
+
+import numpy as np
+
+from breath_pipeline import PEAK_DISTANCE, PROMINENCE, SAMPLE_RATE, WINDOW_SIZE, adaptive_fuse
+from fusion import ABNORMAL_GAP, MATCH_TOLERANCE, count_breaths
+from ma_filters import RunningMovingAverage, RunningStats
+from peak_finding import StreamingPeaks
+from signal_quality import MODE_REJECT, QualityTracker, overall_mode, quality_summary
+
+RECENT_GAPS = 16  # ADC2 peak gaps kept for the live fusion tolerance
+RECENT_PEAKS = 64  # live fused peak positions kept for display
+
+
+class _ChannelTracker:
+    """Moving average, normalisation statistics and peak finding for one ADC channel."""
+
+    def __init__(self, window_size, invert, live=True):
+        self.ma = RunningMovingAverage(window_size)
+        self.stats = RunningStats()
+        self.peaks = StreamingPeaks(live)
+        self.sign = -1 if invert else 1
+
+    def update(self, samples, prominence):
+        """Filter a chunk and return the candidate indices of peaks confirmed live."""
+        sums = self.ma.update(samples) * self.sign
+        self.stats.update(sums)
+        return self.peaks.extend(sums, prominence * self.stats.std())
+
+    def extend(self, samples):
+        """Filter a chunk and collect its peak candidates without live confirmation."""
+        sums = self.ma.update(samples) * self.sign
+        self.stats.update(sums)
+        self.peaks.extend(sums)
+
+
+class StreamingBreathRate:
+    """Stateful breath-rate estimator fed with raw (adc1, adc2) sample chunks.
+
+    feed() runs the same stages as eval_data (moving average, z-score, peak
+    finding on ADC1 and inverted ADC2, fusion) incrementally and returns a
+    list of updates, one per breath confirmed in that chunk. Live values use
+    the statistics seen so far; finalize() replays the batch selection with the
+    session-wide statistics and picks the signal_quality mode from the
+    quality windows of everything fed, so its count and mode match
+    evaluate_samples on the same samples.
+
+    Per-sample work is amortised O(1). Memory is the filter window plus a
+    few numbers per local maximum of the filtered signal, independent of how
+    many raw samples have been fed.
+
+    With live=False feed() skips the live estimate and returns no updates;
+    finalize() gives the same result much faster, which suits offline use.
+    match_tolerance and abnormal_gap are fusion's, for the live fusion and
+    finalize() alike.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, sample_rate=SAMPLE_RATE,
+                 prominence=PROMINENCE, distance=PEAK_DISTANCE, live=True, match_tolerance=MATCH_TOLERANCE,
+                 abnormal_gap=ABNORMAL_GAP):
+        self.window_size = window_size
+        self.sample_rate = sample_rate
+        self.prominence = prominence
+        self.distance = distance
+        self.match_tolerance = match_tolerance
+        self.abnormal_gap = abnormal_gap
+        self.live = live
+        self.samples_seen = 0
+        self._adc1 = _ChannelTracker(window_size, invert=False, live=live)
+        self._adc2 = _ChannelTracker(window_size, invert=True, live=live)
+        self._quality = QualityTracker(sample_rate)
+        self.quality = None  # window quality with the regularity of the final peaks, set by finalize()
+        self._recent_adc1 = deque()
+        self._adc2_live = []  # last live ADC2 peak kept as [position, height, plateau end]
+        self._gaps = deque(maxlen=RECENT_GAPS)
+        self.live_peaks = 0
+        self.recent_peaks = deque(maxlen=RECENT_PEAKS)  # positions of the latest live fused peaks
+        self.matched_from_adc1 = 0
+        self.interpolated = 0
+
+    def feed(self, samples):
+        """Feed an (N, 2) chunk of raw ADC samples, return a list of rate updates."""
+        samples = np.asarray(samples).reshape(-1, 2)
+        self.samples_seen += len(samples)
+        self._quality.feed(samples)
+        if not self.live:
+            self._adc1.extend(samples[:, 0])
+            self._adc2.extend(samples[:, 1])
+            return []
+        positions1 = self._adc1.peaks.positions
+        for cand in self._adc1.update(samples[:, 0], self.prominence):
+            self._recent_adc1.append(positions1[cand])
+        updates = []
+        peaks2 = self._adc2.peaks
+        for cand in self._adc2.update(samples[:, 1], self.prominence):
+            if self._add_live_adc2_peak(peaks2.positions[cand], peaks2.heights[cand], peaks2.lefts[cand],
+                                        peaks2.rights[cand]):
+                updates.append(self.current())
+        return updates
+
+    def _add_live_adc2_peak(self, pos, height, left, right):
+        """Apply the distance rule (between plateau edges) and online fusion to a confirmed ADC2 peak."""
+        if self._adc2_live and left - self._adc2_live[2] < self.distance:
+            if height > self._adc2_live[1]:
+                self._adc2_live = [pos, height, right]  # a higher peak too close replaces the last one
+                self.recent_peaks[-1] = pos
+            return False
+        added = 1
+        if self._adc2_live:
+            prev = self._adc2_live[0]
+            gap = pos - prev
+            # ADC1 peaks before the previous breath can no longer match a gap
+            while self._recent_adc1 and self._recent_adc1[0] < prev:
+                self._recent_adc1.popleft()
+            if len(self._gaps) >= 2:
+                median_gap = float(np.median(self._gaps))
+                if gap > median_gap * self.abnormal_gap:
+                    # Missed breath: look for an ADC1 peak near the middle, else interpolate
+                    middle = (prev + pos) / 2
+                    match = next((m for m in self._recent_adc1 if abs(m - middle) < median_gap * self.match_tolerance), None)
+                    if match is not None:
+                        self.matched_from_adc1 += 1
+                        self.recent_peaks.append(match)
+                    else:
+                        self.interpolated += 1
+                        self.recent_peaks.append(int(middle))
+                    added += 1
+            self._gaps.append(gap)
+        self._adc2_live = [pos, height, right]
+        self.recent_peaks.append(pos)
+        self.live_peaks += added
+        return True
+
+    def current(self):
+        """Latest estimate as a dict with the sample index, elapsed time, breaths and bpm."""
+        elapsed = self.samples_seen / self.sample_rate
+        breaths = count_breaths(self.live_peaks, self.window_size) if self.live_peaks else 0
+        interval_bpm = None
+        if self._gaps:
+            interval_bpm = 60 * self.sample_rate / float(np.median(self._gaps))
+        return {
+            "sample": self.samples_seen,
+            "time": elapsed,
+            "breaths": breaths,
+            "bpm": breaths / (elapsed / 60) if elapsed else 0.0,
+            "interval_bpm": interval_bpm,
+        }
+
+    def finalize(self):
+        """Finish the session and return the batch-equivalent result dict.
+
+        "peaks" are the fused peak indices as evaluate_samples computes them
+        and "sources" their fusion.SOURCE_* codes; "mode" and "quality" are
+        its signal_quality mode and summary, chosen window by window in the
+        same way. Unusable channels contribute no peaks, and a rejected
+        session has none. The quality windows, with the regularity of the
+        peaks, are kept as self.quality.
+        """
+        mids = []
+        for channel in (self._adc1, self._adc2):
+            channel.peaks.finish()
+            min_prominence = self.prominence * channel.stats.std()
+            mids.append(channel.peaks.select(min_prominence, self.distance, from_edges=True).tolist())
+        self.quality, modes, fused, _, _ = adaptive_fuse(self._quality.result(), lambda c: (None, mids[c]),
+                                                         self.window_size, self.match_tolerance, self.abnormal_gap)
+        mode = overall_mode(modes)
+        breaths = count_breaths(fused.index.size, self.window_size) if mode != MODE_REJECT else 0
+        elapsed = self.samples_seen / self.sample_rate
+        return {
+            "peaks": fused.index.tolist(),
+            "sources": fused.source,
+            "breaths": breaths,
+            "duration": elapsed,
+            "bpm": breaths / (elapsed / 60) if elapsed else 0.0,
+            "mode": mode,
+            "quality": quality_summary(self.quality, mode, modes),
+        }
@@ -0,0 +1,172 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+# === Binary capture layout ===
+# A fixed 64-byte little-endian header followed by interleaved uint16 samples,
+# one (adc1, adc2) pair per row. header_size lets later versions grow the header.
+# Version 2 adds the sample rate, arrival jitter and stall count measured by
+# sample_clock while capturing, in what was padding in version 1, so version 1
+# headers read as not measured (measured_rate 0).
+CAPTURE_MAGIC = b"ADCB"
+CAPTURE_VERSION = 2
+CAPTURE_EXT = ".adcb"
+SAMPLE_DTYPE = np.dtype('<u2')
+MAX_CHANNELS = 8
+DEFAULT_SAMPLE_RATE = 650.0
+DEFAULT_CHANNEL_MAP = (8, 9)  # STM32 ADC channels for the pressure and rubber sensors
+
+_HEADER = struct.Struct("<4sHHddB8sH16sffH3x")
+HEADER_SIZE = _HEADER.size
+_UNUSED_CHANNEL = 0xFF
+_MAX_STALLS = 0xFFFF
+
+
+def make_header(sample_rate=DEFAULT_SAMPLE_RATE, channel_map=DEFAULT_CHANNEL_MAP,
+                breath_type="", breath_cycle=0, start_time=None, measured_rate=0.0, jitter=0.0, stalls=0):
+    """Build a header dict with the fields stored in a binary capture.
+
+    sample_rate is the nominal rate; measured_rate (0 if unknown), jitter in
+    seconds and stalls come from a sample_clock.SampleClock.
+    """
+    channel_map = tuple(int(c) for c in channel_map)
+    if not 1 <= len(channel_map) <= MAX_CHANNELS:
+        raise ValueError(f"Capture needs 1 to {MAX_CHANNELS} channels, got {len(channel_map)}")
+    return {
+        "version": CAPTURE_VERSION,
+        "header_size": HEADER_SIZE,
+        "sample_rate": float(sample_rate),
+        "start_time": time.time() if start_time is None else float(start_time),
+        "channel_map": channel_map,
+        "breath_type": breath_type,
+        "breath_cycle": int(breath_cycle),
+        "measured_rate": float(measured_rate),
+        "jitter": float(jitter),
+        "stalls": int(stalls),
+    }
+
+
+def pack_header(header, magic=CAPTURE_MAGIC):
+    channel_map = header["channel_map"]
+    channels = bytes(channel_map) + bytes([_UNUSED_CHANNEL]) * (MAX_CHANNELS - len(channel_map))
+    return _HEADER.pack(magic, CAPTURE_VERSION, HEADER_SIZE, header["sample_rate"],
+                        header["start_time"], len(channel_map), channels, header["breath_cycle"],
+                        header["breath_type"].encode("ascii")[:16], header.get("measured_rate", 0.0),
+                        header.get("jitter", 0.0), min(header.get("stalls", 0), _MAX_STALLS))
+
+
+def unpack_header(raw, magic=CAPTURE_MAGIC):
+    """Parse a header; magic lets other containers (session_store) reuse the layout."""
+    if len(raw) < HEADER_SIZE or raw[:4] != magic:
+        raise ValueError("Not a binary ADC capture")
+    (_, version, header_size, sample_rate, start_time, n_channels, channels,
+     breath_cycle, breath_type, measured_rate, jitter, stalls) = _HEADER.unpack_from(raw)
+    if version > CAPTURE_VERSION:
+        raise ValueError(f"Unsupported capture version {version}")
+    return {
+        "version": version,
+        "header_size": header_size,
+        "sample_rate": sample_rate,
+        "start_time": start_time,
+        "channel_map": tuple(channels[:n_channels]),
+        "breath_type": breath_type.rstrip(b"\0").decode("ascii"),
+        "breath_cycle": breath_cycle,
+        "measured_rate": measured_rate,
+        "jitter": jitter,
+        "stalls": stalls,
+    }
+
+
+def effective_sample_rate(header, default=DEFAULT_SAMPLE_RATE):
+    """The rate measured while capturing if the header has one, else its nominal rate.
+
+    header may be None (a text capture), which gives default.
+    """
+    if header is None:
+        return default
+    return header.get("measured_rate") or header["sample_rate"]
+
+
+def is_capture_file(filename):
+    """Return True if filename starts with the binary capture magic."""
+    with open(filename, 'rb') as f:
+        return f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+
+def read_capture_header(filename):
+    with open(filename, 'rb') as f:
+        return unpack_header(f.read(HEADER_SIZE))
+
+
+def open_capture(filename, mode='r'):
+    """Return (header, samples) where samples is an (N, channels) np.memmap view.
+
+    Nothing is copied, so opening a long session is instant. A partially
+    written trailing row (e.g. after a crash mid-write) is ignored.
+    """
+    header = read_capture_header(filename)
+    n_channels = len(header["channel_map"])
+    row_bytes = SAMPLE_DTYPE.itemsize * n_channels
+    n_rows = (os.path.getsize(filename) - header["header_size"]) // row_bytes
+    if n_rows <= 0:
+        return header, np.empty((0, n_channels), dtype=SAMPLE_DTYPE)
+    samples = np.memmap(filename, dtype=SAMPLE_DTYPE, mode=mode, offset=header["header_size"],
+                        shape=(n_rows, n_channels))
+    return header, samples
+
+
+def write_capture(filename, samples, **header_fields):
+    """Write an (N, channels) sample array as a binary capture."""
+    samples = np.asarray(samples)
+    if samples.ndim != 2:
+        raise ValueError(f"Expected an (N, channels) array, got shape {samples.shape}")
+    if samples.size and (samples.min() < 0 or samples.max() > np.iinfo(SAMPLE_DTYPE).max):
+        raise ValueError("Samples do not fit in uint16")
+    header_fields.setdefault("channel_map", DEFAULT_CHANNEL_MAP[:samples.shape[1]])
+    header = make_header(**header_fields)
+    if len(header["channel_map"]) != samples.shape[1]:
+        raise ValueError("channel_map length does not match the number of sample columns")
+    with open(filename, 'wb') as f:
+        f.write(pack_header(header))
+        f.write(np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE).tobytes())
+    return header
+
+
+class CaptureWriter:
+    """Append sample blocks to a binary capture as they are decoded."""
+
+    def __init__(self, filename, **header_fields):
+        self.filename = filename
+        self.header = make_header(**header_fields)
+        self.n_channels = len(self.header["channel_map"])
+        self.rows_written = 0
+        self._file = open(filename, 'wb')
+        self._file.write(pack_header(self.header))
+
+    def write(self, samples):
+        samples = np.asarray(samples).reshape(-1, self.n_channels)
+        self._file.write(samples.astype(SAMPLE_DTYPE, copy=False).tobytes())
+        self.rows_written += len(samples)
+
+    def update_header(self, **fields):
+        """Rewrite the header with fields changed, e.g. the measured rate once capture ends."""
+        self.header.update(fields)
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(pack_header(self.header))
+        self._file.seek(position)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,277 @@
+"""Capture several serial devices at once and serve their live breath rates.
+
+One asyncio loop runs every session. The blocking pyserial reads go to a
+thread pool with one thread per port, so a quiet or stalled port never holds
+up the others. Parsing, writing and the breath estimator run on the loop,
+and each costs a few microseconds per sample, so one process keeps up with
+dozens of 650 Hz streams.
+
+    python capture_server.py COM5 COM6=bob [--out-dir sessions] [--http-port 8650]
+    python capture_server.py replay:data/normal/5/adc_normal5_1.data=a --replay-speed 10
+
+While it runs, the current rates are served as JSON on localhost:
+    GET /sessions          every session
+    GET /sessions/<name>   one session
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from breath_pipeline import SAMPLE_RATE, WINDOW_SIZE
+from breath_stream import StreamingBreathRate
+from frame_parser import FrameParser
+from metrics import gauge, stage
+from replay import open_serial
+from sample_clock import SampleClock
+from session_store import SESSION_EXT, SessionWriter
+
+BAUDRATE = 115200
+READ_BLOCK = 4096  # bytes per read; a read returns earlier once the port timeout passes
+READ_TIMEOUT = 0.05  # seconds, so every read hands over about 30 frames
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 8650
+STATUS_INTERVAL = 5.0  # seconds between status tables on the console
+
+
+class CaptureSession:
+    """One serial device: frame parser, optional capture writer, breath estimator and arrival clock."""
+
+    def __init__(self, name, ser, writer=None, window_size=WINDOW_SIZE, sample_rate=SAMPLE_RATE):
+        self.name = name
+        self.ser = ser
+        self.writer = writer
+        self.parser = FrameParser()
+        self.estimator = StreamingBreathRate(window_size, sample_rate)
+        self.latest = self.estimator.current()
+        self.bytes_read = 0
+        self.reads = 0
+        self.max_in_waiting = 0
+        self.clock = SampleClock()
+        self.error = None
+        self.finished = False  # a replayed recording reached its end
+        self.start_time = time.monotonic()
+
+    def read_blocking(self):
+        """Read whatever the port has (at least READ_BLOCK or until its timeout). Runs in the pool.
+
+        Returns the in_waiting count, the bytes and the time.monotonic() they arrived.
+        """
+        waiting = self.ser.in_waiting
+        data = self.ser.read(max(waiting, READ_BLOCK))
+        return waiting, data, time.monotonic()
+
+    def feed(self, data, received=None):
+        """Parse a chunk of raw bytes and update the estimate; return the frames for store().
+
+        received is when the bytes arrived; the read loop passes it so the
+        clock measures the rate from the pool thread's timing, not the loop's.
+        """
+        self.reads += 1
+        self.bytes_read += len(data)
+        with stage("session_feed") as timer:
+            samples = self.parser.feed(data)
+            timer.count(len(samples))
+            # Only frames that parse count, garbled lines would inflate the rate
+            self.clock.observe(len(samples), time.monotonic() if received is None else received)
+            if len(samples):
+                self.estimator.feed(samples)
+                self.latest = self.estimator.current()
+        return samples
+
+    def store(self, samples):
+        """Hand frames to the capture writer. Runs in the pool, a session store fsyncs every chunk."""
+        if self.writer is not None and len(samples):
+            self.writer.write(samples)
+
+    def status(self):
+        framing = self.parser.stats()
+        return {
+            "name": self.name,
+            "port": getattr(self.ser, "port", None),
+            "elapsed": time.monotonic() - self.start_time,
+            "bytes_read": self.bytes_read,
+            "frames": framing["frames"],
+            "bad_frames": framing["bad_frames"],
+            "max_in_waiting": self.max_in_waiting,
+            "breaths": self.latest["breaths"],
+            "bpm": self.latest["bpm"],
+            "interval_bpm": self.latest["interval_bpm"],
+            "rate": self.clock.rate,
+            "jitter": self.clock.jitter,
+            "stalls": self.clock.stalls,
+            "capture": self.writer.filename if self.writer is not None else None,
+            "error": None if self.error is None else str(self.error),
+        }
+
+    def close(self):
+        if self.writer is not None:
+            timing = self.clock.header_fields(getattr(self.ser, "speed", 1.0))
+            if timing:
+                self.writer.update_header(**timing)
+            self.writer.close()
+        if self.ser.is_open:
+            self.ser.close()
+
+
+class CaptureServer:
+    """Runs the read loop of every session and the local JSON query interface."""
+
+    def __init__(self, sessions, host=HTTP_HOST, http_port=HTTP_PORT):
+        self.sessions = {session.name: session for session in sessions}
+        self.host = host
+        self.http_port = http_port  # 0 picks a free port, start_http() replaces it with the bound one
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(sessions)), thread_name_prefix="serial")
+        self._stopping = None
+        self._http = None
+
+    async def _read_loop(self, session):
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            try:
+                waiting, data, received = await loop.run_in_executor(self._executor, session.read_blocking)
+            except EOFError:
+                session.finished = True
+                self._stop_if_done()
+                return
+            except Exception as e:  # port unplugged etc., the other sessions carry on
+                session.error = e
+                self._stop_if_done()
+                return
+            if waiting > session.max_in_waiting:
+                session.max_in_waiting = waiting
+            gauge("serial_in_waiting", waiting)
+            if data:
+                samples = session.feed(data, received)
+                if session.writer is not None and len(samples):
+                    # Off the loop, or every other session waits for this one's fsync
+                    await loop.run_in_executor(self._executor, session.store, samples)
+
+    def _stop_if_done(self):
+        """Stop once every session has reached the end of its replay or failed."""
+        if all(s.finished or s.error is not None for s in self.sessions.values()):
+            self.stop()
+
+    def status(self):
+        return [session.status() for session in self.sessions.values()]
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()).strip():
+                pass  # headers are not needed
+            path = request[1].rstrip("/") if len(request) > 1 else ""
+            if path == "/sessions":
+                code, body = "200 OK", self.status()
+            elif path.startswith("/sessions/") and path[len("/sessions/"):] in self.sessions:
+                code, body = "200 OK", self.sessions[path[len("/sessions/"):]].status()
+            else:
+                code, body = "404 Not Found", {"error": f"no such resource {path!r}"}
+            payload = json.dumps(body).encode()
+            writer.write(f"HTTP/1.0 {code}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start_http(self):
+        """Start the JSON interface now rather than in run(), and set http_port to the port it bound."""
+        self._http = await asyncio.start_server(self._handle_http, self.host, self.http_port)
+        self.http_port = self._http.sockets[0].getsockname()[1]
+
+    async def run(self, duration=None, status_interval=None):
+        """Capture until stop() is called, duration seconds pass, every session ends or the task is cancelled."""
+        self._stopping = asyncio.Event()
+        if self.http_port is not None and self._http is None:
+            await self.start_http()
+        tasks = [asyncio.create_task(self._read_loop(session)) for session in self.sessions.values()]
+        printer = asyncio.create_task(self._print_status(status_interval)) if status_interval else None
+        try:
+            await asyncio.wait_for(self._stopping.wait(), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._stopping.set()
+            if printer is not None:
+                printer.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self._http is not None:
+                self._http.close()
+                await self._http.wait_closed()
+                self._http = None
+            self._executor.shutdown(wait=True)
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def _print_status(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(format_status(self.status()))
+
+
+def format_status(rows):
+    lines = [f"{'session':<12} {'frames':>9} {'bad':>5} {'backlog':>8} {'rate Hz':>8} {'jitter':>7} {'stalls':>6} "
+             f"{'breaths':>8} {'bpm':>6}  error"]
+    for row in rows:
+        lines.append(f"{row['name']:<12} {row['frames']:9d} {row['bad_frames']:5d} {row['max_in_waiting']:8d} "
+                     f"{row['rate']:8.2f} {row['jitter'] * 1000:5.1f}ms {row['stalls']:6d} "
+                     f"{row['breaths']:8d} {row['bpm']:6.1f}  {row['error'] or ''}")
+    return "\n".join(lines)
+
+
+def open_session(spec, out_dir=None, baudrate=BAUDRATE, window_size=WINDOW_SIZE, replay_speed=1.0):
+    """Open PORT or PORT=NAME (PORT may be replay:<file>) as a CaptureSession, writing to out_dir if given."""
+    port, _, name = spec.partition("=")
+    name = name or os.path.splitext(os.path.basename(port))[0]
+    ser = open_serial(port, baudrate, READ_TIMEOUT, replay_speed)
+    writer = None
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        writer = SessionWriter(os.path.join(out_dir, f"{name}_{stamp}{SESSION_EXT}"), start_time=time.time())
+    return CaptureSession(name, ser, writer, window_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture several breathing sensors at once.")
+    parser.add_argument("ports", nargs="+", help="serial ports as PORT or PORT=NAME, replay:<file> replays a recording")
+    parser.add_argument("--baudrate", type=int, default=BAUDRATE)
+    parser.add_argument("--out-dir", help="save each session as a session store in this directory")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="moving average window in samples")
+    parser.add_argument("--http-port", type=int, default=HTTP_PORT, help="local query port (0 picks a free one)")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--status-interval", type=float, default=STATUS_INTERVAL)
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="pace of replay: ports, 0 for unpaced")
+    args = parser.parse_args(argv)
+
+    sessions = []
+    try:
+        for spec in args.ports:
+            sessions.append(open_session(spec, args.out_dir, args.baudrate, args.window, args.replay_speed))
+        server = CaptureServer(sessions, http_port=args.http_port)
+
+        async def serve():
+            await server.start_http()
+            print(f"Capturing {len(sessions)} sessions, rates at http://{HTTP_HOST}:{server.http_port}/sessions. "
+                  f"Press Ctrl-C to stop.")
+            await server.run(args.duration, args.status_interval)
+
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for session in sessions:
+            session.close()
+    if sessions:
+        print(format_status([session.status() for session in sessions]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
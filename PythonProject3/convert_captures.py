@@ -0,0 +1,58 @@
+import os
+import re
+import sys
+
+from adc_loader import load_adc_array
+from capture_format import CAPTURE_EXT, DEFAULT_SAMPLE_RATE, write_capture
+from session_store import SESSION_EXT
+
+SAVE_BASE_DIR = "./data"  # Base directory
+
+# Formats a recording may be stored in, preferred first when it exists in more than one
+RECORDING_EXTS = (CAPTURE_EXT, SESSION_EXT, ".data")
+# adc_<type><cycles>_<n>.data, as written by collect_data, or the same name in a binary format
+_NAME_PATTERN = re.compile(r"adc_([a-z]+?)(\d+)_\d+(" + "|".join(map(re.escape, RECORDING_EXTS)) + ")$")
+
+
+def capture_labels(filename):
+    """Return (breath_type, breath_cycle) parsed from a capture filename, or ("", 0)."""
+    match = _NAME_PATTERN.search(os.path.basename(filename))
+    if match is None:
+        return "", 0
+    return match.group(1), int(match.group(2))
+
+
+def convert_text_capture(src, dst=None, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Convert a cleaned "v1 v2" capture to the binary format next to it."""
+    if dst is None:
+        dst = os.path.splitext(src)[0] + CAPTURE_EXT
+    breath_type, breath_cycle = capture_labels(src)
+    # Text captures do not record when they started, 0 marks the start time as unknown
+    write_capture(dst, load_adc_array(src), sample_rate=sample_rate, breath_type=breath_type,
+                  breath_cycle=breath_cycle, start_time=0.0)
+    return dst
+
+
+def convert_data_tree(base_dir=SAVE_BASE_DIR, out_dir=None):
+    """Convert every .data capture under base_dir, mirroring the tree into out_dir."""
+    converted = []
+    for root, _, files in os.walk(base_dir):
+        for name in sorted(files):
+            if not name.endswith(".data"):
+                continue
+            src = os.path.join(root, name)
+            dst = None
+            if out_dir is not None:
+                dst_dir = os.path.join(out_dir, os.path.relpath(root, base_dir))
+                os.makedirs(dst_dir, exist_ok=True)
+                dst = os.path.join(dst_dir, os.path.splitext(name)[0] + CAPTURE_EXT)
+            converted.append(convert_text_capture(src, dst))
+            print(f"Converted {src} -> {converted[-1]}")
+    return converted
+
+
+if __name__ == "__main__":
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else SAVE_BASE_DIR
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    files = convert_data_tree(base_dir, out_dir)
+    print(f"✅ Converted {len(files)} captures")
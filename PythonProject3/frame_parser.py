@@ -0,0 +1,138 @@
+import re
+import time
+
+import numpy as np
+
+from metrics import stage
+from sample_clock import SampleClock
+
+# One STM32 frame: "Ca=<adc1> Cb=<adc2>\r\n"
+FRAME_PATTERN = re.compile(rb"(Ca=(\d{1,5})[ \t]+Cb=(\d{1,5})[ \t]*\r?\n)")
+MAX_FRAME_BYTES = 32  # longest plausible frame, anything longer without a newline is garbage
+_UINT16_MAX = np.iinfo(np.uint16).max
+
+
+class FrameParser:
+    """Incremental parser for the Ca=/Cb= UART stream.
+
+    feed() accepts arbitrary byte chunks (a frame may be split across any
+    number of reads), returns the complete frames as an (N, 2) uint16 array
+    and keeps the unfinished tail for the next call. Garbage between frames is
+    skipped by searching for the next "Ca=", so a lost byte costs one frame.
+    """
+    _EMPTY = np.empty((0, 2), dtype=np.uint16)
+    _NO_ENDS = np.empty(0, dtype=np.int64)
+
+    def __init__(self):
+        self._tail = b""
+        self.bytes_in = 0
+        self.frames = 0
+        self.bad_frames = 0  # newline-terminated segments that did not parse
+        self.skipped_bytes = 0
+        self.out_of_range = 0
+        self.split_frames = 0  # frames completed from bytes carried over between reads
+
+    def feed(self, data, ends=False):
+        """Parse the next bytes of the stream and return the frames they complete.
+
+        With ends, returns (frames, ends) instead: ends[i] is the offset in
+        data just past frame i's newline, which tells what each read of the
+        stream contributed.
+        """
+        self.bytes_in += len(data)
+        carried = len(self._tail)
+        buf = self._tail + data if carried else bytes(data)
+        end = buf.rfind(b"\n") + 1
+        self._tail = buf[end:]
+        if len(self._tail) > MAX_FRAME_BYTES:
+            # No newline for far too long: drop it, keeping a frame that may have started after the garbage
+            start = self._tail.rfind(b"Ca=")
+            kept = self._tail[start:] if 0 < start and len(self._tail) - start <= MAX_FRAME_BYTES else b""
+            self.skipped_bytes += len(self._tail) - len(kept)
+            self.bad_frames += 1
+            self._tail = kept
+        if end == 0:
+            return (self._EMPTY, self._NO_ENDS) if ends else self._EMPTY
+
+        region = buf[:end]
+        if ends:
+            found = list(FRAME_PATTERN.finditer(region))
+            matches = [m.groups() for m in found]
+            stops = np.array([m.end() for m in found], dtype=np.int64) - carried
+        else:
+            matches = FRAME_PATTERN.findall(region)
+        matched_bytes = sum(len(m[0]) for m in matches)
+        self.skipped_bytes += end - matched_bytes
+        self.bad_frames += region.count(b"\n") - len(matches)
+        if carried and matches and region.startswith(matches[0][0]) and len(matches[0][0]) > carried:
+            self.split_frames += 1
+        if not matches:
+            return (self._EMPTY, self._NO_ENDS) if ends else self._EMPTY
+
+        values = np.array([(m[1], m[2]) for m in matches]).astype(np.int64)
+        in_range = (values <= _UINT16_MAX).all(axis=1)
+        if not in_range.all():
+            self.out_of_range += int((~in_range).sum())
+            values = values[in_range]
+            if ends:
+                stops = stops[in_range]
+        self.frames += len(values)
+        return (values.astype(np.uint16), stops) if ends else values.astype(np.uint16)
+
+    def stats(self):
+        return {
+            "bytes_in": self.bytes_in,
+            "frames": self.frames,
+            "bad_frames": self.bad_frames,
+            "skipped_bytes": self.skipped_bytes,
+            "out_of_range": self.out_of_range,
+            "split_frames": self.split_frames,
+            "pending_bytes": len(self._tail),
+        }
+
+
+class FrameSink:
+    """File-like sink for SerialIngest that parses blocks and stores samples.
+
+    writer is anything with write(samples) and flush(), e.g. a
+    capture_format.CaptureWriter, so captures are decoded exactly once.
+
+    The sink's SampleClock counts the frames the parser accepts, so garbled
+    lines do not inflate the measured rate. SerialIngest uses it in place of
+    its own and passes the arrival time of every read with each block.
+    """
+
+    def __init__(self, writer, parser=None):
+        self.writer = writer
+        self.parser = FrameParser() if parser is None else parser
+        self.clock = SampleClock()
+        self._unclocked = 0  # frames after the last read that ended in the previous block
+
+    def write(self, block, arrivals=None):
+        """Parse and store a block; return its length.
+
+        arrivals lists (offset, timestamp) for the reads that end in the
+        block: the read ending offset bytes into it arrived at timestamp. The
+        clock sees each with the frames that read completed. Without
+        arrivals the block is clocked as one read arriving now.
+        """
+        with stage("decode_frames") as timer:
+            samples, ends = self.parser.feed(block, ends=True)
+            timer.count(len(samples))
+        if arrivals is None:
+            arrivals = [(len(block), time.monotonic())]
+        if arrivals:
+            offsets = np.array([offset for offset, _ in arrivals], dtype=np.int64)
+            completed = np.diff(np.searchsorted(ends, offsets, side='right'), prepend=0)
+            completed[0] += self._unclocked
+            for frames, (_, timestamp) in zip(completed.tolist(), arrivals):
+                self.clock.observe(frames, timestamp)
+            self._unclocked = len(ends) - int(np.searchsorted(ends, offsets[-1], side='right'))
+        else:
+            self._unclocked += len(ends)
+        if len(samples):
+            self.writer.write(samples)
+        return len(block)
+
+    def flush(self):
+        self.writer.flush()
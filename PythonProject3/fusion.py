@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Where each fused peak came from
+SOURCE_ORIGINAL = 0  # an ADC2 peak
+SOURCE_ADC1 = 1  # fills an abnormal ADC2 gap with the matching ADC1 peak
+SOURCE_INTERPOLATED = 2  # fills an abnormal ADC2 gap with its midpoint
+
+# In multiples of the median ADC2 gap
+MATCH_TOLERANCE = 0.5  # how far from a gap's midpoint an ADC1 peak may be
+ABNORMAL_GAP = 1.5  # gaps longer than this are missed breaths
+
+FusedPeaks = namedtuple("FusedPeaks", ["index", "source"])
+FusedPeaks.__doc__ = """Fused peak sample indices (int64) and their SOURCE_* codes (int8), both sorted by index."""
+
+
+def gap_tolerance(plateau_mids2, match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP):
+    """Return (median gap, match tolerance, abnormal gap threshold) for the ADC2 peaks.
+
+    With fewer than two peaks there are no gaps and all three are NaN.
+    """
+    gaps = np.diff(np.asarray(plateau_mids2, dtype=np.int64))
+    if gaps.size == 0:
+        return np.nan, np.nan, np.nan
+    median_distance_peak_2 = np.median(gaps)
+    iqr_acceptable = median_distance_peak_2 * match_tolerance
+    acceptable_distance = median_distance_peak_2 * abnormal_gap
+    return median_distance_peak_2, iqr_acceptable, acceptable_distance
+
+
+def has_abnormal_gap(plateau_mids2, abnormal_gap=ABNORMAL_GAP):
+    """Whether fuse() would consult ADC1 for these ADC2 peaks; if not, it returns them unchanged."""
+    mids2 = np.asarray(plateau_mids2, dtype=np.int64)
+    if mids2.size < 2:
+        return False
+    _, _, acceptable = gap_tolerance(mids2, abnormal_gap=abnormal_gap)
+    return bool(np.any(np.diff(mids2) > acceptable))
+
+
+def fuse(plateau_mids1, plateau_mids2, match_tolerance=MATCH_TOLERANCE, abnormal_gap=ABNORMAL_GAP):
+    """Fill abnormal gaps between ADC2 peaks with ADC1 peaks or interpolated midpoints.
+
+    A gap is abnormal when it exceeds abnormal_gap times the median ADC2 gap.
+    Its midpoint is replaced by the first (sorted) ADC1 peak within
+    match_tolerance median gaps of it, or else by the truncated midpoint. Both inputs must be sorted, as
+    find_peaks returns them; matching is a binary search, so this is
+    O((n1 + n2) log n1) instead of a scan of ADC1 for every gap.
+    """
+    mids1 = np.asarray(plateau_mids1, dtype=np.int64)
+    mids2 = np.asarray(plateau_mids2, dtype=np.int64)
+    _, tolerance, acceptable = gap_tolerance(mids2, match_tolerance, abnormal_gap)
+    if mids2.size < 2:
+        return FusedPeaks(mids2, np.full(mids2.size, SOURCE_ORIGINAL, dtype=np.int8))
+
+    abnormal = np.flatnonzero(np.diff(mids2) > acceptable)
+    middle = (mids2[abnormal] + mids2[abnormal + 1]) / 2
+    fills = middle.astype(np.int64)
+    matched = np.zeros(middle.size, dtype=bool)
+    if mids1.size:
+        # First ADC1 peak strictly above middle - tolerance, accepted if also strictly below middle + tolerance
+        candidate = np.searchsorted(mids1, middle - tolerance, side='right')
+        found = candidate < mids1.size
+        matched[found] = mids1[candidate[found]] < middle[found] + tolerance
+        fills[matched] = mids1[candidate[matched]]
+    sources = np.where(matched, SOURCE_ADC1, SOURCE_INTERPOLATED).astype(np.int8)
+
+    index = np.insert(mids2, abnormal + 1, fills)
+    source = np.insert(np.full(mids2.size, SOURCE_ORIGINAL, dtype=np.int8), abnormal + 1, sources)
+    return FusedPeaks(index, source)
+
+
+def fuse_peaks(plateau_mids1, plateau_mids2, verbose=False, match_tolerance=MATCH_TOLERANCE,
+               abnormal_gap=ABNORMAL_GAP):
+    """fuse() returning the fused peak indices as a list, as eval_data uses them."""
+    fused = fuse(plateau_mids1, plateau_mids2, match_tolerance, abnormal_gap)
+    if verbose:
+        print_fills(fused)
+    return fused.index.tolist()
+
+
+def print_fills(fused):
+    """Print eval_data's line for every gap fused filled, in order."""
+    for index, source in zip(fused.index.tolist(), fused.source.tolist()):
+        if source == SOURCE_ADC1:
+            print("Found match:", index)
+        elif source == SOURCE_INTERPOLATED:
+            print("No match found")
+
+
+def count_breaths(n_peaks, window_size):
+    """Breath cycles for n_peaks fused peaks; the filter edges swallow one or two breaths."""
+    return n_peaks + 1 if window_size == 1200 else n_peaks + 2
@@ -0,0 +1,249 @@
+"""Plotting that scales to long captures and a live view during collection.
+
+Drawing every raw sample is what made the original plots slow, so both modes
+reduce each channel to a min/max pair per horizontal pixel first: the picture
+is the same, the point count is fixed by the figure width instead of the
+recording length.
+
+    python live_plot.py capture.adcb   # offline plot of a text or binary capture
+
+matplotlib is imported when a plot is made, not with the module, so the
+capture and replay code that uses SampleHistory and SampleTap stays headless.
+"""
+import sys
+import threading
+import time
+
+import numpy as np
+
+from adc_loader import load_adc_array
+from breath_pipeline import SAMPLE_RATE, WINDOW_SIZE
+from breath_stream import StreamingBreathRate
+from metrics import stage
+from serial_ingest import STATS_INTERVAL
+
+PLOT_WIDTH = 2000  # min/max bins per line, about one per pixel of a 12 inch figure
+LIVE_SPAN = 30  # seconds of signal in the live view
+LIVE_FPS = 10
+HISTORY_SECONDS = 120  # samples kept for the live view
+ADC_RANGE = (0, 4095)  # 12-bit ADC, the initial y range of the live view
+
+
+def minmax_downsample(y, n_bins=PLOT_WIDTH):
+    """Return (x, y) with the min and max of each of n_bins bins, in sample order.
+
+    A line through these points covers the same pixels as one through every
+    sample, so peaks and spikes survive however much the data is reduced.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * n_bins:
+        return np.arange(n), y
+    size = -(-n // n_bins)
+    full = n // size * size
+    bins = y[:full].reshape(-1, size)
+    starts = np.arange(0, full, size)
+    lo = starts + np.argmin(bins, axis=1)
+    hi = starts + np.argmax(bins, axis=1)
+    x = np.stack((np.minimum(lo, hi), np.maximum(lo, hi)), axis=1).ravel()
+    if full < n:
+        tail = y[full:]
+        x = np.concatenate((x, np.sort([full + np.argmin(tail), full + np.argmax(tail)])))
+    return x, y[x]
+
+
+def plot_capture(filename, title="ADC Data Plot", width=PLOT_WIDTH, output=None):
+    """Plot both raw channels of a capture, fast enough for multi-hour files.
+
+    With output the figure is saved there instead of shown.
+    """
+    import matplotlib.pyplot as plt
+    samples = load_adc_array(filename)
+    plt.figure(figsize=(12, 6))
+    for c, color in enumerate(['blue', 'red']):
+        x, y = minmax_downsample(samples[:, c], width)
+        plt.plot(x, y, linestyle='-', linewidth=0.5, color=color)
+    plt.title(title)
+    plt.xlabel("Sample Number")
+    plt.ylabel("ADC Value")
+    plt.legend(['ADC1', 'ADC2'])
+    plt.grid(True)
+    plt.tight_layout()
+    if output:
+        plt.savefig(output)
+        plt.close()
+    else:
+        plt.show()
+
+
+class SampleHistory:
+    """Fixed-size, thread-safe ring of the most recent decoded (adc1, adc2) samples."""
+
+    def __init__(self, capacity=int(HISTORY_SECONDS * SAMPLE_RATE), channels=2):
+        self._buf = np.zeros((capacity, channels), dtype=np.uint16)
+        self._lock = threading.Lock()
+        self.total = 0  # samples appended since the start
+
+    def append(self, samples):
+        samples = np.asarray(samples)
+        n = len(samples)
+        kept = samples[-len(self._buf):]
+        with self._lock:
+            pos = (self.total + n - len(kept) + np.arange(len(kept))) % len(self._buf)
+            self._buf[pos] = kept
+            self.total += n
+
+    def since(self, start):
+        """Return (first, samples) for the samples appended at or after index start that are still kept."""
+        with self._lock:
+            first = max(start, self.total - len(self._buf), 0)
+            pos = np.arange(first, self.total) % len(self._buf)
+            return first, self._buf[pos]
+
+
+class SampleTap:
+    """Capture writer wrapper that also copies decoded samples into a SampleHistory.
+
+    Goes between FrameSink and the CaptureWriter, so the live view sees
+    exactly what is stored without touching the serial reader.
+    """
+
+    def __init__(self, writer, history):
+        self.writer = writer
+        self.history = history
+
+    def write(self, samples):
+        self.writer.write(samples)
+        self.history.append(samples)
+
+    def flush(self):
+        self.writer.flush()
+
+
+class HistoryEstimator:
+    """StreamingBreathRate fed with whatever a SampleHistory gained since the last update()."""
+
+    def __init__(self, history, window_size=WINDOW_SIZE, sample_rate=SAMPLE_RATE):
+        self.history = history
+        self.window_size = window_size
+        self.sample_rate = sample_rate
+        self.estimator = StreamingBreathRate(window_size, sample_rate)
+        self.fed = 0  # history index of the next sample to feed
+        self.restarts = 0
+
+    def update(self):
+        first, samples = self.history.since(self.fed)
+        if first > self.fed:
+            # The history wrapped before we caught up: restart rather than feed a gap
+            self.estimator = StreamingBreathRate(self.window_size, self.sample_rate)
+            self.restarts += 1
+        self.fed = first + len(samples)
+        if len(samples):
+            self.estimator.feed(samples)
+
+
+class LiveMonitor:
+    """Scrolling view of the last `span` seconds with live peaks and breath rate.
+
+    Runs in the caller's (main) thread, which GUI backends need, while
+    SerialIngest reads and writes in its own threads, so a slow frame only
+    delays the next frame, never a serial read. Each frame takes the new
+    samples from the history, feeds a StreamingBreathRate, and redraws only
+    the animated artists over a cached background (blitting). The x axis is
+    time relative to now so the background only changes when the y range does.
+    """
+
+    def __init__(self, history, sample_rate=SAMPLE_RATE, window_size=WINDOW_SIZE,
+                 span=LIVE_SPAN, fps=LIVE_FPS, width=PLOT_WIDTH):
+        import matplotlib.pyplot as plt
+        self._plt = plt
+        self.history = history
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+        self.span = span
+        self.fps = fps
+        self.width = width
+        self.feeder = HistoryEstimator(history, window_size, sample_rate)
+        self._background = None
+        self.fig, self.ax = plt.subplots(figsize=(12, 6))
+        self.lines = [self.ax.plot([], [], linewidth=0.8, color=color, label=label, animated=True)[0]
+                      for color, label in (('blue', 'ADC1'), ('red', 'ADC2'))]
+        self.peak_marks, = self.ax.plot([], [], 'go', label='Detected Breaths', animated=True)
+        self.status = self.ax.text(0.01, 0.97, "", transform=self.ax.transAxes, va='top', animated=True)
+        self.ax.set_xlim(-span, 0)
+        self.ax.set_ylim(*ADC_RANGE)
+        self.ax.set_xlabel("Time (s, relative to now)")
+        self.ax.set_ylabel("ADC Value")
+        self.ax.set_title("Live ADC Data")
+        self.ax.legend(loc='upper right')
+        self.ax.grid(True)
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        # Any full redraw (first show, resize, new y range) invalidates the cached background
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    def update(self):
+        """Draw one frame."""
+        self.feeder.update()
+        estimator = self.feeder.estimator
+        n_view = int(self.span * self.sample_rate)
+        first, view = self.history.since(self.feeder.fed - n_view)
+        end = first + len(view)
+        if len(view):
+            lo, hi = int(view.min()), int(view.max())
+            y_lo, y_hi = self.ax.get_ylim()
+            if lo < y_lo or hi > y_hi or (hi - lo) < (y_hi - y_lo) / 4:
+                margin = max(10, (hi - lo) // 10)
+                self.ax.set_ylim(lo - margin, hi + margin)
+                self.fig.canvas.draw()
+        for c, line in enumerate(self.lines):
+            x, y = minmax_downsample(view[:, c], self.width)
+            line.set_data((x + first - end) / self.sample_rate, y)
+
+        # Peak positions are in filtered samples; the filter window is centred on them
+        offset = (self.window_size - 1) // 2
+        peaks = np.array([p + offset for p in estimator.recent_peaks], dtype=np.int64)
+        peaks = peaks[(peaks >= first) & (peaks < end)]
+        self.peak_marks.set_data((peaks - end) / self.sample_rate, view[peaks - first, 1])
+        current = estimator.current()
+        self.status.set_text(f"{current['time']:.0f}s  {current['breaths']} breaths  {current['bpm']:.1f} bpm"
+                             + (f"  (interval {current['interval_bpm']:.1f} bpm)"
+                                if current['interval_bpm'] else ""))
+
+        canvas = self.fig.canvas
+        if self._background is None:
+            canvas.draw()
+        canvas.restore_region(self._background)
+        for artist in self.lines + [self.peak_marks, self.status]:
+            self.ax.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def run(self, ingest=None, report_interval=STATS_INTERVAL):
+        """Redraw at fps until Ctrl-C, the window is closed or ingest stops.
+
+        With an ingest, a progress line is printed every report_interval
+        seconds like SerialIngest.run_until_interrupt.
+        """
+        plt = self._plt
+        plt.show(block=False)
+        frame = 1 / self.fps
+        next_report = time.monotonic() + report_interval
+        try:
+            while plt.fignum_exists(self.fig.number) and (ingest is None or ingest.running()):
+                start = time.monotonic()
+                with stage("live_frame"):
+                    self.update()
+                if ingest is not None and start >= next_report:
+                    print(ingest.report())
+                    next_report = start + report_interval
+                time.sleep(max(0.0, frame - (time.monotonic() - start)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            plt.close(self.fig)
+
+
+if __name__ == "__main__":
+    plot_capture(sys.argv[1] if len(sys.argv) > 1 else "eval.adcb")
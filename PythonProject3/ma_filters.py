@@ -0,0 +1,162 @@
+import math
+
+import numpy as np
+
+MA_BACKENDS = ("cumsum", "convolve", "lfilter")
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def window_sums(data, window_size):
+    """Sums over every complete window along axis 0 in O(n), independent of window_size.
+
+    Integer input is summed exactly in int64, so the result carries no float
+    drift however long the recording. Float input is centred first, which keeps
+    the running sum small and its rounding error close to that of a direct sum.
+    """
+    data = np.asarray(data)
+    zero = np.zeros((1,) + data.shape[1:])
+    if np.issubdtype(data.dtype, np.integer) or data.dtype == bool:
+        totals = np.concatenate((zero.astype(np.int64), np.cumsum(data, axis=0, dtype=np.int64)))
+        return totals[window_size:] - totals[:-window_size]
+    offset = data.mean(axis=0)
+    totals = np.concatenate((zero, np.cumsum(data - offset, axis=0, dtype=np.float64)))
+    return totals[window_size:] - totals[:-window_size] + offset * window_size
+
+
+def moving_average(data, window_size):
+    """O(n) moving average in 'valid' mode for an (N,) or (N, channels) array."""
+    data = np.asarray(data)
+    if not 1 <= window_size <= len(data):
+        return np.empty((max(0, len(data) - window_size + 1),) + data.shape[1:])
+    return window_sums(data, window_size) / window_size
+
+
+def convolve_moving_average(data, window_size):
+    """The original np.convolve moving average, O(n * window_size) per channel."""
+    data = np.asarray(data)
+    kernel = np.ones(window_size) / window_size
+    if data.ndim == 1:
+        return np.convolve(data, kernel, mode='valid')
+    return np.stack([np.convolve(data[:, c], kernel, mode='valid') for c in range(data.shape[1])], axis=1)
+
+
+def lfilter_moving_average(data, window_size):
+    """Moving average through scipy.signal.lfilter, trimmed to 'valid' mode."""
+    from scipy.signal import lfilter
+
+    data = np.asarray(data, dtype=np.float64)
+    out = lfilter(np.ones(window_size) / window_size, [1.0], data, axis=0)
+    return out[window_size - 1:]
+
+
+def MA_filter(data, window_size, backend="cumsum"):
+    """Apply a moving average filter to the data.
+
+    data may be one channel or an (N, 2) array with both ADC channels, which
+    are filtered in one call. The result has the same 'valid' length
+    (N - window_size + 1) as the original np.convolve version.
+    """
+    if backend == "cumsum":
+        return moving_average(data, window_size)
+    if backend == "convolve":
+        return convolve_moving_average(data, window_size)
+    if backend == "lfilter":
+        return lfilter_moving_average(data, window_size)
+    raise ValueError(f"Unknown moving average backend {backend!r}, expected one of {MA_BACKENDS}")
+
+
+def ema_filter(data, alpha):
+    """Exponential moving average y[n] = alpha * x[n] + (1 - alpha) * y[n-1], started at x[0]."""
+    from scipy.signal import lfilter
+
+    data = np.asarray(data, dtype=np.float64)
+    if len(data) == 0:
+        return data
+    zi = ((1 - alpha) * data[0])[np.newaxis] if data.ndim > 1 else [(1 - alpha) * data[0]]
+    out, _ = lfilter([alpha], [1.0, alpha - 1.0], data, axis=0, zi=zi)
+    return out
+
+
+def iir_lowpass(data, cutoff_hz, sample_rate, order=2):
+    """Butterworth low-pass (single pass, causal) as a cheaper alternative to a long moving average."""
+    from scipy.signal import butter, lfilter, lfilter_zi
+
+    data = np.asarray(data, dtype=np.float64)
+    b, a = butter(order, cutoff_hz, btype='low', fs=sample_rate)
+    if len(data) == 0:
+        return data
+    zi = lfilter_zi(b, a)
+    zi = zi[:, np.newaxis] * data[0] if data.ndim > 1 else zi * data[0]
+    out, _ = lfilter(b, a, data, axis=0, zi=zi)
+    return out
+
+
+class RunningMovingAverage:
+    """Moving average carried across chunks with an exact integer running sum.
+
+    update() returns the window *sums* for every sample that completes a
+    window, matching MA_filter(data, window_size) * window_size in 'valid'
+    mode. Keeping sums as integers means no float drift over long sessions.
+    Chunks may be (N,) or (N, channels); each call costs O(N).
+    """
+
+    def __init__(self, window_size, channels=None):
+        self.window_size = window_size
+        shape = (window_size,) if channels is None else (window_size, channels)
+        self._ring = np.zeros(shape, dtype=np.int64)
+        self._pos = 0
+        self._seen = 0
+        self._sum = np.zeros(shape[1:], dtype=np.int64)
+
+    def update(self, samples):
+        x = np.asarray(samples, dtype=np.int64).reshape((-1,) + self._ring.shape[1:])
+        n = len(x)
+        if n == 0:
+            return x
+        w = self.window_size
+        # Sample leaving the window for each new sample: from the ring first, then from x itself
+        k = min(n, w)
+        leaving = self._ring[(self._pos + np.arange(k)) % w]
+        if n > w:
+            leaving = np.concatenate((leaving, x[:n - w]))
+        sums = self._sum + np.cumsum(x - leaving, axis=0)
+        self._sum = sums[-1].copy()
+        self._ring[(self._pos + np.arange(n - k, n)) % w] = x[-k:]
+        self._pos = (self._pos + n) % w
+        first_complete = max(0, w - 1 - self._seen)
+        self._seen += n
+        return sums[first_complete:]
+
+    def update_average(self, samples):
+        """Like update() but returns averages instead of sums."""
+        return self.update(samples) / self.window_size
+
+
+class RunningStats:
+    """Exact running mean and standard deviation of integer samples."""
+
+    def __init__(self):
+        self.count = 0
+        self._sum = 0
+        self._sum_sq = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        self.count += values.size
+        if values.size == 0:
+            return
+        self._sum += int(values.sum())
+        # Accumulate squares in int64 blocks small enough not to overflow, then in Python ints
+        peak = int(np.abs(values).max())
+        block = max(1, _INT64_MAX // max(1, peak * peak))
+        for start in range(0, values.size, block):
+            part = values[start:start + block]
+            self._sum_sq += int(np.dot(part, part))
+
+    def mean(self):
+        return self._sum / self.count if self.count else 0.0
+
+    def std(self):
+        if not self.count:
+            return 0.0
+        return math.sqrt(self.count * self._sum_sq - self._sum * self._sum) / self.count
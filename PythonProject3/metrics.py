@@ -0,0 +1,206 @@
+"""Opt-in timing, throughput and backlog metrics for the capture and evaluation hot paths.
+
+Environment:
+    ADC_METRICS=1              record metrics and print a report at exit
+    ADC_METRICS_OUT=path       write the report there, JSON if it ends in .json (default: text on stderr)
+    ADC_PROFILE=cprofile       also profile the whole run (stats saved to ADC_PROFILE_OUT, default adc_profile.prof)
+    ADC_PROFILE=tracemalloc    also trace allocations, giving each stage its peak allocation
+
+Disabled (the default), stage() hands back one shared do-nothing context
+manager and gauge() returns straight away, so instrumented code pays a
+method call per stage or reading.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_TOP = 20  # lines of the cProfile / tracemalloc summary in the report
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def output(self, array):
+        pass
+
+    def count(self, samples):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, registry, name, samples):
+        self.registry = registry
+        self.name = name
+        self.samples = samples
+        self.nbytes = 0
+
+    def __enter__(self):
+        self._tracing = tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.reset_peak()
+            self._mem_start = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        alloc = tracemalloc.get_traced_memory()[1] - self._mem_start if self._tracing else None
+        self.registry._record(self.name, elapsed, self.samples, self.nbytes, alloc)
+        return False
+
+    def output(self, array):
+        """Note the size of the array this stage produced."""
+        self.nbytes += getattr(array, "nbytes", 0)
+
+    def count(self, samples):
+        """Set the sample count when it is only known inside the stage."""
+        self.samples = samples
+
+
+class MetricsRegistry:
+    """In-memory stage timings and gauges, safe to update from several threads."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.gauges = {}
+        self._profiler = None
+
+    def stage(self, name, samples=0):
+        """Context manager timing one run of a stage that processes `samples` samples."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, samples)
+
+    def gauge(self, name, value):
+        """Record one reading of a level such as the serial backlog."""
+        if not self.enabled:
+            return
+        with self._lock:
+            g = self.gauges.get(name)
+            if g is None:
+                self.gauges[name] = {"count": 1, "last": value, "min": value, "max": value, "total": value}
+            else:
+                g["count"] += 1
+                g["last"] = value
+                g["total"] += value
+                if value < g["min"]:
+                    g["min"] = value
+                if value > g["max"]:
+                    g["max"] = value
+
+    def _record(self, name, elapsed, samples, nbytes, alloc):
+        with self._lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = {"calls": 0, "total_s": 0.0, "min_s": elapsed, "max_s": elapsed,
+                                         "samples": 0, "bytes": 0, "alloc_peak": None}
+            s["calls"] += 1
+            s["total_s"] += elapsed
+            s["min_s"] = min(s["min_s"], elapsed)
+            s["max_s"] = max(s["max_s"], elapsed)
+            s["samples"] += samples
+            s["bytes"] += nbytes
+            if alloc is not None:
+                s["alloc_peak"] = max(s["alloc_peak"] or 0, alloc)
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.gauges.clear()
+
+    def snapshot(self):
+        """Plain dict of every stage (with mean time and throughput) and gauge."""
+        with self._lock:
+            stages = {}
+            for name, s in self.stages.items():
+                row = dict(s)
+                row["mean_s"] = s["total_s"] / s["calls"]
+                row["samples_per_s"] = s["samples"] / s["total_s"] if s["samples"] and s["total_s"] else None
+                stages[name] = row
+            gauges = {name: dict(g, mean=g["total"] / g["count"]) for name, g in self.gauges.items()}
+        return {"stages": stages, "gauges": gauges}
+
+    def format_table(self):
+        snap = self.snapshot()
+        lines = [f"{'stage':<22} {'calls':>6} {'total':>9} {'mean':>9} {'max':>9} {'samples/s':>11} "
+                 f"{'out MB':>8} {'alloc MB':>9}"]
+        for name, s in snap["stages"].items():
+            rate = f"{s['samples_per_s']:11.0f}" if s["samples_per_s"] else f"{'-':>11}"
+            alloc = f"{s['alloc_peak'] / 1e6:9.2f}" if s["alloc_peak"] is not None else f"{'-':>9}"
+            lines.append(f"{name:<22} {s['calls']:6d} {s['total_s'] * 1000:7.1f}ms {s['mean_s'] * 1000:7.2f}ms "
+                         f"{s['max_s'] * 1000:7.2f}ms {rate} {s['bytes'] / 1e6:8.2f} {alloc}")
+        if snap["gauges"]:
+            lines.append("")
+            lines.append(f"{'gauge':<22} {'count':>8} {'last':>10} {'mean':>10} {'max':>10}")
+            for name, g in snap["gauges"].items():
+                lines.append(f"{name:<22} {g['count']:8d} {g['last']:10.0f} {g['mean']:10.1f} {g['max']:10.0f}")
+        return "\n".join(lines)
+
+    def dump(self, out=None, fmt="text"):
+        """Write the report as a text table or JSON to out (default stderr)."""
+        out = out or sys.stderr
+        if fmt == "json":
+            json.dump(self.snapshot(), out, indent=2)
+            out.write("\n")
+        else:
+            out.write(self.format_table() + "\n")
+
+    def enable(self, profile=None):
+        """Start recording; profile may be "cprofile" or "tracemalloc"."""
+        self.enabled = True
+        if profile == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif profile == "cprofile" and self._profiler is None:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _dump_at_exit(self, path, profile_path):
+        if path:
+            with open(path, "w") as out:
+                self.dump(out, "json" if path.endswith(".json") else "text")
+        else:
+            self.dump()
+        if self._profiler is not None:
+            import pstats
+
+            self._profiler.disable()
+            self._profiler.dump_stats(profile_path)
+            print(f"\ncProfile stats saved to {profile_path}, top {PROFILE_TOP} by cumulative time:",
+                  file=sys.stderr)
+            pstats.Stats(self._profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        if tracemalloc.is_tracing():
+            print(f"\nTop {PROFILE_TOP} allocation sites still held:", file=sys.stderr)
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP]:
+                print(f"  {stat}", file=sys.stderr)
+
+
+METRICS = MetricsRegistry()
+stage = METRICS.stage
+gauge = METRICS.gauge
+
+
+def configure_from_env(environ=os.environ):
+    """Enable METRICS and the exit report if ADC_METRICS is set."""
+    if environ.get("ADC_METRICS", "") in ("", "0"):
+        return
+    METRICS.enable(environ.get("ADC_PROFILE"))
+    atexit.register(METRICS._dump_at_exit, environ.get("ADC_METRICS_OUT"),
+                    environ.get("ADC_PROFILE_OUT", "adc_profile.prof"))
+
+
+configure_from_env()
@@ -0,0 +1,212 @@
+"""Grid or random search over the filter, peak and fusion settings of the evaluation pipeline.
+
+Every combination is scored on the labelled recordings like batch_eval (error
+of the breath count) and costed as the pipeline time it takes per hour of
+signal. Work is shared wherever the pipeline allows: a worker takes one
+recording and one window size, filters and normalises once, decimates once per
+factor and finds peaks once per (factor, prominence, distance), so only the
+cheap fusion step runs for every combination. The breath counts are exactly
+the ones evaluate_file gives for the same settings.
+
+    python param_sweep.py [data_dir] [--random 300] [--windows 500,1200] [-o sweep.csv]
+
+The Pareto front (combinations no other one beats on both error and cost) is
+printed. The lowest-MSE combination, the cheapest if several tie, is written
+to --config, which adc_data_eval.py and batch_eval.py --config load. With a
+corpus this small the winner is tuned to it, so check it on new recordings.
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from adc_loader import load_adc_array, read_header
+from batch_eval import SAVE_BASE_DIR, find_recordings
+from breath_pipeline import (EVAL_CONFIG, SAMPLE_RATE, choose_window_modes, decimate_signal, default_config,
+                             filtered_stats, fuse_windows, normalize, plateau_peaks, reduced_peaks, save_eval_config)
+from capture_format import effective_sample_rate
+from fusion import count_breaths
+from ma_filters import MA_filter
+from signal_quality import MODE_REJECT, channel_usable, overall_mode, window_quality
+
+# Default grid: the hand-picked values and their neighbours
+WINDOWS = (250, 500, 800, 1200, 1600)
+PROMINENCES = (0.05, 0.1, 0.2, 0.3, 0.5)
+DISTANCES = (500, 750, 1000, 1250)
+MATCH_TOLERANCES = (0.25, 0.5, 0.75)
+ABNORMAL_GAPS = (1.3, 1.5, 1.8)
+DECIMATIONS = (1, 13, 26)
+COMBO_KEYS = ("decimate", "prominence", "distance", "match_tolerance", "abnormal_gap")  # per window
+CSV_FIELDS = ["window_size"] + list(COMBO_KEYS) + ["mse", "mae", "exact", "cost_ms_per_hour", "pareto"]
+
+
+def _sweep_task(task):
+    """Breath counts and pipeline seconds of every combo for one recording and window size."""
+    path, window_size, combos = task
+    samples = load_adc_array(path)
+    sample_rate = effective_sample_rate(read_header(path), SAMPLE_RATE)
+    duration = len(samples) / sample_rate
+    # Channels evaluate_samples would skip only lose their peaks here; the counts are the same
+    quality = window_quality(samples, sample_rate)
+    usable = channel_usable(quality)
+    if any(combo[0] > 1 for combo in combos):
+        import scipy.signal  # noqa: F401  decimate_signal imports it on first use, load it before anything is timed
+
+    start = time.perf_counter()
+    normalized = normalize(MA_filter(samples, window_size), *filtered_stats(samples, window_size))
+    signals = np.stack((normalized[:, 0], -normalized[:, 1]), axis=1)
+    filter_s = time.perf_counter() - start
+
+    reduced, reduce_s, peaks, peaks_s = {1: signals}, {1: 0.0}, {}, {}
+    detected, cost = {}, {}
+    for combo in combos:
+        factor, prominence, distance, match_tolerance, abnormal_gap = combo
+        if factor not in reduced:
+            start = time.perf_counter()
+            reduced[factor] = decimate_signal(signals, factor)
+            reduce_s[factor] = time.perf_counter() - start
+        key = (factor, prominence, distance)
+        if key not in peaks:
+            start = time.perf_counter()
+            if factor > 1:
+                peaks[key] = reduced_peaks(reduced[factor], factor, prominence, distance)
+            else:
+                peaks[key] = [plateau_peaks(signals[:, c], prominence, distance) for c in range(2)]
+            peaks_s[key] = time.perf_counter() - start
+        start = time.perf_counter()
+        mids1, mids2 = (mids if ok else None for mids, ok in zip(peaks[key], usable))
+        combo_quality, modes = choose_window_modes(quality, usable, mids1, mids2, window_size, abnormal_gap)
+        fused = fuse_windows(combo_quality, modes, mids1, mids2, window_size, match_tolerance, abnormal_gap)
+        fuse_s = time.perf_counter() - start
+        detected[combo] = count_breaths(fused.index.size, window_size) if overall_mode(modes) != MODE_REJECT else 0
+        cost[combo] = filter_s + reduce_s[factor] + peaks_s[key] + fuse_s
+    return path, window_size, duration, detected, cost
+
+
+def make_combos(windows, decimations, prominences, distances, match_tolerances, abnormal_gaps,
+                random_count=None, seed=0):
+    """{window_size: [combo, ...]} for the full grid, or random_count combos drawn from it."""
+    grid = list(itertools.product(windows, decimations, prominences, distances, match_tolerances, abnormal_gaps))
+    if random_count is not None and random_count < len(grid):
+        rng = np.random.default_rng(seed)
+        grid = [grid[i] for i in sorted(rng.choice(len(grid), random_count, replace=False))]
+    combos = {}
+    for window_size, *combo in grid:
+        combos.setdefault(window_size, []).append(tuple(combo))
+    return combos
+
+
+def run_sweep(recordings, combos, workers=None):
+    """Score every combo on every recording; return one result dict per (window_size, combo)."""
+    tasks = [(path, window_size, window_combos) for window_size, window_combos in combos.items()
+             for path, _, _ in recordings]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        outputs = [_sweep_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_sweep_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    truth = {path: true_breaths for path, _, true_breaths in recordings}
+    errors, costs, hours = {}, {}, {}
+    for path, window_size, duration, detected, cost in outputs:
+        hours[window_size] = hours.get(window_size, 0.0) + duration / 3600
+        for combo, breaths in detected.items():
+            errors.setdefault((window_size, combo), []).append(breaths - truth[path])
+            costs[(window_size, combo)] = costs.get((window_size, combo), 0.0) + cost[combo]
+    results = []
+    for (window_size, combo), errs in errors.items():
+        errs = np.array(errs, dtype=float)
+        result = {"window_size": window_size, **dict(zip(COMBO_KEYS, combo))}
+        result.update(mse=float(np.mean(errs ** 2)), mae=float(np.mean(np.abs(errs))), exact=int(np.sum(errs == 0)),
+                      cost_ms_per_hour=costs[(window_size, combo)] * 1000 / hours[window_size])
+        results.append(result)
+    return results
+
+
+def pareto_front(results):
+    """Results that no other result beats on both MSE and cost, cheapest first. Marks them pareto=True."""
+    front = []
+    for result in sorted(results, key=lambda r: (r["cost_ms_per_hour"], r["mse"])):
+        result["pareto"] = not front or result["mse"] < front[-1]["mse"]
+        if result["pareto"]:
+            front.append(result)
+    return front
+
+
+def choose(results):
+    """Lowest MSE, then lowest MAE, then lowest cost."""
+    return min(results, key=lambda r: (r["mse"], r["mae"], r["cost_ms_per_hour"]))
+
+
+def _floats(text):
+    return tuple(float(v) for v in text.split(","))
+
+
+def _ints(text):
+    return tuple(int(v) for v in text.split(","))
+
+
+def format_result(r):
+    return (f"window {r['window_size']:5d}  decimate {r['decimate']:3d}  prominence {r['prominence']:<5g} "
+            f"distance {r['distance']:5d}  match {r['match_tolerance']:<5g} gap {r['abnormal_gap']:<4g} "
+            f"MSE {r['mse']:7.3f}  MAE {r['mae']:6.3f}  exact {r['exact']:3d}  {r['cost_ms_per_hour']:8.0f} ms/h")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the pipeline settings for the best breath counts.")
+    parser.add_argument("data_dir", nargs="?", default=SAVE_BASE_DIR)
+    parser.add_argument("--windows", type=_ints, default=WINDOWS, help="comma separated window sizes")
+    parser.add_argument("--prominences", type=_floats, default=PROMINENCES)
+    parser.add_argument("--distances", type=_ints, default=DISTANCES)
+    parser.add_argument("--match-tolerances", type=_floats, default=MATCH_TOLERANCES)
+    parser.add_argument("--abnormal-gaps", type=_floats, default=ABNORMAL_GAPS)
+    parser.add_argument("--decimations", type=_ints, default=DECIMATIONS)
+    parser.add_argument("--random", type=int, help="score this many random grid points instead of all of them")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("-o", "--output", help="write every scored combination to this CSV")
+    parser.add_argument("--config", default=EVAL_CONFIG, help="where to write the chosen settings")
+    args = parser.parse_args(argv)
+
+    recordings = find_recordings(args.data_dir)
+    if not recordings:
+        print(f"No labelled recordings found under {args.data_dir}", file=sys.stderr)
+        return 1
+    combos = make_combos(args.windows, args.decimations, args.prominences, args.distances,
+                         args.match_tolerances, args.abnormal_gaps, args.random, args.seed)
+    n_combos = sum(len(c) for c in combos.values())
+    print(f"Scoring {n_combos} combinations on {len(recordings)} recordings...")
+    start = time.perf_counter()
+    results = run_sweep(recordings, combos, args.workers)
+    elapsed = time.perf_counter() - start
+    front = pareto_front(results)
+    best = choose(results)
+
+    print(f"Done in {elapsed:.1f}s. Pareto front of MSE against pipeline cost:")
+    for result in front:
+        print("  " + format_result(result))
+    defaults = default_config()
+    baseline = [r for r in results if all(r[key] == defaults[key] for key in ("window_size",) + COMBO_KEYS)]
+    if baseline:
+        print("Hand-picked defaults:\n  " + format_result(baseline[0]))
+    print("Chosen:\n  " + format_result(best))
+
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(sorted(results, key=lambda r: (r["mse"], r["cost_ms_per_hour"])))
+    save_eval_config(best, args.config,
+                     sweep={"data_dir": args.data_dir, "recordings": len(recordings), "combinations": n_combos,
+                            "mse": best["mse"], "mae": best["mae"], "cost_ms_per_hour": best["cost_ms_per_hour"]})
+    print(f"Settings written to {args.config}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""Plateau peak finding with the semantics of scipy's find_peaks(x, prominence=, distance=, plateau_size=1).
+
+Pure NumPy, so the evaluation pipeline does not have to import scipy.signal,
+which takes longer to load than a short recording takes to evaluate.
+StreamingPeaks and ChunkedPlateauPeaks find the peaks of a signal that arrives
+sample by sample or chunk by chunk, and select_by_peak_distance is find_peaks'
+distance filter, ties included, so all of them agree with it exactly.
+
+Each of them can also measure the distance between two peaks from the facing
+edges of their plateaus rather than from the midpoints (from_edges), so a
+long flat top keeps its neighbours as far away as a short one does.
+"""
+import math
+
+import numpy as np
+
+
+class StreamingPeaks:
+    """Incremental plateau peak finder with the prominence rules of scipy's find_peaks.
+
+    Every local maximum (plateau midpoint) of the filtered signal becomes a
+    candidate. A monotonic stack of peaks that have not yet been exceeded
+    tracks the minima needed for their prominence, so each sample costs
+    amortised O(1). Candidates are kept compactly so finalize() can repeat the
+    batch distance and prominence selection exactly once the global std is known.
+
+    With live=False candidates are not tracked for confirmable(), which is
+    what extend() expects, and take() can hand them over as they are found.
+    """
+
+    def __init__(self, live=True):
+        self.live = live
+        self.n = 0
+        self._prev = None
+        self._prev_index = None
+        self._plateau_start = None
+        # Stack entries, with an infinitely high sentinel so the stack is never empty
+        self._st_height = [math.inf]
+        self._st_seg_min = [math.inf]  # min of samples assigned to this entry's segment
+        self._st_left_min = [math.inf]
+        self._st_cand = [-1]
+        # Candidate peaks in order of position, with the first and last sample of their plateaus
+        self.positions = []
+        self.lefts = []
+        self.rights = []
+        self.heights = []
+        self.prominences = []
+        self.first = 0  # candidate index of positions[0], advanced by take()
+        self.late = {}  # candidate index -> prominence, for candidates taken before it was known
+        self._pending = {}  # candidate index -> (left_min, lowest sample seen since the peak)
+
+    def push(self, value):
+        """Feed one filtered sample. Returns the index of a newly found candidate or None."""
+        new_cand = self._push(value, self.n)
+        self.n += 1
+        return new_cand
+
+    def extend(self, values, threshold=None):
+        """Feed a chunk of filtered samples at once.
+
+        A sample inside a strictly rising or falling stretch can neither end a
+        plateau nor set a minimum that its stretch's end points do not, so only
+        the first and last sample of each run of equal values where the
+        direction turns go through the stack. The filtered signal is smooth, so
+        that is a small fraction of the samples, and the result is the same as
+        pushing every one.
+
+        When live, returns the candidates confirmed against threshold within
+        the chunk, as push/update_pending/confirmable per sample would.
+        """
+        values = np.asarray(values)
+        n = values.size
+        confirmed = []
+        if n == 0:
+            return confirmed
+        change = np.flatnonzero(values[1:] != values[:-1]) + 1
+        starts = np.concatenate(([0], change))
+        ends = np.concatenate((change - 1, [n - 1]))
+        rising = values[starts[1:]] > values[starts[:-1]]
+        keep = np.ones(starts.size, dtype=bool)  # the first and last run border the neighbouring chunks
+        keep[1:-1] = rising[:-1] != rising[1:]
+        index = np.stack((starts[keep], ends[keep]), axis=1).ravel()
+        index = index[np.concatenate(([True], index[1:] != index[:-1]))]
+        base = self.n
+        live = self.live and threshold is not None
+        for j, value in zip(index.tolist(), values[index].tolist()):
+            self._push(value, base + j)
+            if live:
+                self.update_pending(value)
+                confirmed.extend(self.confirmable(threshold))
+        self.n += n
+        return confirmed
+
+    def _push(self, value, i):
+        prev = self._prev
+        new_cand = None
+        st_height = self._st_height
+        st_seg = self._st_seg_min
+
+        if prev is not None and value < prev and self._plateau_start is not None:
+            # Plateau [plateau_start, i - 1] is a local maximum
+            mid = (self._plateau_start + self._prev_index) // 2
+            left_min = math.inf
+            j = len(st_height) - 1
+            while True:
+                left_min = min(left_min, st_seg[j])
+                if st_height[j] > prev:
+                    break
+                j -= 1
+            new_cand = self.first + len(self.positions)
+            self.positions.append(mid)
+            self.lefts.append(self._plateau_start)
+            self.rights.append(self._prev_index)
+            self.heights.append(prev)
+            self.prominences.append(None)
+            st_height.append(prev)
+            st_seg.append(prev)
+            self._st_left_min.append(min(left_min, prev))
+            self._st_cand.append(new_cand)
+            if self.live:
+                self._pending[new_cand] = [min(left_min, prev), prev]
+
+        # Peaks exceeded by this sample are resolved: their right base is now known
+        while st_height[-1] < value:
+            height = st_height.pop()
+            seg_min = st_seg.pop()
+            left_min = self._st_left_min.pop()
+            cand = self._st_cand.pop()
+            self._resolve(cand, height - max(left_min, seg_min))
+            st_seg[-1] = min(st_seg[-1], seg_min)
+        st_seg[-1] = min(st_seg[-1], value)
+
+        if prev is not None:
+            if value > prev:
+                self._plateau_start = i
+            elif value < prev:
+                self._plateau_start = None
+        self._prev = value
+        self._prev_index = i
+        return new_cand
+
+    def update_pending(self, value):
+        """Lower the running right-side minimum of unconfirmed peaks."""
+        for state in self._pending.values():
+            if value < state[1]:
+                state[1] = value
+
+    def confirmable(self, threshold):
+        """Pop and return pending candidates whose prominence already reaches threshold."""
+        ready = []
+        if not self._pending:
+            return ready
+        for cand, (left_min, right_min) in list(self._pending.items()):
+            prominence = self.prominences[cand]
+            if prominence is None:
+                prominence = self.heights[cand] - max(left_min, right_min)
+            if prominence >= threshold:
+                ready.append(cand)
+                del self._pending[cand]
+            elif self.prominences[cand] is not None:
+                del self._pending[cand]  # resolved below threshold, never confirmable
+        return ready
+
+    def finish(self):
+        """Resolve peaks never exceeded before the end of the signal."""
+        st_seg = self._st_seg_min
+        while len(self._st_height) > 1:
+            height = self._st_height.pop()
+            seg_min = st_seg.pop()
+            left_min = self._st_left_min.pop()
+            cand = self._st_cand.pop()
+            self._resolve(cand, height - max(left_min, seg_min))
+            st_seg[-1] = min(st_seg[-1], seg_min)
+
+    def _resolve(self, cand, prominence):
+        j = cand - self.first
+        if j >= 0:
+            self.prominences[j] = prominence
+        elif cand in self.late:
+            self.late[cand] = prominence
+
+    def take(self):
+        """Hand over the candidates found so far and forget them (live=False only).
+
+        Returns (candidate index of the first, positions, lefts, rights,
+        heights, prominences). A prominence still None is written to
+        late[index] once the peak is resolved; pop it from there when it is no
+        longer needed.
+        """
+        first, taken = self.first, (self.positions, self.lefts, self.rights, self.heights, self.prominences)
+        for j, prominence in enumerate(self.prominences):
+            if prominence is None:
+                self.late[first + j] = None
+        self.first += len(self.positions)
+        self.positions, self.lefts, self.rights, self.heights, self.prominences = [], [], [], [], []
+        return (first,) + taken
+
+    def next_position(self):
+        """Lowest position a candidate found after this point can have."""
+        return self._plateau_start if self._plateau_start is not None else self.n
+
+    def select(self, min_prominence, distance, from_edges=False):
+        """Candidate positions surviving find_peaks' distance then prominence filters."""
+        peaks = np.asarray(self.positions, dtype=np.int64)
+        heights = np.asarray(self.heights, dtype=np.float64)
+        edges = (self.lefts, self.rights) if from_edges else (None, None)
+        keep = select_by_peak_distance(peaks, heights, distance, *edges)
+        prominences = np.asarray(self.prominences, dtype=np.float64)
+        keep &= prominences >= min_prominence
+        return peaks[keep]
+
+
+def select_by_peak_distance(peaks, priority, distance, lefts=None, rights=None):
+    """find_peaks' distance filter: highest priority first, equal ones in the order np.argsort gives, as scipy does.
+
+    With lefts and rights, the plateau edges of the peaks, the distance
+    between two peaks is the one between the facing edges.
+    """
+    keep = np.ones(peaks.size, dtype=bool)
+    distance = math.ceil(distance)
+    lefts = peaks if lefts is None else lefts
+    rights = peaks if rights is None else rights
+    for j in np.argsort(priority)[::-1]:
+        if not keep[j]:
+            continue
+        k = j - 1
+        while k >= 0 and lefts[j] - rights[k] < distance:
+            keep[k] = False
+            k -= 1
+        k = j + 1
+        while k < peaks.size and lefts[k] - rights[j] < distance:
+            keep[k] = False
+            k += 1
+    return keep
+
+
+def find_plateau_peaks(signal, prominence, distance, from_edges=False):
+    """Plateau midpoints of the peaks find_peaks reports for signal, in order.
+
+    NaN samples split the signal: find_peaks never puts a peak next to one
+    and its prominence bases stop at them, the same as at the ends. With
+    from_edges, distance is kept between plateau edges instead.
+    """
+    peaks = ChunkedPlateauPeaks(prominence, distance, from_edges)
+    peaks.extend(signal)
+    return peaks.finish()
+
+
+class ChunkedPlateauPeaks:
+    """find_plateau_peaks for a signal fed in chunks, with the same result.
+
+    StreamingPeaks finds the candidates (every local maximum) and their
+    prominences chunk by chunk, and finish() applies find_peaks' distance and
+    prominence filters to all of them at once. The distance filter cannot run
+    earlier: find_peaks takes equal-height peaks in the order NumPy's argsort
+    gives them, which depends on every candidate. Memory is five numbers per
+    local maximum of the signal, a few per second of a filtered breathing
+    signal, against the samples' hundreds.
+    """
+
+    def __init__(self, prominence, distance, from_edges=False):
+        self.prominence = prominence
+        self.distance = distance
+        self.from_edges = from_edges
+        self.n = 0
+        self._peaks = None  # StreamingPeaks of the current stretch between NaNs
+        self._offset = 0  # first sample of that stretch
+        self._base = 0  # candidates in the stretches before it
+        self._positions, self._lefts, self._rights = [], [], []  # candidates taken, as arrays
+        self._heights, self._prominences = [], []
+        self._late = {}  # candidate number -> prominence, for those taken before it was known
+
+    def extend(self, values):
+        """Feed the next chunk of the signal."""
+        values = np.asarray(values, dtype=np.float64)
+        nan = np.isnan(values)
+        if not nan.any():
+            self._extend(values, self.n)
+        else:
+            # Runs of NaN and of numbers, alternating
+            edges = np.concatenate(([0], np.flatnonzero(nan[1:] != nan[:-1]) + 1, [values.size]))
+            for start, stop in zip(edges[:-1], edges[1:]):
+                if nan[start]:
+                    self._end_stretch()
+                else:
+                    self._extend(values[start:stop], self.n + int(start))
+        self.n += values.size
+        if self._peaks is not None:
+            self._take()
+
+    def finish(self):
+        """Plateau midpoints of the peaks of the whole signal, in order."""
+        self._end_stretch()
+        if not self._positions:
+            return []
+        positions = np.concatenate(self._positions)
+        prominences = np.concatenate(self._prominences)
+        for j, prominence in self._late.items():
+            prominences[j] = prominence
+        edges = (np.concatenate(self._lefts), np.concatenate(self._rights)) if self.from_edges else (None, None)
+        keep = select_by_peak_distance(positions, np.concatenate(self._heights), self.distance, *edges)
+        keep &= prominences >= self.prominence
+        return positions[keep].tolist()
+
+    def _extend(self, values, at):
+        if self._peaks is None:
+            self._peaks = StreamingPeaks(live=False)
+            self._offset = at
+        self._peaks.extend(values)
+
+    def _end_stretch(self):
+        if self._peaks is None:
+            return
+        self._peaks.finish()
+        self._take()
+        self._base += self._peaks.first
+        self._peaks = None
+
+    def _take(self):
+        peaks = self._peaks
+        _, positions, lefts, rights, heights, prominences = peaks.take()
+        if positions:
+            self._positions.append(self._offset + np.asarray(positions, dtype=np.int64))
+            self._lefts.append(self._offset + np.asarray(lefts, dtype=np.int64))
+            self._rights.append(self._offset + np.asarray(rights, dtype=np.int64))
+            self._heights.append(np.asarray(heights, dtype=np.float64))
+            self._prominences.append(np.array(prominences, dtype=np.float64))  # None (not known yet) is NaN
+        for cand in [cand for cand, prominence in peaks.late.items() if prominence is not None]:
+            self._late[self._base + cand] = peaks.late.pop(cand)
@@ -0,0 +1,306 @@
+"""Psychometric sigmoids fitted to real breath-rate errors, with bootstrap confidence intervals.
+
+jnd.py fits one curve at a time with curve_fit. Here every curve of a batch
+(all conditions, or all bootstrap replicates of one) is fitted together by a
+vectorised Levenberg-Marquardt on the same four-parameter sigmoid, so
+thousands of fits cost about as much as a handful of NumPy calls per
+iteration.
+
+The data are batch_eval.py reports (--format json or csv). For each
+condition, by default the breath type, the response at a delta of d bpm is
+the share of recordings whose estimated rate is within d bpm of the true
+rate. x0 of the fitted curve is then the error the estimator stays within
+half of the time (shifted by the floor b of exact recordings), on the same
+axis as the JNDs jnd.py fits to user responses. A condition whose curve the
+deltas cannot pin down (see fit_responses) gets NaN and converged False
+rather than an extrapolated x0. Confidence intervals come
+from resampling the recordings of each condition with replacement; the
+replicates are drawn and fitted in vectorised blocks spread over a process
+pool.
+
+    python batch_eval.py --format json -o report.json
+    python performance_assessment/psychometric.py report.json [--by mode] [--replicates 5000] [-o fits.csv]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DELTAS = np.arange(0.0, 12.5, 0.5)  # bpm
+P0 = (1.0, 2.0, 1.0, 0.0)  # L, x0, k, b, as jnd.py
+PARAMS = ("L", "x0", "k", "b")
+REPLICATES = 2000
+BLOCK = 1000  # replicates resampled and fitted per array operation
+CONFIDENCE = 0.95
+MAX_ITER = 200
+TOLERANCE = 1e-8  # relative, on the cost or on the step, as curve_fit's ftol and xtol
+BY_COLUMNS = ("breath_type", "mode", "report")
+
+
+def sigmoid(x, L, x0, k, b):
+    """jnd.sigmoid, broadcasting parameters of shape (R, 1) against x of shape (D,)."""
+    z = np.clip(-k * (x - x0), -700, 700)
+    return L / (1 + np.exp(z)) + b
+
+
+def _jacobian(x, p):
+    """(R, D, 4) derivatives of sigmoid with respect to L, x0, k, b."""
+    L, x0, k = p[:, 0:1], p[:, 1:2], p[:, 2:3]
+    s = 1 / (1 + np.exp(np.clip(-k * (x - x0), -700, 700)))
+    ds = s * (1 - s)
+    return np.stack((s, -L * k * ds, L * (x - x0) * ds, np.ones_like(s)), axis=2)
+
+
+def fit_sigmoids(x, y, p0=P0, max_iter=MAX_ITER, tol=TOLERANCE):
+    """Least-squares fit of sigmoid to every row of y at once.
+
+    x is (D,) and y is (R, D); p0 is one starting point for all rows or an
+    (R, 4) array. Each row gets its own Levenberg-Marquardt damping, so rows
+    that converge early simply stop moving. Returns (params (R, 4), sum of
+    squared residuals (R,), converged (R,) bool).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    n = y.shape[0]
+    p = np.broadcast_to(np.asarray(p0, dtype=np.float64), (n, 4)).copy()
+    residual = sigmoid(x, *p.T[:, :, None]) - y
+    cost = np.einsum('rd,rd->r', residual, residual)
+    damping = np.full(n, 1e-3)
+    converged = np.zeros(n, dtype=bool)
+    eye = np.eye(4)
+    for _ in range(max_iter):
+        active = ~converged
+        if not active.any():
+            break
+        pa, ra = p[active], residual[active]
+        J = _jacobian(x, pa)
+        JTJ = np.einsum('rdi,rdj->rij', J, J)
+        grad = np.einsum('rdi,rd->ri', J, ra)
+        # Marquardt scaling by the diagonal, plus a ridge relative to it so A stays positive definite
+        d = np.einsum('rii->ri', JTJ)
+        diag = (d + 1e-9 * d.max(axis=1, keepdims=True))[:, :, None] * eye
+        A = JTJ + damping[active, None, None] * diag
+        step = np.linalg.solve(A, -grad[:, :, None])[:, :, 0]
+        trial = pa + step
+        trial_residual = sigmoid(x, *trial.T[:, :, None]) - y[active]
+        trial_cost = np.einsum('rd,rd->r', trial_residual, trial_residual)
+        better = np.isfinite(trial_cost) & (trial_cost <= cost[active])
+        index = np.flatnonzero(active)
+        gain = cost[active] - trial_cost
+        small_step = np.sqrt(np.einsum('ri,ri->r', step, step)) <= tol * (1e-8 + np.sqrt(np.einsum('ri,ri->r', pa, pa)))
+        done = better & ((gain <= tol * cost[active]) | small_step)
+        accept = index[better]
+        p[accept] = trial[better]
+        residual[accept] = trial_residual[better]
+        cost[accept] = trial_cost[better]
+        damping[accept] = np.maximum(damping[accept] / 3, 1e-7)
+        damping[index[~better]] = np.minimum(damping[index[~better]] * 4, 1e12)
+        converged[index[done | (damping[active] >= 1e12)]] = True
+    return p, cost, converged
+
+
+def fit_responses(deltas, curves):
+    """fit_sigmoids for response curves, NaN with converged False wherever the data cannot pin the curve down.
+
+    A constant curve (every recording within the smallest delta, or none
+    within the largest) or a bare step from 0 to 1 has no midpoint or slope
+    to estimate, so it is not fitted at all. A fit that falls instead of
+    rising, or puts x0 further outside the deltas than their own span, is an
+    extrapolation and fails too. Small resamples of a few distinct errors
+    give such fits, with x0 in the hundreds.
+    """
+    deltas = np.asarray(deltas, dtype=np.float64)
+    curves = np.atleast_2d(np.asarray(curves, dtype=np.float64))
+    params = np.full((len(curves), 4), np.nan)
+    converged = np.zeros(len(curves), dtype=bool)
+    fit = (np.ptp(curves, axis=1) > 0) & ~np.all((curves == 0) | (curves == 1), axis=1)
+    if fit.any():
+        p, _, ok = fit_sigmoids(deltas, curves[fit])
+        span = deltas[-1] - deltas[0]
+        ok &= (p[:, 2] > 0) & (p[:, 1] >= deltas[0] - span) & (p[:, 1] <= deltas[-1] + span)
+        p[~ok] = np.nan
+        params[fit], converged[fit] = p, ok
+    return params, converged
+
+
+def responses(errors, deltas=DELTAS):
+    """Share of recordings within each delta of the true rate, along the last axis of errors.
+
+    errors (..., n) gives responses (..., D), so a (B, n) stack of resamples
+    is turned into B response curves in one comparison.
+    """
+    return (np.abs(errors)[..., :, None] <= deltas).mean(axis=-2)
+
+
+def load_errors(paths, by="breath_type"):
+    """{condition: per-recording bpm errors (estimated - true)} from batch_eval reports.
+
+    by is a report column (breath_type, mode) or "report", which makes every
+    report file its own condition, e.g. to compare settings.
+    """
+    errors = {}
+    for path in paths:
+        if path.endswith(".json"):
+            with open(path) as f:
+                rows = json.load(f)["files"]
+        else:
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        label = os.path.splitext(os.path.basename(path))[0]
+        for row in rows:
+            key = label if by == "report" else row.get(by, "")
+            errors.setdefault(key, []).append(float(row["bpm"]) - float(row["true_bpm"]))
+    return {key: np.array(values) for key, values in sorted(errors.items())}
+
+
+def _bootstrap_task(task):
+    """Fitted parameters of count resamples of errors, NaN where a fit failed (see fit_responses)."""
+    errors, deltas, count, seed = task
+    rng = np.random.default_rng(seed)
+    params = []
+    for start in range(0, count, BLOCK):
+        m = min(BLOCK, count - start)
+        resampled = errors[rng.integers(0, errors.size, (m, errors.size))]
+        params.append(fit_responses(deltas, responses(resampled, deltas))[0])
+    return np.concatenate(params) if params else np.empty((0, 4))
+
+
+def bootstrap(errors_by_condition, deltas=DELTAS, replicates=REPLICATES, workers=None, seed=0):
+    """{condition: (replicates, 4) fitted parameters of resampled recordings}.
+
+    Replicates are split into BLOCK-sized tasks with independent seeds and
+    fitted in a process pool (workers=1 runs in this process); the result
+    does not depend on the number of workers.
+    """
+    tasks, owners = [], []
+    seeds = iter(np.random.SeedSequence(seed).spawn(len(errors_by_condition) * -(-replicates // BLOCK)))
+    for condition, errors in errors_by_condition.items():
+        for start in range(0, replicates, BLOCK):
+            tasks.append((errors, deltas, min(BLOCK, replicates - start), next(seeds)))
+            owners.append(condition)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        outputs = [_bootstrap_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_bootstrap_task, tasks))
+    params = {}
+    for condition, output in zip(owners, outputs):
+        params.setdefault(condition, []).append(output)
+    return {condition: np.concatenate(parts) for condition, parts in params.items()}
+
+
+def fit_conditions(errors_by_condition, deltas=DELTAS, replicates=REPLICATES, workers=None, seed=0,
+                   confidence=CONFIDENCE):
+    """Fit every condition and bootstrap its parameters.
+
+    Returns (results, replicate parameters). Each result has the condition,
+    its recordings, mean absolute error, the fitted L, x0, k and b, a
+    percentile confidence interval for each (<param>_lo, <param>_hi) and the
+    share of replicates whose fit failed. A failed fit has NaN parameters
+    and converged False.
+    """
+    conditions = list(errors_by_condition)
+    curves = np.array([responses(errors_by_condition[c], deltas) for c in conditions]).reshape(-1, len(deltas))
+    params, converged = fit_responses(deltas, curves)
+    boot = bootstrap(errors_by_condition, deltas, replicates, workers, seed) if replicates else {}
+    tail = (1 - confidence) / 2 * 100
+    results = []
+    for i, condition in enumerate(conditions):
+        errors = errors_by_condition[condition]
+        result = {"condition": condition, "files": int(errors.size), "mae": float(np.mean(np.abs(errors))),
+                  "converged": bool(converged[i])}
+        result.update({name: float(value) for name, value in zip(PARAMS, params[i])})
+        samples = boot.get(condition)
+        ok = samples[~np.isnan(samples).any(axis=1)] if samples is not None else np.empty((0, 4))
+        for j, name in enumerate(PARAMS):
+            lo, hi = np.percentile(ok[:, j], [tail, 100 - tail]) if len(ok) else (np.nan, np.nan)
+            result[f"{name}_lo"], result[f"{name}_hi"] = float(lo), float(hi)
+        result["failed"] = 1 - len(ok) / len(samples) if samples is not None and len(samples) else 0.0
+        results.append(result)
+    return results, boot
+
+
+def plot_fits(errors_by_condition, results, boot, deltas=DELTAS, confidence=CONFIDENCE, output=None):
+    """Empirical responses, fitted curves and their bootstrap bands, one colour per condition."""
+    import matplotlib.pyplot as plt
+    x_fit = np.linspace(deltas[0], deltas[-1], 300)
+    tail = (1 - confidence) / 2 * 100
+    plt.figure(figsize=(10, 6))
+    for result in results:
+        condition = result["condition"]
+        points, = plt.plot(deltas, responses(errors_by_condition[condition], deltas), 'o',
+                           label=f"{condition} ({result['files']} recordings)")
+        color = points.get_color()
+        if not result["converged"]:
+            continue
+        plt.plot(x_fit, sigmoid(x_fit, *(result[name] for name in PARAMS)), '-', color=color)
+        samples = boot.get(condition)
+        if samples is not None:
+            samples = samples[~np.isnan(samples).any(axis=1)]
+        if samples is not None and len(samples):
+            curves = sigmoid(x_fit, *samples.T[:, :, None])
+            lo, hi = np.percentile(curves, [tail, 100 - tail], axis=0)
+            plt.fill_between(x_fit, lo, hi, color=color, alpha=0.2)
+        plt.axvline(result["x0"], color=color, linestyle='--',
+                    label=f"x0 {condition} ≈ {result['x0']:.2f} bpm [{result['x0_lo']:.2f}, {result['x0_hi']:.2f}]")
+    plt.title("Breath-rate error psychometric curves")
+    plt.xlabel("Δ from True Breath Rate (bpm)")
+    plt.ylabel("P(|estimate - truth| ≤ Δ)")
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    if output:
+        plt.savefig(output)
+        plt.close()
+    else:
+        plt.show()
+
+
+def format_result(r):
+    return (f"{r['condition']:>10s}  {r['files']:4d} files  MAE {r['mae']:6.2f}  "
+            f"x0 {r['x0']:6.2f} [{r['x0_lo']:6.2f}, {r['x0_hi']:6.2f}]  "
+            f"k {r['k']:7.2f} [{r['k_lo']:7.2f}, {r['k_hi']:7.2f}]  "
+            f"b {r['b']:5.2f}  failed {r['failed']:.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit psychometric curves to batch_eval breath-rate errors.")
+    parser.add_argument("reports", nargs="+", help="batch_eval.py reports, JSON or CSV")
+    parser.add_argument("--by", choices=BY_COLUMNS, default="breath_type", help="what makes a condition")
+    parser.add_argument("--replicates", type=int, default=REPLICATES, help="bootstrap resamples per condition")
+    parser.add_argument("--max-delta", type=float, default=DELTAS[-1], help="largest delta in bpm")
+    parser.add_argument("--step", type=float, default=DELTAS[1] - DELTAS[0], help="delta spacing in bpm")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("-o", "--output", help="write the fits to this CSV")
+    parser.add_argument("--plot", action="store_true", help="plot the curves")
+    parser.add_argument("--plot-output", help="save the plot here instead of showing it")
+    args = parser.parse_args(argv)
+
+    errors = load_errors(args.reports, args.by)
+    if not errors:
+        print("No recordings in the reports", file=sys.stderr)
+        return 1
+    deltas = np.arange(0.0, args.max_delta + args.step / 2, args.step)
+    results, boot = fit_conditions(errors, deltas, args.replicates, args.workers, args.seed, args.confidence)
+    print(f"{args.replicates} bootstrap replicates per condition, {args.confidence:.0%} intervals:")
+    for result in results:
+        print("  " + format_result(result))
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    if args.plot or args.plot_output:
+        plot_fits(errors, results, boot, deltas, args.confidence, args.plot_output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,7 @@
-import matplotlib.pyplot as plt
-
-def load_adc_data(filename):
-    adc1 = []
-    adc2 = []
-    with open(filename, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) == 2:
-                try:
-                    val1 = int(parts[0])
-                    val2 = int(parts[1])
-                    adc1.append(val1)
-                    adc2.append(val2)
-                except ValueError:
-                    continue  # skip malformed lines
-    return adc1, adc2
+from adc_loader import load_adc_data
 
 def plot_time(filename):
+    import matplotlib.pyplot as plt
     # Read and convert to integers
     adc1, adc2 = load_adc_data(filename)
     # print(f"ADC values: {adc_values}")
@@ -0,0 +1,357 @@
+"""Play recordings back through the live capture path, with or without real-time pacing.
+
+ReplaySerial stands in for serial.Serial (in_waiting, read, timeout, close),
+so SerialIngest, the capture server and the live view run unchanged without
+hardware. Raw "Ca=.. Cb=.." captures are replayed byte for byte; cleaned text
+captures, binary captures and session stores are re-encoded as frames.
+speed=1 is real time, 10 or 100 accelerate, None replays as fast as it is read.
+
+    python replay.py data/normal/5/adc_normal5_1.data --speed 10
+    python replay.py capture.adcs --speed 1 --live
+    python replay.py data/sport/10/adc_sport10_1.data --max-speed
+
+--max-speed finds the highest speed the SerialIngest -> FrameSink -> capture
+writer -> streaming estimator chain sustains: a speed passes when nothing
+is dropped and the estimator never falls more than MAX_LAG seconds (wall
+clock) behind the replay.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from adc_loader import iter_adc_chunks, read_header
+from breath_pipeline import SAMPLE_RATE, WINDOW_SIZE
+from breath_stream import StreamingBreathRate
+from capture_format import effective_sample_rate
+from frame_parser import FrameSink
+from live_plot import LIVE_FPS, LiveMonitor, SampleHistory, SampleTap
+from serial_ingest import SerialIngest
+
+REPLAY_PREFIX = "replay:"  # port names like replay:data/normal/5/adc_normal5_1.data
+REPLAY_BLOCK = 1 << 14  # frames encoded at a time, well under SerialIngest's ring capacity
+READ_TIMEOUT = 0.01  # seconds, like the capture scripts' port timeout
+MAX_LAG = 1.0  # seconds the estimator may trail the replay at a sustainable speed
+TRIAL_SECONDS = 5.0  # wall-clock length of each --max-speed trial
+
+
+class ReplayFinished(EOFError):
+    """Raised by ReplaySerial.read once the whole recording has been read."""
+
+
+def is_raw_capture(filename):
+    """True for unprocessed UART captures, which start with a Ca= frame."""
+    with open(filename, 'rb') as f:
+        return b"Ca=" in f.read(64)
+
+
+def encode_frames(samples):
+    """(N, 2) samples as the STM32's Ca=/Cb= lines."""
+    return b"".join(b"Ca=%d Cb=%d\r\n" % (a, b) for a, b in np.asarray(samples).tolist())
+
+
+def _frame_blocks(filename):
+    """Yield the recording as byte blocks that end on a frame boundary."""
+    if not is_raw_capture(filename):
+        for samples in iter_adc_chunks(filename, REPLAY_BLOCK):
+            yield encode_frames(samples)
+        return
+    carry = b""
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(REPLAY_BLOCK * 16)  # bytes, about the size of an encoded block
+            if not block:
+                break
+            buf = carry + block
+            end = buf.rfind(b"\n") + 1
+            carry = buf[end:]
+            if end:
+                yield buf[:end]
+    if carry:
+        yield carry
+
+
+class ReplaySerial:
+    """serial.Serial look-alike that releases a recording's frames at speed times the sample rate.
+
+    Pacing starts with the first in_waiting or read. Like a real port, read(size)
+    blocks until size bytes have arrived or timeout passes. At the end of the
+    recording it raises ReplayFinished, or starts over if loop is set.
+    """
+
+    def __init__(self, filename, speed=1.0, sample_rate=None, timeout=READ_TIMEOUT, loop=False):
+        self.filename = filename
+        self.port = REPLAY_PREFIX + filename
+        self.speed = speed or None
+        self.timeout = timeout
+        self.loop = loop
+        if sample_rate is None:
+            sample_rate = effective_sample_rate(read_header(filename), SAMPLE_RATE)
+        self.sample_rate = sample_rate
+        self.is_open = True
+        self.frames_released = 0
+        self.bytes_released = 0
+        self._blocks = self._source()
+        self._block = b""
+        self._ends = np.empty(0, dtype=np.int64)  # end offset of each frame in _block
+        self._frame = 0  # frames of _block already released
+        self._buf = bytearray()
+        self._eof = False
+        self._start = None
+
+    def _source(self):
+        while True:
+            yield from _frame_blocks(self.filename)
+            if not self.loop:
+                return
+
+    def _next_block(self):
+        self._block = next(self._blocks, None)
+        if self._block is None:
+            self._eof = True
+            self._block = b""
+        self._ends = np.flatnonzero(np.frombuffer(self._block, dtype=np.uint8) == ord("\n")) + 1
+        if len(self._block) and (not len(self._ends) or self._ends[-1] != len(self._block)):
+            self._ends = np.append(self._ends, len(self._block))  # trailing partial line
+        self._frame = 0
+
+    def _release(self, due):
+        """Move frames into the receive buffer until due frames have been released in total."""
+        while self.frames_released < due and not self._eof:
+            if self._frame == len(self._ends):
+                self._next_block()
+                continue
+            take = int(min(due - self.frames_released, len(self._ends) - self._frame))
+            start = int(self._ends[self._frame - 1]) if self._frame else 0
+            end = int(self._ends[self._frame + take - 1])
+            self._buf += self._block[start:end]
+            self._frame += take
+            self.frames_released += take
+            self.bytes_released += end - start
+
+    def _due(self):
+        if self._start is None:
+            self._start = time.monotonic()
+        if self.speed is None:
+            return self.frames_released + REPLAY_BLOCK
+        return int((time.monotonic() - self._start) * self.speed * self.sample_rate)
+
+    @property
+    def in_waiting(self):
+        if self.speed is None:
+            if not self._buf:
+                self._release(self._due())
+        else:
+            self._release(self._due())
+        return len(self._buf)
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise ReplayFinished("replay port is closed")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            if self.speed is None:
+                if len(self._buf) < size:
+                    self._release(self._due())
+            else:
+                self._release(self._due())
+            if len(self._buf) >= size or self._eof:
+                break
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            # Sleep until about enough frames for size bytes are due, or the timeout
+            frame_bytes = self.bytes_released / self.frames_released if self.frames_released else 17
+            needed = self.frames_released + max(1, int((size - len(self._buf)) / frame_bytes))
+            wake = self._start + needed / (self.speed * self.sample_rate)
+            if deadline is not None:
+                wake = min(wake, deadline)
+            time.sleep(max(0.0, wake - now))
+        if not self._buf and self._eof:
+            raise ReplayFinished(f"end of {self.filename}")
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self._buf.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def open_serial(port, baudrate, timeout, speed=1.0):
+    """serial.Serial for a real port, ReplaySerial for replay:<file>."""
+    if port.startswith(REPLAY_PREFIX):
+        return ReplaySerial(port[len(REPLAY_PREFIX):], speed, timeout=timeout)
+    import serial
+
+    return serial.Serial(port=port, baudrate=baudrate, bytesize=8, parity="N", stopbits=1, timeout=timeout)
+
+
+class _NullWriter:
+    def write(self, samples):
+        pass
+
+    def flush(self):
+        pass
+
+    def update_header(self, **fields):
+        pass
+
+
+class EstimatorTap:
+    """Capture writer wrapper that also feeds every decoded block to a StreamingBreathRate.
+
+    The headless stand-in for SampleTap and LiveMonitor: the estimator runs in
+    the writer thread, so when a lossless replay waits for ring space every
+    stage slows down together and no sample is skipped.
+    """
+
+    def __init__(self, writer, estimator):
+        self.writer = writer
+        self.estimator = estimator
+
+    def write(self, samples):
+        self.writer.write(samples)
+        self.estimator.feed(samples)
+
+    def flush(self):
+        self.writer.flush()
+
+
+def replay_ingest(ser, writer=None, duration=None, window_size=WINDOW_SIZE, live=False, poll=1 / LIVE_FPS):
+    """Run ser through SerialIngest, FrameSink and the streaming estimator; return run statistics.
+
+    Stops at the end of the recording, after duration wall-clock seconds, or
+    on Ctrl-C. Unpaced replays wait for ring space instead of overrunning, so
+    every sample is processed. With live=True the LiveMonitor feeds the
+    estimator and draws the run, like collect_data. The rate, jitter and
+    stalls measured on arrival, in recorded time, go into writer's header.
+    """
+    writer = writer or _NullWriter()
+    if live:
+        history = SampleHistory()
+        sink = FrameSink(SampleTap(writer, history))
+    else:
+        tap = EstimatorTap(writer, StreamingBreathRate(window_size, ser.sample_rate))
+        sink = FrameSink(tap)
+    max_lag = 0.0
+    start = time.monotonic()
+    with SerialIngest(ser, sink, lossless=ser.speed is None) as ingest:
+        if live:
+            monitor = LiveMonitor(history, ser.sample_rate, window_size)
+            monitor.run(ingest)
+        else:
+            try:
+                while ingest.running() and (duration is None or time.monotonic() - start < duration):
+                    time.sleep(poll)
+                    if ser.speed is not None:
+                        behind = ser.frames_released - tap.estimator.samples_seen
+                        max_lag = max(max_lag, behind / (ser.sample_rate * ser.speed))
+            except KeyboardInterrupt:
+                pass
+    elapsed = time.monotonic() - start
+    timing = ingest.clock.header_fields(ser.speed)
+    if timing:
+        writer.update_header(**timing)
+    if live:
+        monitor.feeder.update()
+        estimator, restarts = monitor.feeder.estimator, monitor.feeder.restarts
+    else:
+        estimator, restarts = tap.estimator, 0
+    stats = ingest.stats()
+    framing = sink.parser.stats()
+    current = estimator.current()
+    return {
+        "elapsed": elapsed,
+        "frames": framing["frames"],
+        "signal_seconds": framing["frames"] / ser.sample_rate,
+        "speedup": framing["frames"] / ser.sample_rate / elapsed if elapsed else 0.0,
+        "max_lag": max_lag,
+        "overruns": stats["overruns"],
+        "dropped_bytes": stats["dropped_bytes"],
+        "bad_frames": framing["bad_frames"],
+        "estimator_restarts": restarts,
+        "measured_rate": timing.get("measured_rate", 0.0),
+        "jitter": timing.get("jitter", 0.0),
+        "stalls": timing.get("stalls", 0),
+        "breaths": current["breaths"],
+        "bpm": current["bpm"],
+        "error": None if ingest.error is None else str(ingest.error),
+    }
+
+
+def sustainable(result):
+    return (not result["overruns"] and not result["estimator_restarts"] and result["max_lag"] <= MAX_LAG
+            and result["error"] is None)
+
+
+def max_speedup(filename, window_size=WINDOW_SIZE, trial_seconds=TRIAL_SECONDS, steps=6, report=print):
+    """Highest replay speed the ingest pipeline sustains, found by bisection between 1x and the unpaced rate."""
+    def trial(speed):
+        result = replay_ingest(ReplaySerial(filename, speed, loop=True), duration=trial_seconds,
+                               window_size=window_size)
+        label = f"{speed:8.1f}x" if speed else " unpaced"
+        report(f"  {label}: {result['speedup']:8.0f}x achieved, lag {result['max_lag']:.2f} s, "
+               f"{result['overruns']} overruns")
+        return result
+
+    ceiling = trial(None)["speedup"]
+    if not sustainable(trial(1.0)):
+        return 0.0
+    lo, hi = 1.0, ceiling
+    for _ in range(steps):
+        mid = (lo * hi) ** 0.5
+        if sustainable(trial(mid)):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recording through the live capture pipeline.")
+    parser.add_argument("filename", help="raw Ca=/Cb= capture, cleaned text capture, .adcb or .adcs")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiple of real time, 0 for unpaced")
+    parser.add_argument("--loop", action="store_true", help="start over at the end of the recording")
+    parser.add_argument("--duration", type=float, help="stop after this many wall-clock seconds")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="moving average window in samples")
+    parser.add_argument("--live", action="store_true", help="show the live view while replaying")
+    parser.add_argument("-o", "--output", help="also store the replayed samples as a session store")
+    parser.add_argument("--max-speed", action="store_true", help="find the highest sustainable speed")
+    args = parser.parse_args(argv)
+
+    if args.max_speed:
+        print(f"Searching the highest sustainable speed for {args.filename} ({TRIAL_SECONDS:g} s trials):")
+        best = max_speedup(args.filename, args.window)
+        print(f"Max sustainable speedup: {best:.0f}x real time" if best else "Not sustainable even at 1x")
+        return 0
+
+    writer = None
+    if args.output:
+        from session_store import SessionWriter
+
+        writer = SessionWriter(args.output)
+    ser = ReplaySerial(args.filename, args.speed, loop=args.loop)
+    try:
+        result = replay_ingest(ser, writer, args.duration, args.window, args.live)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"Replayed {result['signal_seconds']:.1f} s of signal ({result['frames']} frames) "
+          f"in {result['elapsed']:.2f} s: {result['speedup']:.1f}x real time")
+    print(f"{result['breaths']} breaths, {result['bpm']:.1f} bpm; max lag {result['max_lag']:.2f} s, "
+          f"overruns {result['overruns']}, bad frames {result['bad_frames']}, "
+          f"estimator restarts {result['estimator_restarts']}")
+    if result["measured_rate"]:
+        print(f"Measured {result['measured_rate']:.3f} Hz (recorded at {ser.sample_rate:g} Hz), "
+              f"jitter {result['jitter'] * 1000:.1f} ms, {result['stalls']} stalls")
+    if result["error"]:
+        print(f"Serial read failed: {result['error']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
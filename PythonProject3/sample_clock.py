@@ -0,0 +1,129 @@
+"""Effective sample rate, arrival jitter and stalls of a live stream, from host receive times.
+
+The board is nominally sampled at 650 Hz, but the rate the host receives
+depends on the board's clock and on the UART keeping up (650 frames of about
+17 bytes fill 96% of 115200 baud). SampleClock is told how many frames each
+received block completed (the ones that parse, see frame_parser.FrameSink)
+and the time.monotonic() it arrived, and fits the frame count against time
+online:
+
+- rate: frames per second, from the slope of the least-squares line
+- jitter: RMS distance of the arrivals from that line, in seconds
+- stalls: receive gaps longer than STALL_SECONDS. Each stall starts a new
+  segment of the fit with its own offset, so a pause of the board or of the
+  host shifts the line instead of bending the rate.
+
+observe() is O(1), so the reader thread calls it after every read.
+"""
+import math
+
+STALL_SECONDS = 0.25  # data normally arrives every few milliseconds
+MIN_SPAN = 1.0  # seconds of arrivals before a rate is reported
+
+
+class SampleClock:
+    """Online fit of received frames against monotonic arrival time."""
+
+    def __init__(self, stall_seconds=STALL_SECONDS):
+        self.stall_seconds = stall_seconds
+        self.frames = 0
+        self.blocks = 0
+        self.stalls = 0
+        self.stalled = 0.0  # seconds without data in all stalls
+        self.longest_stall = 0.0
+        self.first = None
+        self.last = None
+        # Centred sums of squares and products of the closed segments
+        self._sxx = self._sxy = self._syy = 0.0
+        self._points = 0
+        self._segments = 0
+        self._open_segment()
+
+    def _open_segment(self):
+        self._n = 0
+        self._mx = self._my = 0.0
+        self._cxx = self._cxy = self._cyy = 0.0
+
+    def _close_segment(self):
+        if self._n:
+            self._sxx += self._cxx
+            self._sxy += self._cxy
+            self._syy += self._cyy
+            self._points += self._n
+            self._segments += 1
+        self._open_segment()
+
+    def observe(self, frames, timestamp):
+        """Record a received block that completed frames frames and arrived at timestamp."""
+        if self.first is None:
+            self.first = timestamp
+        elif timestamp - self.last > self.stall_seconds:
+            gap = timestamp - self.last
+            self.stalls += 1
+            self.stalled += gap
+            self.longest_stall = max(self.longest_stall, gap)
+            self._close_segment()
+        self.last = timestamp
+        self.blocks += 1
+        if not frames:
+            return  # a partial frame says nothing about when frames end
+        self.frames += frames
+        # Welford update of the segment's means and co-moments, time relative to the first block
+        x, y = float(self.frames), timestamp - self.first
+        self._n += 1
+        dx, dy = x - self._mx, y - self._my
+        self._mx += dx / self._n
+        self._my += dy / self._n
+        self._cxx += dx * (x - self._mx)
+        self._cxy += dx * (y - self._my)
+        self._cyy += dy * (y - self._my)
+
+    def _sums(self):
+        segments = self._segments + (1 if self._n else 0)
+        return (self._sxx + self._cxx, self._sxy + self._cxy, self._syy + self._cyy,
+                self._points + self._n, segments)
+
+    @property
+    def span(self):
+        """Seconds from the first to the last received block."""
+        return 0.0 if self.first is None else self.last - self.first
+
+    @property
+    def rate(self):
+        """Measured frames per second, 0.0 until MIN_SPAN seconds have been fitted."""
+        sxx, sxy, _, _, _ = self._sums()
+        if self.span < MIN_SPAN or sxx <= 0 or sxy <= 0:
+            return 0.0
+        return sxx / sxy
+
+    @property
+    def jitter(self):
+        """RMS deviation in seconds of the arrival times from the fitted line."""
+        sxx, sxy, syy, points, segments = self._sums()
+        dof = points - segments - 1
+        if dof <= 0 or sxx <= 0:
+            return 0.0
+        return math.sqrt(max(syy - sxy * sxy / sxx, 0.0) / dof)
+
+    def summary(self):
+        return {
+            "rate": self.rate,
+            "jitter": self.jitter,
+            "stalls": self.stalls,
+            "stalled": self.stalled,
+            "longest_stall": self.longest_stall,
+            "span": self.span,
+            "frames": self.frames,
+        }
+
+    def header_fields(self, speed=1.0):
+        """measured_rate, jitter and stalls for a capture header, {} if no rate was measured.
+
+        speed is the pace of a replay.ReplaySerial, whose frames arrive speed
+        times faster than they were recorded; an unpaced replay (None)
+        measures nothing.
+        """
+        rate = self.rate
+        if not rate or not speed:
+            return {}
+        return {"measured_rate": rate / speed, "jitter": self.jitter * speed, "stalls": self.stalls}
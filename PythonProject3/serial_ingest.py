@@ -0,0 +1,255 @@
+"""Threaded UART ingestion: a reader thread drains the port into a ring buffer
+and a writer thread flushes it to disk in large blocks.
+
+Anything with pyserial's read()/in_waiting interface works as the port, so
+the pipeline can be exercised without the STM32 attached, e.g. with
+serial.serial_for_url("loop://") or a pseudo-terminal from os.openpty().
+
+Every read is timestamped with time.monotonic() as it returns and fed to a
+SampleClock, which measures the sample rate, jitter and stalls the host
+actually sees; store them with writer.update_header(**ingest.clock.header_fields()).
+With a frame_parser.FrameSink as the output the clock is the sink's: the
+writer hands it the arrival time of every read with each block, and it counts
+only the frames that parse. Otherwise the reader counts newlines.
+"""
+import threading
+import time
+from collections import deque
+
+from metrics import gauge, stage
+from sample_clock import SampleClock
+
+RING_CAPACITY = 1 << 20  # 1 MiB, about 70 s of UART data at 115200 baud
+WRITE_BLOCK = 64 * 1024
+FLUSH_INTERVAL = 0.5  # seconds, flush a partial block at least this often
+STATS_INTERVAL = 1.0  # seconds between progress lines
+
+
+class ByteRingBuffer:
+    """Preallocated single-producer/single-consumer byte ring buffer.
+
+    When the buffer is full, write() keeps what fits and drops the rest,
+    counting the overrun instead of blocking the producer. Producers that can
+    afford to wait (a replay, not a UART) call wait_space() first.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY, notify_at=1):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0  # next write position
+        self._size = 0
+        self._cond = threading.Condition()
+        self.overruns = 0
+        self.dropped_bytes = 0
+        self.high_water = 0
+        self._notify_at = notify_at  # wake the consumer only once this much is buffered
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data):
+        """Copy data into the buffer, return the number of bytes accepted."""
+        n = len(data)
+        with self._cond:
+            free = self.capacity - self._size
+            if n > free:
+                self.overruns += 1
+                self.dropped_bytes += n - free
+                n = free
+            first = min(n, self.capacity - self._head)
+            self._view[self._head:self._head + first] = data[:first]
+            self._view[:n - first] = data[first:n]
+            self._head = (self._head + n) % self.capacity
+            self._size += n
+            self.high_water = max(self.high_water, self._size)
+            if self._size >= self._notify_at:
+                self._cond.notify()
+        return n
+
+    def read(self, max_bytes):
+        """Remove and return up to max_bytes of the oldest data."""
+        with self._cond:
+            n = min(max_bytes, self._size)
+            tail = (self._head - self._size) % self.capacity
+            first = min(n, self.capacity - tail)
+            out = bytes(self._view[tail:tail + first]) + bytes(self._view[:n - first])
+            self._size -= n
+            self._cond.notify_all()
+        return out
+
+    def wait(self, min_bytes, timeout):
+        """Block until at least min_bytes are buffered, wake() is called or timeout expires."""
+        with self._cond:
+            if self._size < min_bytes:
+                self._cond.wait(timeout)
+            return self._size
+
+    def wait_space(self, n_bytes, timeout):
+        """Block until n_bytes fit, wake() is called or timeout expires; return the free space."""
+        with self._cond:
+            if self.capacity - self._size < n_bytes:
+                self._cond.wait(timeout)
+            return self.capacity - self._size
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class SerialIngest:
+    """Reader and writer threads between a serial port and a capture file.
+
+    The reader drains everything in in_waiting per call so a burst costs one
+    read, and never touches the disk or the console. The writer sleeps until
+    a full block is buffered (or FLUSH_INTERVAL passes) and writes it in one go.
+    Progress is printed from the caller's thread via report().
+    """
+
+    def __init__(self, ser, out_file, capacity=RING_CAPACITY, block_size=WRITE_BLOCK, lossless=False):
+        self.ser = ser
+        self.lossless = lossless  # wait for ring space instead of dropping, for sources that can pause
+        self.out_file = out_file
+        self.ring = ByteRingBuffer(capacity, notify_at=block_size)
+        self.block_size = block_size
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.reads = 0
+        self.max_in_waiting = 0
+        self.clock = getattr(out_file, "clock", None)
+        # (ring bytes accepted so far, arrival time) of every read the writer has not handed over yet
+        self._arrivals = deque() if self.clock is not None else None
+        if self.clock is None:
+            self.clock = SampleClock()
+        self._accepted = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._drain = threading.Event()  # set once the reader has exited
+        self._reader = threading.Thread(target=self._read_loop, name="serial-reader", daemon=True)
+        self._writer = threading.Thread(target=self._write_loop, name="capture-writer", daemon=True)
+        self.start_time = None
+        self._last_report = (0.0, 0)
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self._last_report = (self.start_time, 0)
+        self._reader.start()
+        self._writer.start()
+        return self
+
+    def stop(self):
+        """Stop the reader, flush everything still buffered and join both threads."""
+        self._stop.set()
+        self._reader.join()
+        self._drain.set()
+        self.ring.wake()
+        self._writer.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _read_loop(self):
+        ser = self.ser
+        try:
+            while not self._stop.is_set():
+                waiting = ser.in_waiting
+                if waiting > self.max_in_waiting:
+                    self.max_in_waiting = waiting
+                gauge("serial_in_waiting", waiting)
+                size = waiting or 1
+                if self.lossless:
+                    # A read larger than the ring could never find space for all of it
+                    size = min(size, self.ring.capacity)
+                # Blocks for at most the port timeout when nothing is waiting
+                data = ser.read(size)
+                if data:
+                    received = time.monotonic()
+                    self.reads += 1
+                    self.bytes_read += len(data)
+                    if self._arrivals is None:
+                        # Every frame ends in a newline, so this counts the frames the block completes without parsing
+                        self.clock.observe(data.count(b"\n"), received)
+                    while (self.lossless and not self._stop.is_set()
+                           and self.ring.wait_space(len(data), FLUSH_INTERVAL) < len(data)):
+                        pass
+                    self._accepted += self.ring.write(data)
+                    if self._arrivals is not None:
+                        self._arrivals.append((self._accepted, received))
+        except EOFError:  # a replay.ReplaySerial reached the end of its recording
+            self._stop.set()
+        except Exception as e:  # port unplugged etc., keep what we have
+            self.error = e
+            self._stop.set()
+
+    def _write_loop(self):
+        while True:
+            draining = self._drain.is_set()
+            if not draining:
+                self.ring.wait(self.block_size, FLUSH_INTERVAL)
+            # Whole blocks while running, a partial one after FLUSH_INTERVAL, everything when draining
+            while len(self.ring):
+                gauge("ring_buffered", len(self.ring))
+                block = self.ring.read(self.block_size)
+                with stage("write_block"):
+                    if self._arrivals is None:
+                        self.out_file.write(block)
+                    else:
+                        self.out_file.write(block, self._block_arrivals(len(block)))
+                self.bytes_written += len(block)
+                if len(self.ring) < self.block_size and not draining:
+                    break
+            if draining:
+                self.out_file.flush()
+                return
+
+    def _block_arrivals(self, size):
+        """(offset in the block, time) of the reads ending in the next size bytes, for FrameSink.write."""
+        start, arrivals = self.bytes_written, []
+        while self._arrivals and self._arrivals[0][0] <= start + size:
+            end, received = self._arrivals.popleft()
+            arrivals.append((end - start, received))
+        return arrivals
+
+    def running(self):
+        return not self._stop.is_set()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.start_time if self.start_time else 0.0
+        return {
+            "elapsed": elapsed,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "reads": self.reads,
+            "buffered": len(self.ring),
+            "ring_high_water": self.ring.high_water,
+            "max_in_waiting": self.max_in_waiting,
+            "overruns": self.ring.overruns,
+            "dropped_bytes": self.ring.dropped_bytes,
+            "rate": self.clock.rate,
+            "jitter": self.clock.jitter,
+            "stalls": self.clock.stalls,
+        }
+
+    def report(self):
+        """One progress line with the byte rate since the previous report."""
+        now = time.monotonic()
+        last_time, last_bytes = self._last_report
+        rate = (self.bytes_read - last_bytes) / (now - last_time) if now > last_time else 0.0
+        self._last_report = (now, self.bytes_read)
+        s = self.stats()
+        return (f"{s['elapsed']:7.1f}s  {s['bytes_read']} bytes ({rate:.0f} B/s)  "
+                f"buffered {s['buffered']}  backlog max {s['max_in_waiting']}  "
+                f"overruns {s['overruns']} ({s['dropped_bytes']} bytes dropped)  "
+                f"{s['rate']:.2f} Hz, jitter {s['jitter'] * 1000:.1f} ms, {s['stalls']} stalls")
+
+    def run_until_interrupt(self, interval=STATS_INTERVAL):
+        """Print progress every interval seconds until Ctrl-C or a port error."""
+        try:
+            while self.running():
+                time.sleep(interval)
+                print(self.report())
+        except KeyboardInterrupt:
+            pass
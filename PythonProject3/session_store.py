@@ -0,0 +1,377 @@
+"""Append-only session store: a capture kept as checksummed, fsync'd chunks with a time index.
+
+Layout of a .adcs file:
+    the 64-byte capture header, with magic ADCS instead of ADCB
+    chunks, each a _CHUNK record, the min and max of every channel, then
+    n_rows interleaved uint16 rows
+
+Each chunk is fsync'd before its entry is appended to the sidecar index
+(<file>.idx): offset, first sample, row count, wall-clock timestamp of the
+first row and the per-channel min/max. The index is only a cache. Entries
+past the end of the data are dropped, chunks after the last entry (a crash
+between the two writes) are found by scanning, and the scan stops at the
+first torn or corrupt chunk. Readers ignore such a tail, recover_session()
+cuts it off. Indexed chunks are checked against their CRC when first read,
+a corrupt one raises ValueError, and recover_session() verifies every chunk
+and keeps only those before the first bad one. A crash therefore loses at most the rows not yet in a chunk,
+CHUNK_SECONDS of signal.
+
+Sample and time range reads only touch the chunks that overlap the range.
+
+    python session_store.py info capture.adcs
+    python session_store.py recover capture.adcs
+    python session_store.py export capture.adcs --start 600 --stop 660 -o slice.adcb
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from capture_format import (HEADER_SIZE, SAMPLE_DTYPE, effective_sample_rate, make_header, pack_header, unpack_header,
+                            write_capture)
+
+SESSION_MAGIC = b"ADCS"
+SESSION_EXT = ".adcs"
+INDEX_SUFFIX = ".idx"
+CHUNK_MAGIC = b"CHNK"
+CHUNK_SECONDS = 10.0  # signal per chunk, and the most a crash can lose
+
+_CHUNK = struct.Struct("<4sIQdI")  # magic, n_rows, first_sample, timestamp, crc32 of min/max and rows
+
+
+def index_dtype(n_channels):
+    """Record layout of the .idx file, one per chunk."""
+    return np.dtype([("offset", "<u8"), ("first_sample", "<u8"), ("n_rows", "<u4"), ("timestamp", "<f8"),
+                     ("min", SAMPLE_DTYPE, (n_channels,)), ("max", SAMPLE_DTYPE, (n_channels,))])
+
+
+def _chunk_head_size(n_channels):
+    return _CHUNK.size + 2 * n_channels * SAMPLE_DTYPE.itemsize
+
+
+def is_session_file(filename):
+    """Return True if filename starts with the session store magic."""
+    with open(filename, 'rb') as f:
+        return f.read(len(SESSION_MAGIC)) == SESSION_MAGIC
+
+
+def read_session_header(filename):
+    with open(filename, 'rb') as f:
+        return unpack_header(f.read(HEADER_SIZE), SESSION_MAGIC)
+
+
+def _intact(head, payload):
+    """True if a chunk's CRC matches its extremes and rows."""
+    return zlib.crc32(payload, zlib.crc32(head[_CHUNK.size:])) == _CHUNK.unpack_from(head)[4]
+
+
+def _scan_chunks(f, offset, end, first_sample, n_channels):
+    """Index entries of the intact chunks from offset on, and the offset after the last one."""
+    head_size = _chunk_head_size(n_channels)
+    row_bytes = n_channels * SAMPLE_DTYPE.itemsize
+    entries = []
+    while offset + head_size <= end:
+        f.seek(offset)
+        head = f.read(head_size)
+        magic, n_rows, first, timestamp, _ = _CHUNK.unpack_from(head)
+        size = n_rows * row_bytes
+        if magic != CHUNK_MAGIC or first != first_sample or offset + head_size + size > end:
+            break
+        if not _intact(head, f.read(size)):
+            break
+        extremes = np.frombuffer(head, SAMPLE_DTYPE, offset=_CHUNK.size)
+        entries.append((offset, first, n_rows, timestamp, extremes[:n_channels], extremes[n_channels:]))
+        offset += head_size + size
+        first_sample += n_rows
+    return entries, offset
+
+
+def load_index(filename, n_channels, verify=False):
+    """Return (index, data_end) for a session, repairing a stale index in memory.
+
+    data_end is the file offset after the last intact chunk; anything beyond
+    it is a torn write. With verify the indexed chunks are CRC-checked too and
+    the index ends before the first corrupt one, otherwise they are trusted
+    and SessionReader checks each on first read.
+    """
+    dtype = index_dtype(n_channels)
+    try:
+        with open(filename + INDEX_SUFFIX, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        raw = b""
+    index = np.frombuffer(raw, dtype, count=len(raw) // dtype.itemsize)
+    size = os.path.getsize(filename)
+    ends = index["offset"] + _chunk_head_size(n_channels) + index["n_rows"].astype(np.uint64) * (2 * n_channels)
+    starts = np.concatenate(([0], np.cumsum(index["n_rows"], dtype=np.uint64)[:-1]))
+    bad = (ends > size) | (index["first_sample"] != starts) | (index["offset"] < HEADER_SIZE)
+    if bad.any():
+        index = index[:np.argmax(bad)]
+    head_size = _chunk_head_size(n_channels)
+    if verify:
+        with open(filename, 'rb') as f:
+            for k in range(len(index)):
+                f.seek(int(index["offset"][k]))
+                head = f.read(head_size)
+                if not _intact(head, f.read(int(ends[k]) - int(index["offset"][k]) - head_size)):
+                    index = index[:k]
+                    break
+    offset = int(ends[len(index) - 1]) if len(index) else HEADER_SIZE
+    first_sample = int(index["first_sample"][-1] + index["n_rows"][-1]) if len(index) else 0
+    with open(filename, 'rb') as f:
+        entries, data_end = _scan_chunks(f, offset, size, first_sample, n_channels)
+    if entries:
+        index = np.concatenate((index, np.array(entries, dtype=dtype)))
+    return index.copy(), data_end
+
+
+class SessionWriter:
+    """Append samples to a session store, a drop-in for capture_format.CaptureWriter.
+
+    Rows are buffered until a chunk of chunk_rows (CHUNK_SECONDS by default)
+    is full, or the oldest buffered row is CHUNK_SECONDS old, then written,
+    fsync'd and indexed. flush() and close() write the partial chunk.
+    """
+
+    def __init__(self, filename, chunk_rows=None, **header_fields):
+        self.filename = filename
+        self.header = make_header(**header_fields)
+        self.n_channels = len(self.header["channel_map"])
+        self.sample_rate = self.header["sample_rate"]
+        self.chunk_rows = chunk_rows or int(CHUNK_SECONDS * self.sample_rate)
+        self.rows_written = 0
+        self.chunks_written = 0
+        self._pending = []  # (rows, arrival time of the last row) per write
+        self._pending_rows = 0
+        self._consumed = 0  # rows of _pending[0] already written
+        self._file = open(filename, 'wb')
+        self._file.write(pack_header(self.header, SESSION_MAGIC))
+        self._sync()
+        self._index = open(filename + INDEX_SUFFIX, 'wb')
+        self._index_dtype = index_dtype(self.n_channels)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def write(self, samples, timestamp=None):
+        """Buffer rows; timestamp is when the last of them arrived (default now)."""
+        samples = np.asarray(samples).reshape(-1, self.n_channels)
+        if not len(samples):
+            return
+        now = time.time() if timestamp is None else timestamp
+        self._pending.append((samples.astype(SAMPLE_DTYPE), now))
+        self._pending_rows += len(samples)
+        while self._pending_rows >= self.chunk_rows:
+            self._write_chunk(self.chunk_rows)
+        if self._pending_rows and now - self._first_pending_time() >= CHUNK_SECONDS:
+            self._write_chunk(self._pending_rows)
+
+    def update_header(self, **fields):
+        """Rewrite and fsync the header with fields changed, e.g. the measured rate once capture ends."""
+        self.header.update(fields)
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(pack_header(self.header, SESSION_MAGIC))
+        self._file.seek(position)
+        self._sync()
+
+    def _first_pending_time(self):
+        rows, arrived = self._pending[0]
+        return arrived - (len(rows) - 1 - self._consumed) / self.sample_rate
+
+    def _write_chunk(self, n_rows):
+        timestamp = self._first_pending_time()
+        parts = []
+        needed = n_rows
+        while needed:
+            rows, _ = self._pending[0]
+            take = min(needed, len(rows) - self._consumed)
+            parts.append(rows[self._consumed:self._consumed + take])
+            self._consumed += take
+            needed -= take
+            if self._consumed == len(rows):
+                self._pending.pop(0)
+                self._consumed = 0
+        chunk = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self._pending_rows -= n_rows
+        extremes = np.concatenate((chunk.min(axis=0), chunk.max(axis=0))).astype(SAMPLE_DTYPE)
+        payload = np.ascontiguousarray(chunk).tobytes()
+        crc = zlib.crc32(payload, zlib.crc32(extremes.tobytes()))
+        offset = self._file.tell()
+        self._file.write(_CHUNK.pack(CHUNK_MAGIC, n_rows, self.rows_written, timestamp, crc))
+        self._file.write(extremes.tobytes())
+        self._file.write(payload)
+        self._sync()
+        entry = np.array([(offset, self.rows_written, n_rows, timestamp, extremes[:self.n_channels],
+                           extremes[self.n_channels:])], dtype=self._index_dtype)
+        self._index.write(entry.tobytes())
+        self._index.flush()
+        self.rows_written += n_rows
+        self.chunks_written += 1
+
+    def flush(self):
+        """Write and fsync everything buffered, even if the chunk is not full."""
+        if self._pending_rows:
+            self._write_chunk(self._pending_rows)
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionReader:
+    """Random access to a session store by sample or time range.
+
+    The file is memory-mapped as it is when opened, so reading while a
+    SessionWriter is still appending sees a consistent prefix.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.header = read_session_header(filename)
+        self.n_channels = len(self.header["channel_map"])
+        self.sample_rate = effective_sample_rate(self.header)
+        self.index, self.data_end = load_index(filename, self.n_channels)
+        self.n_rows = int(self.index["first_sample"][-1] + self.index["n_rows"][-1]) if len(self.index) else 0
+        self._raw = np.memmap(filename, dtype=np.uint8, mode='r', shape=(self.data_end,))
+        self._head_size = _chunk_head_size(self.n_channels)
+        self._verified = set()
+
+    def __len__(self):
+        return self.n_rows
+
+    def chunk(self, k):
+        """Rows of chunk k as an (n, channels) view of the mapped file, CRC-checked on first read."""
+        start = int(self.index["offset"][k]) + self._head_size
+        size = int(self.index["n_rows"][k]) * self.n_channels * SAMPLE_DTYPE.itemsize
+        rows = self._raw[start:start + size]
+        if k not in self._verified:
+            if not _intact(self._raw[start - self._head_size:start], rows):
+                first = int(self.index["first_sample"][k])
+                raise ValueError(f"{self.filename}: chunk {k} (rows {first}-{first + int(self.index['n_rows'][k])}) "
+                                 "is corrupt, 'session_store.py recover' keeps the chunks before it")
+            self._verified.add(k)
+        return rows.view(SAMPLE_DTYPE).reshape(-1, self.n_channels)
+
+    def read(self, start=0, stop=None):
+        """Rows start:stop as an (n, channels) uint16 array, reading only the chunks involved."""
+        start, stop, _ = slice(start, stop).indices(self.n_rows)
+        out = np.empty((max(0, stop - start), self.n_channels), dtype=SAMPLE_DTYPE)
+        if stop <= start:
+            return out
+        firsts = self.index["first_sample"]
+        for k in range(np.searchsorted(firsts, start, 'right') - 1, np.searchsorted(firsts, stop)):
+            first = int(firsts[k])
+            rows = self.chunk(k)
+            lo, hi = max(start, first), min(stop, first + len(rows))
+            out[lo - start:hi - start] = rows[lo - first:hi - first]
+        return out
+
+    def time_to_sample(self, t):
+        """Sample index at t seconds after the session start, going by the chunk timestamps."""
+        if not len(self.index):
+            return 0
+        when = self.header["start_time"] + t
+        k = max(0, np.searchsorted(self.index["timestamp"], when, 'right') - 1)
+        offset = round((when - self.index["timestamp"][k]) * self.sample_rate)
+        return int(self.index["first_sample"][k]) + int(np.clip(offset, 0, self.index["n_rows"][k]))
+
+    def read_time(self, t0, t1):
+        """Rows recorded between t0 and t1 seconds after the session start."""
+        return self.read(self.time_to_sample(t0), self.time_to_sample(t1))
+
+    def iter_chunks(self, chunk_samples):
+        for start in range(0, self.n_rows, chunk_samples):
+            yield self.read(start, start + chunk_samples)
+
+    def close(self):
+        self._raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def recover_session(filename):
+    """Cut a torn or corrupt tail off a session and rewrite its index; return what was kept and dropped."""
+    header = read_session_header(filename)
+    n_channels = len(header["channel_map"])
+    index, data_end = load_index(filename, n_channels, verify=True)
+    size = os.path.getsize(filename)
+    if data_end < size:
+        with open(filename, 'r+b') as f:
+            f.truncate(data_end)
+            f.flush()
+            os.fsync(f.fileno())
+    tmp = filename + INDEX_SUFFIX + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(index.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename + INDEX_SUFFIX)
+    return {"chunks": len(index), "rows": int(index["n_rows"].sum()), "dropped_bytes": size - data_end}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, repair or slice a session store.")
+    parser.add_argument("command", choices=["info", "recover", "export"])
+    parser.add_argument("filename")
+    parser.add_argument("--start", type=float, default=0.0, help="export from this many seconds in")
+    parser.add_argument("--stop", type=float, help="export up to this many seconds in (default: the end)")
+    parser.add_argument("-o", "--output", help="export destination (default: <name>_<start>-<stop>.adcb)")
+    args = parser.parse_args(argv)
+
+    if args.command == "recover":
+        result = recover_session(args.filename)
+        print(f"{args.filename}: kept {result['chunks']} chunks ({result['rows']} rows), "
+              f"dropped {result['dropped_bytes']} bytes")
+        return 0
+    with SessionReader(args.filename) as reader:
+        header = reader.header
+        if args.command == "info":
+            index = reader.index
+            print(f"{args.filename}: {reader.n_rows} rows in {len(index)} chunks, "
+                  f"{reader.n_rows / reader.sample_rate:.1f} s at {reader.sample_rate:g} Hz")
+            print(f"type {header['breath_type'] or '-'}, cycle {header['breath_cycle']}, "
+                  f"channels {header['channel_map']}")
+            if header["measured_rate"]:
+                print(f"measured {header['measured_rate']:.3f} Hz (nominal {header['sample_rate']:g}), "
+                      f"jitter {header['jitter'] * 1000:.1f} ms, {header['stalls']} stalls")
+            if len(index):
+                for c in range(reader.n_channels):
+                    print(f"ADC{c + 1} range {index['min'][:, c].min()}-{index['max'][:, c].max()}")
+                wall = index["timestamp"][-1] - index["timestamp"][0]
+                print(f"chunk timestamps span {wall:.1f} s")
+            torn = os.path.getsize(args.filename) - reader.data_end
+            if torn:
+                print(f"{torn} bytes of torn tail, run 'recover' to remove them")
+            return 0
+        stop = reader.n_rows / reader.sample_rate if args.stop is None else args.stop
+        samples = reader.read_time(args.start, stop)
+        output = args.output or f"{os.path.splitext(args.filename)[0]}_{args.start:g}-{stop:g}.adcb"
+        # Stalls are counted over the whole session, so only the rate and jitter carry over to a slice
+        write_capture(output, samples, sample_rate=header["sample_rate"], channel_map=header["channel_map"],
+                      breath_type=header["breath_type"], breath_cycle=header["breath_cycle"],
+                      start_time=header["start_time"] + args.start, measured_rate=header["measured_rate"],
+                      jitter=header["jitter"])
+        print(f"Wrote {len(samples)} rows to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
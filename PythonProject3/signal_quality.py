@@ -0,0 +1,291 @@
+"""Cheap per-window quality of the raw ADC channels, and the pipeline mode it implies.
+
+Each QUALITY_WINDOW_S window of each channel gets three numbers, all from a
+single pass over the raw samples:
+
+- range: max - min in ADC counts; below FLAT_RANGE the channel is flat (a
+  disconnected sensor reads a constant, often 0)
+- saturation: the share of samples on an ADC rail; the rubber channel clips
+  at 0 through most exhalations, so this is reported but does not disqualify
+- snr_db: variance of SNR_BLOCK_S block means (the breathing band) over the
+  mean variance inside the blocks (sensor and ADC noise, floored at the
+  1/12 count^2 of quantisation)
+
+A window is good when it is neither flat nor below MIN_SNR_DB, and a channel
+is usable when at least MIN_GOOD_SHARE of its windows are. Once a channel's
+peaks are known, with_regularity adds a fourth number per window:
+
+- regularity: RMS deviation of the peak gaps ending in the window from the
+  channel's median gap, relative to it. Gaps of more than abnormal_gap
+  medians are missed breaths, which fusion fills, and are left out. Above
+  MAX_IRREGULARITY the channel is finding extra peaks there.
+
+choose_mode() turns the flags into fused, single-channel or reject, for
+every window (window_modes), for a stretch of windows (span_modes) or for a
+recording. In a window where one usable channel is irregular and the other
+is not, only the regular one is used.
+"""
+import numpy as np
+
+from fusion import ABNORMAL_GAP
+
+SAMPLE_RATE = 650  # Hz, as breath_pipeline
+QUALITY_WINDOW_S = 10.0
+SNR_BLOCK_S = 0.1
+ADC_RAILS = (0, 4095)  # 12-bit ADC
+FLAT_RANGE = 20  # ADC counts; breathing moves either channel by a thousand or more
+MIN_SNR_DB = 3.0  # a noise-only channel measures about -18 dB, real recordings 15-30 dB
+SATURATION_SHARE = 0.5  # flagged above this, still used
+MIN_GOOD_SHARE = 0.5
+MAX_IRREGULARITY = 0.4  # clean windows measure 0.0-0.2, a channel finding extra peaks 0.35-0.55
+
+# Pipeline modes
+MODE_FUSED = "fused"  # both channels, ADC2 peaks with gaps filled from ADC1
+MODE_ADC1 = "adc1"  # ADC1 (pressure) only, ADC2 is unusable
+MODE_ADC2 = "adc2"  # ADC2 (rubber) only, ADC1 is unusable or fusion would not use it
+MODE_REJECT = "reject"  # neither channel is usable
+CHANNELS = ("adc1", "adc2")
+
+
+def _assess(windows, block):
+    """Quality arrays for a (K, L, channels) stack of raw windows."""
+    # Reductions along the interleaved sample axis are several times slower than over contiguous channels
+    windows = np.ascontiguousarray(np.moveaxis(np.asarray(windows), 2, 0))
+    channels, k, length = windows.shape
+    lo = windows.min(axis=2)
+    hi = windows.max(axis=2)
+    rails = np.count_nonzero((windows <= ADC_RAILS[0]) | (windows >= ADC_RAILS[1]), axis=2) / max(length, 1)
+    n_blocks = length // block
+    if n_blocks >= 2:
+        # Block sums and sums of squares in exact integers, then per-block mean and variance
+        blocks = windows[:, :, :n_blocks * block].reshape(channels, k, n_blocks, block).astype(np.int64)
+        sums = blocks.sum(axis=3)
+        means = sums / block
+        within = (np.einsum('ckbi,ckbi->ckb', blocks, blocks) - sums * means) / block
+        signal = means.var(axis=2)
+        noise = np.maximum(within.mean(axis=2), 1 / 12)
+        with np.errstate(divide='ignore'):
+            snr_db = 10 * np.log10(signal / noise)
+    else:
+        snr_db = np.full((channels, k), np.nan)
+    flat = (hi - lo) < FLAT_RANGE
+    return {
+        "range": (hi - lo).T.astype(np.int64),
+        "saturation": rails.T,
+        "snr_db": snr_db.T,
+        "flat": flat.T,
+        # A window too short for an SNR estimate is judged on its range alone
+        "good": (~flat & ~(snr_db < MIN_SNR_DB)).T,
+    }
+
+
+def _empty(channels):
+    return {key: np.zeros((0, channels), dtype=dtype) for key, dtype in
+            (("range", np.int64), ("saturation", float), ("snr_db", float), ("flat", bool), ("good", bool))}
+
+
+def _concat(parts, channels):
+    if not parts:
+        return _empty(channels)
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def _window_sizes(sample_rate, window_s):
+    return max(1, int(round(window_s * sample_rate))), max(1, int(round(SNR_BLOCK_S * sample_rate)))
+
+
+def window_quality(samples, sample_rate=SAMPLE_RATE, window_s=QUALITY_WINDOW_S):
+    """Per-window quality of an (N, channels) array of raw samples.
+
+    Returns a dict of (K, channels) arrays (range, saturation, snr_db, flat,
+    good) plus "start", the first sample of each window. A shorter last
+    window holds whatever is left over, so every sample is covered once.
+    """
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    n, channels = samples.shape
+    window, block = _window_sizes(sample_rate, window_s)
+    full = n // window
+    parts = []
+    if full:
+        parts.append(_assess(samples[:full * window].reshape(full, window, channels), block))
+    if n > full * window:
+        parts.append(_assess(samples[full * window:][None], block))
+    quality = _concat(parts, channels)
+    quality["start"] = np.arange(len(quality["good"]), dtype=np.int64) * window
+    return quality
+
+
+class QualityTracker:
+    """window_quality for a recording fed in chunks of any size, e.g. from iter_adc_chunks.
+
+    Only the current partial window is buffered, as the chunks that make it
+    up, so feeding a few samples at a time costs no more than one big chunk.
+    result() gives exactly what window_quality returns for the whole recording.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, window_s=QUALITY_WINDOW_S, channels=2):
+        self.window, self.block = _window_sizes(sample_rate, window_s)
+        self.channels = channels
+        self._parts = []
+        self._pending = []
+        self._pending_rows = 0
+
+    def feed(self, samples):
+        samples = np.asarray(samples).reshape(-1, self.channels)
+        self._pending.append(samples)
+        self._pending_rows += len(samples)
+        if self._pending_rows < self.window:
+            return
+        pending = np.concatenate(self._pending)
+        full = len(pending) // self.window
+        self._parts.append(_assess(pending[:full * self.window].reshape(full, self.window, self.channels),
+                                   self.block))
+        self._pending = [pending[full * self.window:]]
+        self._pending_rows = len(self._pending[0])
+
+    def result(self):
+        parts = list(self._parts)
+        if self._pending_rows:
+            parts.append(_assess(np.concatenate(self._pending)[None], self.block))
+        quality = _concat(parts, self.channels)
+        quality["start"] = np.arange(len(quality["good"]), dtype=np.int64) * self.window
+        return quality
+
+
+def channel_usable(quality):
+    """Per-channel bool array: at least MIN_GOOD_SHARE of the windows are good."""
+    good = quality["good"]
+    if len(good) == 0:
+        return np.zeros(good.shape[1], dtype=bool)
+    return good.mean(axis=0) >= MIN_GOOD_SHARE
+
+
+def peak_regularity(peaks, starts, offset=0.0, abnormal_gap=ABNORMAL_GAP):
+    """Regularity (see the module docstring) of sorted peaks in the windows beginning at starts.
+
+    offset is added to the peaks to place them in raw samples, (window_size
+    - 1) / 2 for indices into the 'valid' filtered signal. NaN where no gap
+    ends in a window.
+    """
+    regularity = np.full(len(starts), np.nan)
+    positions = np.asarray(peaks, dtype=np.float64) + offset
+    gaps = np.diff(positions)
+    if gaps.size == 0 or len(starts) == 0:
+        return regularity
+    deviation = gaps / np.median(gaps) - 1
+    normal = deviation <= abnormal_gap - 1
+    window = np.maximum(np.searchsorted(starts, positions[1:][normal], side='right') - 1, 0)
+    count = np.bincount(window, minlength=len(starts))
+    square_total = np.bincount(window, deviation[normal] ** 2, minlength=len(starts))
+    seen = count > 0
+    regularity[seen] = np.sqrt(square_total[seen] / count[seen])
+    return regularity
+
+
+def with_regularity(quality, peaks, offset=0.0, abnormal_gap=ABNORMAL_GAP):
+    """quality with a "regularity" column per channel from peaks, one sorted list per channel or None."""
+    columns = [peak_regularity(p if p is not None else [], quality["start"], offset, abnormal_gap) for p in peaks]
+    return dict(quality, regularity=np.stack(columns, axis=1).reshape(len(quality["start"]), len(peaks)))
+
+
+def window_usable(quality, usable=None):
+    """Per-window, per-channel flags: good in the window and, where a regular channel is left, regular too.
+
+    usable, a per-channel flag such as channel_usable gives, masks out whole
+    channels. A window whose regularity is unknown (NaN or no regularity
+    column) counts as regular.
+    """
+    good = quality["good"]
+    if usable is not None:
+        good = good & np.asarray(usable, dtype=bool)
+    if "regularity" not in quality:
+        return good
+    preferred = good & ~(quality["regularity"] > MAX_IRREGULARITY)
+    return np.where(preferred.any(axis=1, keepdims=True), preferred, good)
+
+
+def choose_mode(usable):
+    """Pipeline mode for the (adc1, adc2) usable flags: fused, single-channel or reject.
+
+    Works elementwise on (M, 2) arrays of flags too, returning an array of modes.
+    """
+    usable = np.asarray(usable, dtype=bool)
+    adc1, adc2 = usable[..., 0], usable[..., 1]
+    modes = np.where(adc1 & adc2, MODE_FUSED, np.where(adc2, MODE_ADC2, np.where(adc1, MODE_ADC1, MODE_REJECT)))
+    return modes.item() if modes.ndim == 0 else modes
+
+
+def window_modes(quality, usable=None):
+    """choose_mode for every window of quality, from window_usable."""
+    return choose_mode(window_usable(quality, usable)).reshape(len(quality["start"]))
+
+
+def overall_mode(modes):
+    """The mode of a recording whose windows took modes: fused when both channels are used somewhere."""
+    modes = np.asarray(modes)
+    return choose_mode([bool(np.isin(modes, (MODE_FUSED, MODE_ADC1)).any()),
+                        bool(np.isin(modes, (MODE_FUSED, MODE_ADC2)).any())])
+
+
+def span_modes(quality, starts, stops):
+    """choose_mode for each sample range [start, stop), from the windows starting inside it.
+
+    A channel is used for a range when it is usable (see window_usable) in at
+    least MIN_GOOD_SHARE of those windows. A range that holds no window start
+    takes the window it falls in.
+    """
+    window_starts = quality["start"]
+    usable = window_usable(quality)
+    good_total = np.concatenate((np.zeros((1, usable.shape[1])), np.cumsum(usable, axis=0)))
+    lo = np.searchsorted(window_starts, starts, side='left')
+    hi = np.searchsorted(window_starts, stops, side='left')
+    empty = hi <= lo
+    lo[empty] = np.maximum(hi[empty] - 1, 0)
+    hi[empty] = lo[empty] + 1
+    hi = np.minimum(hi, len(window_starts))
+    count = np.maximum(hi - lo, 1)[:, None]
+    share = (good_total[hi] - good_total[lo]) / count
+    return choose_mode(share >= MIN_GOOD_SHARE)
+
+
+def quality_summary(quality, mode, modes=None):
+    """JSON-friendly per-channel summary and flags for a recording.
+
+    flags lists "<channel>_flat", "<channel>_saturated", "<channel>_noisy",
+    "<channel>_irregular" and "<channel>_unused" for every channel and
+    condition that applies. modes, the mode of every window, are included
+    as "window_modes" when given.
+    """
+    usable = channel_usable(quality)
+    channels, flags = {}, []
+    for c, name in enumerate(CHANNELS[:quality["good"].shape[1]]):
+        n_windows = len(quality["good"])
+        flat_share = float(quality["flat"][:, c].mean()) if n_windows else 1.0
+        saturation = float(quality["saturation"][:, c].mean()) if n_windows else 0.0
+        snr = quality["snr_db"][:, c]
+        snr = snr[np.isfinite(snr)]
+        snr_db = float(np.median(snr)) if snr.size else float("nan")
+        channels[name] = {"usable": bool(usable[c]), "flat_share": flat_share, "saturation": saturation,
+                          "snr_db": snr_db}
+        irregular = False
+        if "regularity" in quality:
+            regularity = quality["regularity"][:, c]
+            regularity = regularity[np.isfinite(regularity)]
+            channels[name]["regularity"] = float(np.median(regularity)) if regularity.size else float("nan")
+            irregular = bool(regularity.size) and channels[name]["regularity"] > MAX_IRREGULARITY
+        if flat_share >= MIN_GOOD_SHARE:
+            flags.append(f"{name}_flat")
+        if saturation > SATURATION_SHARE and flat_share < MIN_GOOD_SHARE:
+            flags.append(f"{name}_saturated")
+        if snr.size and snr_db < MIN_SNR_DB:
+            flags.append(f"{name}_noisy")
+        if irregular:
+            flags.append(f"{name}_irregular")
+        if mode not in (MODE_FUSED, name):
+            flags.append(f"{name}_unused")
+    summary = {"mode": mode, "windows": len(quality["good"]), "channels": channels, "flags": flags}
+    if modes is not None:
+        summary["window_modes"] = [str(m) for m in modes]
+    return summary
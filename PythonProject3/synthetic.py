@@ -0,0 +1,68 @@
+"""Synthetic two-channel breathing recordings for benchmarks and replay.
+
+ADC1 imitates the pressure sensor (rises with each breath) and ADC2 the strain
+gauge (falls with each breath, which is why the pipeline inverts it). Both are
+12-bit integers at the STM32 sample rate, like a real capture.
+"""
+import numpy as np
+
+SAMPLE_RATE = 650  # Hz
+ADC_MAX = 4095
+
+
+def breathing_signal(duration, sample_rate=SAMPLE_RATE, bpm=15.0, bpm_jitter=0.05, noise=15.0,
+                     drift=100.0, dropouts=0.0, dropout_length=2.0, missed=0.0, seed=None):
+    """Generate `duration` seconds of (adc1, adc2) samples.
+
+    bpm_jitter is the relative spread of individual breath intervals, noise
+    the standard deviation of white sensor noise in ADC counts and drift the
+    amplitude of a slow baseline wander (counts). dropouts is the number of
+    sensor dropouts per hour, each a flat stretch of dropout_length seconds
+    holding the last reading. missed is the fraction of breaths whose strain
+    peak is too shallow to detect, which the ADC1 fusion has to recover.
+
+    Returns a dict with "samples" ((N, 2) uint16), "peak_times" (seconds of
+    every inhalation peak), "breaths" (their count) and "sample_rate".
+    """
+    rng = np.random.default_rng(seed)
+    n = int(round(duration * sample_rate))
+    period = 60.0 / bpm
+    # Breath boundaries with jittered intervals, then a phase in [0, 1) within each breath
+    count = int(duration / period * 2.5) + 2
+    intervals = period * np.clip(rng.normal(1.0, bpm_jitter, count), 0.5, 1.5)
+    edges = np.concatenate(([-rng.uniform(0, period)], intervals)).cumsum()
+    edges = edges[:np.searchsorted(edges, duration) + 1]
+    t = np.arange(n) / sample_rate
+    breath = np.searchsorted(edges, t, side='right') - 1
+    phase = (t - edges[breath]) / (edges[breath + 1] - edges[breath])
+    wave = -np.cos(2 * np.pi * phase)  # -1 at the start of a breath, +1 at the inhalation peak
+
+    strain = np.ones(len(edges) - 1)
+    strain[rng.random(strain.size) < missed] = 0.0
+    wander = drift * np.sin(2 * np.pi * t / 600 + rng.uniform(0, 2 * np.pi))
+    adc1 = 2700 + 250 * wave + wander + rng.normal(0, noise, n)
+    adc2 = 2000 - 900 * wave * strain[breath] - wander + rng.normal(0, noise, n)
+    samples = np.clip(np.rint(np.stack((adc1, adc2), axis=1)), 0, ADC_MAX).astype(np.uint16)
+
+    n_dropouts = rng.poisson(dropouts * duration / 3600) if dropouts else 0
+    length = int(dropout_length * sample_rate)
+    for start in rng.integers(1, max(2, n - length), n_dropouts):
+        samples[start:start + length] = samples[start - 1]
+
+    peak_times = (edges[:-1] + edges[1:]) / 2
+    peak_times = peak_times[(peak_times >= 0) & (peak_times < duration)]
+    return {"samples": samples, "peak_times": peak_times, "breaths": len(peak_times),
+            "sample_rate": sample_rate}
+
+
+def write_clean_text(filename, samples):
+    """Write samples in the cleaned "adc1 adc2" text format the scripts save."""
+    lines = np.char.add(np.char.add(samples[:, 0].astype(str), " "), samples[:, 1].astype(str))
+    with open(filename, 'w', newline='') as f:
+        f.write("\r\n".join(lines.tolist()))
+
+
+def write_raw_text(filename, samples):
+    """Write samples as the raw "Ca=... Cb=..." lines the STM32 sends."""
+    with open(filename, 'wb') as f:
+        f.write(b"".join(b"Ca=%d Cb=%d\r\n" % (a, b) for a, b in samples.tolist()))
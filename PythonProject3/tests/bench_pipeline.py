@@ -0,0 +1,122 @@
+"""Timing and accuracy of each pipeline stage on synthetic recordings, checked against a baseline.
+
+Run from the repository root:
+    python -m pytest PythonProject3/tests/bench_pipeline.py [--bench-sizes 30s,10m,1h] [--save-baseline]
+    python -m pytest PythonProject3/tests/bench_pipeline.py --bench-sizes 24h -k "ma_filter or find_peaks or eval"
+
+Every stage is timed with pytest-benchmark and compared with the baseline
+(conftest.Baseline), as is the breath count error. The text cases are
+skipped above TEXT_LIMIT unless --bench-text is given.
+"""
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from adc_loader import load_adc_data  # noqa: E402
+from breath_pipeline import evaluate_file, normalize, plateau_peaks  # noqa: E402
+from capture_format import write_capture  # noqa: E402
+from extract_clean import extract_and_clean  # noqa: E402
+from fusion import fuse  # noqa: E402
+from ma_filters import MA_filter  # noqa: E402
+from synthetic import breathing_signal, write_clean_text, write_raw_text  # noqa: E402
+
+TEXT_LIMIT = 2 * 3600  # seconds
+WINDOW_SIZE = 1200
+UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_size(size):
+    return float(size[:-1]) * UNITS[size[-1]] if size[-1] in UNITS else float(size)
+
+
+class Recording:
+    """One synthetic recording and the files and intermediate results the cases need."""
+
+    def __init__(self, size, workdir, text):
+        self.size = size
+        self.seconds = parse_size(size)
+        self.rounds = 5 if self.seconds <= 600 else 3 if self.seconds <= 3600 else 1
+        self.rec = breathing_signal(self.seconds, missed=0.05, dropouts=2, seed=0)
+        self.samples = self.rec["samples"]
+        self.text = text
+        self.clean = str(workdir / "clean.data")
+        self.raw = str(workdir / "raw.data")
+        self.binary = str(workdir / "capture.adcb")
+        write_capture(self.binary, self.samples)
+        if text:
+            write_clean_text(self.clean, self.samples)
+        self.normalized = normalize(MA_filter(self.samples, WINDOW_SIZE))
+        self.peaks = [plateau_peaks(self.normalized[:, 0]), plateau_peaks(-self.normalized[:, 1])]
+
+
+@pytest.fixture(scope="module")
+def recording(bench_size, tmp_path_factory, request):
+    seconds = parse_size(bench_size)
+    text = seconds <= TEXT_LIMIT or request.config.getoption("bench_text")
+    return Recording(bench_size, tmp_path_factory.mktemp(f"bench_{bench_size}"), text)
+
+
+def run(benchmark, recording, fn, **kwargs):
+    return benchmark.pedantic(fn, rounds=recording.rounds, iterations=1, **kwargs)
+
+
+def needs_text(recording):
+    if not recording.text:
+        pytest.skip(f"text cases skipped above {TEXT_LIMIT / 3600:g} h, --bench-text runs them")
+
+
+def test_extract_and_clean(benchmark, recording, baseline):
+    needs_text(recording)
+
+    def clean():
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_and_clean(recording.raw)
+
+    run(benchmark, recording, clean, setup=lambda: write_raw_text(recording.raw, recording.samples))
+    baseline.check_time(recording.size, "extract_and_clean", benchmark)
+
+
+def test_load_text(benchmark, recording, baseline):
+    needs_text(recording)
+    adc1, _ = run(benchmark, recording, load_adc_data, args=(recording.clean,))
+    assert len(adc1) == len(recording.samples)
+    baseline.check_time(recording.size, "load_text", benchmark)
+
+
+def test_load_binary(benchmark, recording, baseline):
+    total = run(benchmark, recording, lambda: np.asarray(load_adc_data(recording.binary)[0]).sum())
+    assert total == recording.samples[:, 0].sum()
+    baseline.check_time(recording.size, "load_binary", benchmark)
+
+
+def test_ma_filter(benchmark, recording, baseline):
+    run(benchmark, recording, MA_filter, args=(recording.samples, WINDOW_SIZE))
+    baseline.check_time(recording.size, "ma_filter", benchmark)
+
+
+def test_find_peaks(benchmark, recording, baseline):
+    normalized = recording.normalized
+    peaks = run(benchmark, recording, lambda: [plateau_peaks(normalized[:, 0]), plateau_peaks(-normalized[:, 1])])
+    assert all(np.array_equal(a, b) for a, b in zip(peaks, recording.peaks))
+    baseline.check_time(recording.size, "find_peaks", benchmark)
+
+
+def test_fusion(benchmark, recording, baseline):
+    run(benchmark, recording, fuse, args=tuple(recording.peaks))
+    baseline.check_time(recording.size, "fusion", benchmark)
+
+
+def test_eval(benchmark, recording, baseline):
+    run(benchmark, recording, evaluate_file, args=(recording.binary, WINDOW_SIZE))
+    baseline.check_time(recording.size, "eval", benchmark)
+
+
+def test_accuracy(recording, baseline):
+    detected = evaluate_file(recording.binary, WINDOW_SIZE)["breaths"]
+    true_breaths = recording.rec["breaths"]
+    baseline.check_accuracy(recording.size, {"true_breaths": true_breaths, "detected_breaths": detected,
+                                             "abs_error": abs(detected - true_breaths)})
@@ -0,0 +1,98 @@
+"""Shared test setup. The modules are flat scripts, so tests import them the way the scripts do.
+
+The bench_*.py files time the pipeline with pytest-benchmark and compare
+each stage with a saved baseline (see Baseline). The baseline lives in the
+user's cache directory, never in the source tree, and is machine specific:
+record one with --save-baseline before changing code.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(PROJECT_DIR), "data")
+CACHE_DIR = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+BASELINE = os.path.join(CACHE_DIR, "adc-breath", "bench_baseline.json")
+BENCH_SIZES = "30s,10m"
+TOLERANCE = 1.5
+MIN_SLACK = 0.002  # seconds; differences below this are timer noise, not regressions
+
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, "performance_assessment"))
+
+
+@pytest.fixture
+def data_dir():
+    """The labelled recordings under data/, skipping the test when they are not checked out."""
+    if not os.path.isdir(DATA_DIR):
+        pytest.skip("data/ is not available")
+    return DATA_DIR
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("baseline", "pipeline benchmarks (bench_*.py)")
+    group.addoption("--bench-sizes", default=BENCH_SIZES, help="comma separated durations such as 30s,10m,1h,24h")
+    group.addoption("--bench-text", action="store_true", help="also time the text cases above 2 h of signal")
+    group.addoption("--baseline", default=BASELINE, help=f"baseline file (default: {BASELINE})")
+    group.addoption("--save-baseline", action="store_true", help="write this run's results as the new baseline")
+    group.addoption("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown factor")
+
+
+def pytest_generate_tests(metafunc):
+    if "bench_size" in metafunc.fixturenames:
+        metafunc.parametrize("bench_size", metafunc.config.getoption("bench_sizes").split(","), scope="module")
+
+
+class Baseline:
+    """Per-size stage timings and breath count errors, compared with (or saved as) a JSON baseline.
+
+    A stage slower than tolerance times its baseline, and by more than
+    MIN_SLACK, or a breath count error larger than the baseline's fails the
+    test that measured it.
+    """
+
+    def __init__(self, path, tolerance, save):
+        self.path = path
+        self.tolerance = tolerance
+        self.save = save
+        self.reference = {}
+        if not save and os.path.exists(path):
+            with open(path) as f:
+                self.reference = json.load(f)
+        self.current = {}
+
+    def _row(self, size):
+        return self.current.setdefault(size, {"seconds": {}, "accuracy": None})
+
+    def check_time(self, size, case, benchmark):
+        if benchmark.stats is None:  # --benchmark-disable ran it once untimed
+            return
+        seconds = benchmark.stats.stats.min
+        self._row(size)["seconds"][case] = seconds
+        reference = self.reference.get(size, {}).get("seconds", {}).get(case)
+        if reference and seconds > reference * self.tolerance and seconds - reference > MIN_SLACK:
+            pytest.fail(f"{size} {case}: {seconds * 1000:.1f} ms vs baseline {reference * 1000:.1f} ms")
+
+    def check_accuracy(self, size, accuracy):
+        self._row(size)["accuracy"] = accuracy
+        reference = self.reference.get(size, {}).get("accuracy")
+        if reference and accuracy["abs_error"] > reference["abs_error"]:
+            pytest.fail(f"{size} breath count error {accuracy['abs_error']} vs baseline {reference['abs_error']}")
+
+    def write(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.current, f, indent=2)
+            f.write("\n")
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    config = request.config
+    result = Baseline(config.getoption("baseline"), config.getoption("tolerance"), config.getoption("save_baseline"))
+    yield result
+    if result.save and result.current:
+        result.write()
+        print(f"\nBaseline saved to {result.path}")
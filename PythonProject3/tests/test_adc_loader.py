@@ -0,0 +1,58 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from adc_loader import iter_adc_chunks, load_adc_array, load_adc_data
+
+
+def load_adc_data_lists(filename):
+    """The loader every script used to carry a copy of."""
+    adc1 = []
+    adc2 = []
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) == 2:
+                try:
+                    val1 = int(parts[0])
+                    val2 = int(parts[1])
+                    adc1.append(val1)
+                    adc2.append(val2)
+                except ValueError:
+                    continue  # skip malformed lines
+    return adc1, adc2
+
+
+def test_matches_the_list_loader_on_recordings(data_dir):
+    files = sorted(glob.glob(os.path.join(data_dir, "**", "*.data"), recursive=True))
+    assert files
+    for filename in files:
+        adc1, adc2 = load_adc_data(filename)
+        assert (adc1.tolist(), adc2.tolist()) == load_adc_data_lists(filename), filename
+
+
+@pytest.mark.parametrize("text", [
+    b"1 2\r\n3 4\r\n",
+    b"1 2\n\n 3\t4 \nfoo bar\n5\n6 7 8\n9 10",  # blank, malformed and short lines, no final newline
+    b"-1 +2\n3 4\r5 6\n",  # signs and a bare carriage return take the line parser
+    b"70000 1\n2 3\n",  # beyond uint16
+    b"",
+])
+def test_matches_the_list_loader_on_odd_text(tmp_path, text):
+    path = tmp_path / "odd.data"
+    path.write_bytes(text)
+    adc1, adc2 = load_adc_data(str(path))
+    assert (adc1.tolist(), adc2.tolist()) == load_adc_data_lists(str(path))
+
+
+def test_chunks_join_to_the_whole_file(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 4096, size=(5000, 2))
+    path = tmp_path / "long.data"
+    path.write_text("".join(f"{a} {b}\n" for a, b in samples.tolist()))
+    chunks = list(iter_adc_chunks(str(path), chunk_samples=333))
+    assert len(chunks) > 1
+    assert np.array_equal(np.concatenate(chunks), load_adc_array(str(path)))
+    assert np.array_equal(load_adc_array(str(path)), samples)
@@ -0,0 +1,25 @@
+import os
+
+from batch_eval import find_recordings
+from capture_format import write_capture
+from convert_captures import capture_labels
+from synthetic import breathing_signal
+
+
+def test_converted_recordings_count_once(tmp_path):
+    samples = breathing_signal(5, seed=0)["samples"]
+    labelled = tmp_path / "sport" / "10"
+    labelled.mkdir(parents=True)
+    for directory in (labelled, tmp_path):
+        with open(directory / "adc_sport10_1.data", "w") as f:
+            f.writelines(f"{a} {b}\n" for a, b in samples)
+        write_capture(str(directory / "adc_sport10_1.adcb"), samples)
+    recordings = find_recordings(str(tmp_path))
+    assert recordings == [(os.path.join(str(tmp_path), "adc_sport10_1.adcb"), "sport", 10),
+                          (os.path.join(str(labelled), "adc_sport10_1.adcb"), "sport", 10)]
+
+
+def test_capture_labels_accept_every_recording_format():
+    for ext in (".data", ".adcb", ".adcs"):
+        assert capture_labels(f"/tmp/adc_deep12_3{ext}") == ("deep", 12)
+    assert capture_labels("adc_deep12_3.txt") == ("", 0)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from breath_pipeline import evaluate_file, evaluate_samples
+from breath_rate_series import BPM, CONFIDENCE, file_rate_series
+from breath_stream import StreamingBreathRate
+from capture_format import write_capture
+from synthetic import breathing_signal
+
+# (channel, value) overwritten for the whole recording: flat, saturated, or nothing
+DAMAGE = {"intact": [], "adc2_flat": [(1, 0)], "adc2_saturated": [(1, 4095)], "adc1_flat": [(0, 0)],
+          "adc1_saturated": [(0, 4095)], "both_flat": [(0, 0), (1, 0)]}
+
+
+@pytest.fixture(params=sorted(DAMAGE))
+def recording(request, tmp_path):
+    samples = breathing_signal(120, bpm=15, seed=4)["samples"]
+    for channel, value in DAMAGE[request.param]:
+        samples[:, channel] = value
+    path = str(tmp_path / f"{request.param}.adcb")
+    write_capture(path, samples)
+    return request.param, path, samples
+
+
+@pytest.mark.parametrize("live", [True, False])
+def test_finalize_matches_evaluate_file(recording, live):
+    name, path, samples = recording
+    expected = evaluate_file(path)
+    estimator = StreamingBreathRate(live=live)
+    for i in range(0, len(samples), 997):
+        estimator.feed(samples[i:i + 997])
+    result = estimator.finalize()
+    assert result["mode"] == expected["mode"]
+    assert result["breaths"] == expected["breaths"]
+    assert result["peaks"] == list(expected["peaks"])
+    if name == "both_flat":
+        assert result["mode"] == "reject" and result["breaths"] == 0
+    else:
+        assert 25 <= result["breaths"] <= 35
+
+
+def test_rate_series_uses_the_usable_channel(recording):
+    name, path, _ = recording
+    series, modes = file_rate_series(path, span=60, hop=10)
+    if name == "both_flat":
+        assert np.isnan(series[:, BPM]).all() and (modes == "reject").all()
+        return
+    assert not (modes == "reject").any()
+    assert np.all(np.abs(series[:, BPM] - 15) < 2)
+    assert np.all(series[:, CONFIDENCE] > 0.5)
+
+
+def test_live_fusion_uses_the_fusion_settings():
+    samples = breathing_signal(180, bpm=15, missed=0.2, seed=5)["samples"]
+    counts = {}
+    for abnormal_gap in (1.5, 10.0):
+        estimator = StreamingBreathRate(abnormal_gap=abnormal_gap)
+        for i in range(0, len(samples), 997):
+            estimator.feed(samples[i:i + 997])
+        counts[abnormal_gap] = estimator.matched_from_adc1 + estimator.interpolated
+        result = estimator.finalize()
+        expected = evaluate_samples(samples, abnormal_gap=abnormal_gap)
+        assert result["peaks"] == list(expected["peaks"])
+    assert counts[1.5] > 0 and counts[10.0] == 0
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from adc_loader import load_adc_array, read_header
+from batch_eval import find_recordings
+from capture_format import (HEADER_SIZE, CaptureWriter, effective_sample_rate, is_capture_file, open_capture,
+                            write_capture)
+from convert_captures import convert_text_capture
+
+
+def test_write_and_open_round_trip(tmp_path):
+    samples = np.random.default_rng(0).integers(0, 4096, size=(1000, 2)).astype(np.uint16)
+    path = str(tmp_path / "adc_sport3_1.adcb")
+    written = write_capture(path, samples, sample_rate=640.0, breath_type="sport", breath_cycle=3, start_time=12.5)
+    header, loaded = open_capture(path)
+    assert header == written
+    assert isinstance(loaded, np.memmap) and np.array_equal(loaded, samples)
+    assert is_capture_file(path) and read_header(path) == header
+    assert effective_sample_rate(header) == 640.0
+
+
+def test_writer_matches_write_capture_and_ignores_a_torn_row(tmp_path):
+    samples = np.random.default_rng(1).integers(0, 4096, size=(999, 2))
+    path = str(tmp_path / "live.adcb")
+    with CaptureWriter(path, start_time=0.0) as writer:
+        for i in range(0, len(samples), 100):
+            writer.write(samples[i:i + 100])
+        writer.update_header(measured_rate=648.5, jitter=0.001, stalls=2)
+    header, loaded = open_capture(path)
+    assert np.array_equal(loaded, samples)
+    assert (header["measured_rate"], header["stalls"]) == (648.5, 2)
+    assert effective_sample_rate(header) == 648.5
+    with open(path, "ab") as f:
+        f.write(b"\x01")  # half a sample from a crash mid-write
+    assert np.array_equal(open_capture(path)[1], samples)
+
+
+def test_empty_capture(tmp_path):
+    path = str(tmp_path / "empty.adcb")
+    write_capture(path, np.empty((0, 2), dtype=np.uint16))
+    assert os.path.getsize(path) == HEADER_SIZE
+    assert open_capture(path)[1].shape == (0, 2)
+
+
+@pytest.mark.parametrize("samples", [np.array([1, 2]), np.array([[-1, 2]]), np.array([[70000, 2]])])
+def test_write_rejects_samples_it_cannot_store(tmp_path, samples):
+    with pytest.raises(ValueError):
+        write_capture(str(tmp_path / "bad.adcb"), samples)
+
+
+def test_converted_recordings_load_the_same(tmp_path, data_dir):
+    for path, _, _ in find_recordings(data_dir):
+        if not path.endswith(".data"):
+            continue
+        converted = convert_text_capture(path, str(tmp_path / os.path.basename(path).replace(".data", ".adcb")))
+        assert np.array_equal(load_adc_array(converted), load_adc_array(path)), path
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pytest
+
+serial = pytest.importorskip("serial")
+
+from capture_format import write_capture  # noqa: E402
+from capture_server import READ_TIMEOUT, CaptureServer, CaptureSession  # noqa: E402
+from replay import encode_frames, open_serial  # noqa: E402
+from session_store import SessionReader, SessionWriter  # noqa: E402
+from synthetic import breathing_signal  # noqa: E402
+
+TIMEOUT = 20.0  # seconds before a run counts as hung
+
+
+def samples(seconds, seed):
+    return breathing_signal(seconds, seed=seed)["samples"]
+
+
+def replay_session(tmp_path, name, rows):
+    path = str(tmp_path / f"{name}.adcb")
+    write_capture(path, rows)
+    return CaptureSession(name, open_serial("replay:" + path, 115200, READ_TIMEOUT, speed=0))
+
+
+def run(server, duration=None):
+    asyncio.run(asyncio.wait_for(server.run(duration), TIMEOUT))
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs pseudo-terminals")
+def test_error_and_eof_sessions_end_the_run(tmp_path):
+    a, b = samples(5, 0), samples(3, 1)
+    master, slave = os.openpty()
+    failing = CaptureSession("unplugged", serial.Serial(os.ttyname(slave), timeout=READ_TIMEOUT))
+    os.close(slave)
+    os.write(master, encode_frames(a[:100]))
+    sessions = [replay_session(tmp_path, "a", a), failing, replay_session(tmp_path, "b", b)]
+    server = CaptureServer(sessions, http_port=None)
+
+    def unplug():
+        # Once the frames are read, closing the master makes the slave's reads fail like a pulled USB adapter
+        while failing.parser.frames < 100:
+            threading.Event().wait(0.01)
+        os.close(master)
+
+    threading.Thread(target=unplug, daemon=True).start()
+    try:
+        run(server)
+    finally:
+        for session in sessions:
+            session.close()
+    assert failing.error is not None and not failing.finished
+    assert failing.parser.frames == 100
+    assert sessions[0].finished and sessions[0].parser.frames == len(a)
+    assert sessions[2].finished and sessions[2].parser.frames == len(b)
+
+
+def test_sessions_store_every_frame_off_the_loop(tmp_path):
+    recordings = [samples(4, seed) for seed in range(3)]
+    sessions, feeders, store_threads = [], [], set()
+    for i, rows in enumerate(recordings):
+        port = serial.serial_for_url("loop://", timeout=READ_TIMEOUT)
+        # loop:// holds only a few KiB, so the frames go in from a thread while the server reads
+        feeders.append(threading.Thread(target=port.write, args=(encode_frames(rows),), daemon=True))
+        writer = SessionWriter(str(tmp_path / f"s{i}.adcs"))
+        write = writer.write
+
+        def tracked(rows, write=write):
+            store_threads.add(threading.current_thread().name)
+            write(rows)
+
+        writer.write = tracked
+        sessions.append(CaptureSession(f"s{i}", port, writer))
+    server = CaptureServer(sessions, http_port=None)
+    loop_thread = threading.current_thread().name
+
+    async def capture():
+        task = asyncio.create_task(server.run())
+        for feeder in feeders:
+            feeder.start()
+        while any(s.parser.frames < len(rows) for s, rows in zip(sessions, recordings)):
+            await asyncio.sleep(0.01)
+        server.stop()
+        await task
+
+    try:
+        asyncio.run(asyncio.wait_for(capture(), TIMEOUT))
+    finally:
+        for session in sessions:
+            session.close()
+    assert store_threads and loop_thread not in store_threads
+    for i, rows in enumerate(recordings):
+        with SessionReader(str(tmp_path / f"s{i}.adcs")) as reader:
+            np.testing.assert_array_equal(reader.read(), rows)
+
+
+def test_session_clock_counts_only_parsed_frames():
+    rows = samples(3, 2)
+    lines = encode_frames(rows).splitlines(keepends=True)
+    for i in range(0, len(lines), 4):
+        lines[i] = lines[i].replace(b"Cb", b"\nCb")  # a quarter of the frames split by a stray newline
+    session = CaptureSession("a", serial.serial_for_url("loop://", timeout=READ_TIMEOUT))
+    try:
+        for k in range(0, len(lines), 20):
+            session.feed(b"".join(lines[k:k + 20]), received=k / 20 * 0.02)
+    finally:
+        session.close()
+    assert session.parser.frames == session.clock.frames == len(rows) - len(range(0, len(rows), 4))
+    assert session.clock.rate == pytest.approx(15 / 0.02, rel=0.01)
+
+
+def test_http_port_zero_binds_a_real_port():
+    session = CaptureSession("a", serial.serial_for_url("loop://", timeout=READ_TIMEOUT))
+    server = CaptureServer([session], http_port=0)
+
+    async def query():
+        await server.start_http()
+        assert server.http_port != 0
+        task = asyncio.create_task(server.run())
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.http_port)
+        writer.write(b"GET /sessions/a HTTP/1.0\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        server.stop()
+        await task
+        return response
+
+    try:
+        response = asyncio.run(asyncio.wait_for(query(), TIMEOUT))
+    finally:
+        session.close()
+    assert response.startswith(b"HTTP/1.0 200 OK")
+    assert b'"name": "a"' in response
@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+import pytest
+
+from batch_eval import find_recordings
+from breath_pipeline import evaluate_file, evaluate_file_chunked
+from capture_format import write_capture
+from synthetic import breathing_signal
+
+# (window_size, prominence, distance)
+SETTINGS = [(1200, 0.1, 1000), (250, 0.3, 500), (500, 0.1, 77)]
+
+
+def comparable(result):
+    return json.dumps({k: v for k, v in result.items() if not k.endswith("_normalized")}, default=int)
+
+
+def assert_same(path, chunk_sizes):
+    for window_size, prominence, distance in SETTINGS:
+        for adaptive in (True, False):
+            kwargs = dict(prominence=prominence, distance=distance, adaptive=adaptive)
+            expected = comparable(evaluate_file(path, window_size, **kwargs))
+            for chunk_samples in chunk_sizes:
+                got = evaluate_file_chunked(path, window_size, chunk_samples=chunk_samples, **kwargs)
+                assert comparable(got) == expected, (path, window_size, adaptive, chunk_samples)
+
+
+def test_chunked_matches_in_memory_on_recordings(data_dir):
+    for path, _, _ in find_recordings(data_dir):
+        assert_same(path, (997, 4096))
+
+
+@pytest.mark.parametrize("case", ["intact", "dropouts", "missed", "adc1_flat", "adc2_flat"])
+def test_chunked_matches_in_memory_on_synthetic(tmp_path, case):
+    options = {"dropouts": dict(dropouts=300, dropout_length=3.0), "missed": dict(missed=0.3)}.get(case, {})
+    samples = breathing_signal(120, seed=3, **options)["samples"]
+    if case.endswith("_flat"):
+        samples[:, int(case[3]) - 1] = 2048
+    path = str(tmp_path / "s.adcb")
+    write_capture(path, samples)
+    # Chunks far shorter than a breath, so peaks and flat stretches straddle chunk boundaries
+    assert_same(path, (97, 4096))
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from adc_loader import load_adc_array
+from batch_eval import find_recordings
+from breath_pipeline import (SAMPLE_RATE, decimate_signal, decimated_peaks, decimation_factor, evaluate_samples,
+                             normalize, plateau_peaks)
+from ma_filters import MA_filter
+
+
+def synthetic_channels(n, rng):
+    """Two anti-phase breathing signals at 12-20 bpm with sensor noise, already filtered and normalised."""
+    t = np.arange(n) / SAMPLE_RATE
+    bpm = 16 + 4 * np.sin(2 * np.pi * t / 900)
+    phase = 2 * np.pi * np.cumsum(bpm / 60) / SAMPLE_RATE
+    samples = np.stack((3000 + 300 * np.sin(phase), 3000 - 300 * np.sin(phase)), axis=1)
+    samples = (samples + rng.normal(0, 20, samples.shape)).astype(np.uint16)
+    normalized = normalize(MA_filter(samples, 1200))
+    normalized[:, 1] *= -1
+    return normalized
+
+
+def test_decimation_factor_keeps_the_target_rate():
+    assert decimation_factor(650, 25) == 26
+    assert decimation_factor(650, 10) == 65
+    assert decimation_factor(650, 1000) == 1
+
+
+def test_decimated_signal_lines_up_with_the_input():
+    signals = synthetic_channels(SAMPLE_RATE * 120, np.random.default_rng(0))
+    reduced = decimate_signal(signals, 26)
+    assert reduced.shape == (-(-len(signals) // 26), 2)
+    assert np.abs(reduced - signals[::26]).max() < 0.05
+
+
+@pytest.mark.parametrize("factor", [26, 65])
+def test_decimated_peaks_match_the_full_rate(factor):
+    signals = synthetic_channels(SAMPLE_RATE * 600, np.random.default_rng(1))
+    for full, reduced in zip((plateau_peaks(signals[:, c]) for c in range(2)), decimated_peaks(signals, factor)):
+        assert len(reduced) == len(full)
+        assert np.abs(np.array(reduced) - full).max() <= factor
+
+
+def test_decimated_counts_stay_close_on_recordings(data_dir):
+    counts = []
+    for path, _, _ in find_recordings(data_dir):
+        samples = load_adc_array(path)
+        counts.append((evaluate_samples(samples)["breaths"], evaluate_samples(samples, decimate=26)["breaths"]))
+    full, reduced = np.array(counts).T
+    assert np.abs(reduced - full).max() <= 2
+    assert np.mean(reduced == full) >= 0.75
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from frame_parser import MAX_FRAME_BYTES, FrameParser
+
+
+def make_stream(n_frames):
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 4096, size=(n_frames, 2))
+    return values, b"".join(b"Ca=%d Cb=%d\r\n" % (a, b) for a, b in values.tolist())
+
+
+@pytest.mark.parametrize("read_size", [1, 14, 256, 4096, 65536])
+def test_any_read_size_gives_every_frame(read_size):
+    values, stream = make_stream(2000)
+    parser = FrameParser()
+    chunks = [parser.feed(stream[i:i + read_size]) for i in range(0, len(stream), read_size)]
+    assert np.array_equal(np.concatenate(chunks), values)
+    stats = parser.stats()
+    assert stats["frames"] == len(values) and stats["bad_frames"] == 0 and stats["pending_bytes"] == 0
+
+
+def test_ends_mark_each_frame_in_its_read():
+    values, stream = make_stream(50)
+    parser = FrameParser()
+    frames, ends = parser.feed(stream[:100], ends=True)
+    assert ends.tolist() == [i + 1 for i in range(100) if stream[i:i + 1] == b"\n"]
+    rest, rest_ends = parser.feed(stream[100:], ends=True)
+    assert np.array_equal(np.concatenate((frames, rest)), values)
+    assert rest_ends[-1] == len(stream) - 100
+
+
+def test_garbage_and_bad_frames_are_skipped():
+    parser = FrameParser()
+    frames = parser.feed(b"xxCa=1 Cb=2\r\nCa=3 Cb=\r\nCa=99999 Cb=4\r\nCa=5 Cb=6\n")
+    assert frames.tolist() == [[1, 2], [5, 6]]
+    stats = parser.stats()
+    assert stats["bad_frames"] == 1 and stats["out_of_range"] == 1
+
+
+def test_overflowing_tail_keeps_a_frame_started_after_the_garbage():
+    parser = FrameParser()
+    garbage = b"#" * (MAX_FRAME_BYTES + 10)
+    assert parser.feed(garbage + b"Ca=12 C").size == 0
+    assert parser.stats()["pending_bytes"] == len(b"Ca=12 C")
+    assert parser.feed(b"b=34\r\n").tolist() == [[12, 34]]
+    assert parser.stats()["skipped_bytes"] == len(garbage)
+
+
+def test_overflowing_tail_without_a_frame_start_is_dropped():
+    parser = FrameParser()
+    parser.feed(b"Ca=" + b"7" * (MAX_FRAME_BYTES + 10))
+    assert parser.stats()["pending_bytes"] == 0
+    assert parser.feed(b"\r\nCa=1 Cb=2\r\n").tolist() == [[1, 2]]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from batch_eval import find_recordings
+from breath_pipeline import WINDOW_SIZE, evaluate_file
+from fusion import SOURCE_ADC1, SOURCE_INTERPOLATED, SOURCE_ORIGINAL, fuse, fuse_peaks, has_abnormal_gap
+
+BREATH_PERIOD = 3 * 650  # samples between synthetic breaths
+
+
+def find_match_from_adc1(plateau_mids1, cur_adc2_peak, acceptable_dist):
+    for i in range(len(plateau_mids1)):
+        if abs(plateau_mids1[i] - cur_adc2_peak) < acceptable_dist:
+            return plateau_mids1[i]
+    return None
+
+
+def insert_abnormal(data, gap):
+    if not data:
+        return []
+    result = [data[0]]
+    for prev, curr in zip(data, data[1:]):
+        if abs(curr - prev) > gap:
+            result.append("abnormal")
+        result.append(curr)
+    return result
+
+
+def fuse_peaks_lists(plateau_mids1, plateau_mids2):
+    """The fusion loop eval_data used to run inline."""
+    median_distance_peak_2 = np.median(sorted(np.diff(plateau_mids2)))
+    iqr_acceptable = median_distance_peak_2/2
+    acceptable_distance = median_distance_peak_2 + iqr_acceptable
+    final_peak_index = insert_abnormal(plateau_mids2, acceptable_distance)
+    for i in range(len(final_peak_index)):
+        if final_peak_index[i] == "abnormal":
+            front = final_peak_index[i-1]
+            back = final_peak_index[i+1]
+            middle = (front + back)/2
+            adc1_match = find_match_from_adc1(plateau_mids1, middle, iqr_acceptable)
+            if adc1_match is not None:
+                final_peak_index[i] = adc1_match
+            else:
+                final_peak_index[i] = int(middle)
+    return final_peak_index
+
+
+def test_matches_the_list_fusion_on_recordings(data_dir):
+    for window_size in (WINDOW_SIZE, 500, 250):
+        for path, _, _ in find_recordings(data_dir):
+            result = evaluate_file(path, window_size, adaptive=False)  # both channels' peaks
+            expected = fuse_peaks_lists(result["plateau_mids1"], result["plateau_mids2"])
+            assert fuse_peaks(result["plateau_mids1"], result["plateau_mids2"]) == expected, (path, window_size)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_the_list_fusion_on_synthetic_peaks(seed):
+    rng = np.random.default_rng(seed)
+    n = 2000
+    truth = np.cumsum(rng.normal(BREATH_PERIOD, BREATH_PERIOD * 0.05, n)).astype(np.int64)
+    mids2 = truth[rng.random(n) > 0.05].tolist()
+    mids1 = np.sort((truth + rng.integers(-100, 100, n))[rng.random(n) > 0.2]).tolist()
+    assert fuse_peaks(mids1, mids2) == fuse_peaks_lists(mids1, mids2)
+
+
+def test_sources_say_where_each_peak_came_from():
+    mids2 = [0, 100, 200, 400, 500, 700, 800]
+    fused = fuse([290, 660], mids2)  # 660 is too far from 600
+    assert fused.index.tolist() == [0, 100, 200, 290, 400, 500, 600, 700, 800]
+    assert fused.source.tolist() == [SOURCE_ORIGINAL] * 3 + [SOURCE_ADC1] + [SOURCE_ORIGINAL] * 2 + \
+        [SOURCE_INTERPOLATED] + [SOURCE_ORIGINAL] * 2
+    assert has_abnormal_gap(mids2) and not has_abnormal_gap([0, 100, 200])
+
+
+@pytest.mark.parametrize("mids2", [[], [5]])
+def test_too_few_adc2_peaks_pass_through(mids2):
+    assert fuse([1, 2, 3], mids2).index.tolist() == mids2
+    assert not has_abnormal_gap(mids2)
@@ -0,0 +1,66 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from breath_pipeline import evaluate_samples
+from metrics import MetricsRegistry
+from synthetic import breathing_signal
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+    with registry.stage("ma_filter", 100) as timer:
+        timer.output(np.zeros(10))
+    registry.gauge("backlog", 5)
+    assert registry.snapshot() == {"stages": {}, "gauges": {}}
+
+
+def test_stages_and_gauges_accumulate():
+    registry = MetricsRegistry(enabled=True)
+    for samples in (100, 300):
+        with registry.stage("ma_filter", samples) as timer:
+            timer.output(np.zeros(samples))
+    with registry.stage("find_peaks") as timer:
+        timer.count(50)
+    for value in (3, 1, 8):
+        registry.gauge("backlog", value)
+    snap = registry.snapshot()
+    ma = snap["stages"]["ma_filter"]
+    assert (ma["calls"], ma["samples"], ma["bytes"]) == (2, 400, 400 * 8)
+    assert ma["min_s"] <= ma["mean_s"] <= ma["max_s"]
+    assert snap["stages"]["find_peaks"]["samples"] == 50
+    assert snap["gauges"]["backlog"] == {"count": 3, "last": 8, "min": 1, "max": 8, "total": 12, "mean": 4.0}
+
+    out = io.StringIO()
+    registry.dump(out, "json")
+    assert json.loads(out.getvalue()) == json.loads(json.dumps(snap))
+    table = registry.format_table()
+    assert "ma_filter" in table and "backlog" in table
+    registry.reset()
+    assert registry.snapshot() == {"stages": {}, "gauges": {}}
+
+
+def test_pipeline_reports_its_stages_without_changing_results(monkeypatch):
+    samples = breathing_signal(60, seed=2)["samples"]
+    expected = evaluate_samples(samples)
+    registry = MetricsRegistry(enabled=True)
+    monkeypatch.setattr("breath_pipeline.stage", registry.stage)
+    result = evaluate_samples(samples)
+    assert result["peaks"] == expected["peaks"]
+    assert {"quality", "ma_filter", "normalize", "find_peaks", "fusion"} <= set(registry.snapshot()["stages"])
+
+
+def test_environment_enables_the_exit_report(tmp_path):
+    out = tmp_path / "metrics.json"
+    env = dict(os.environ, ADC_METRICS="1", ADC_METRICS_OUT=str(out))
+    code = ("from breath_pipeline import evaluate_samples; from synthetic import breathing_signal; "
+            "evaluate_samples(breathing_signal(30, seed=0)['samples'])")
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, env=env, check=True)
+    report = json.loads(out.read_text())
+    assert report["stages"]["ma_filter"]["calls"] == 1
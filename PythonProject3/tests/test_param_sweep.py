@@ -0,0 +1,19 @@
+import pytest
+
+from batch_eval import find_recordings
+from breath_pipeline import default_config, evaluate_file
+from param_sweep import _sweep_task
+
+
+@pytest.mark.parametrize("window_size", [500, 1200])
+def test_counts_match_evaluate_file(data_dir, window_size):
+    config = default_config()
+    combos = [(factor, prominence, config["distance"], config["match_tolerance"], config["abnormal_gap"])
+              for factor in (1, 13) for prominence in (config["prominence"], 0.3)]
+    for path, _, _ in find_recordings(data_dir):
+        _, _, _, detected, _ = _sweep_task((path, window_size, combos))
+        for combo in combos:
+            factor, prominence, distance, match_tolerance, abnormal_gap = combo
+            expected = evaluate_file(path, window_size, prominence=prominence, distance=distance, decimate=factor,
+                                     match_tolerance=match_tolerance, abnormal_gap=abnormal_gap)["breaths"]
+            assert detected[combo] == expected, (path, combo)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+scipy_signal = pytest.importorskip("scipy.signal")
+
+from adc_loader import load_adc_array  # noqa: E402
+from batch_eval import find_recordings  # noqa: E402
+from breath_pipeline import PEAK_DISTANCE, PROMINENCE, filtered_stats, normalize  # noqa: E402
+from ma_filters import MA_filter  # noqa: E402
+from peak_finding import ChunkedPlateauPeaks, StreamingPeaks, find_plateau_peaks  # noqa: E402
+
+
+def signals(count, seed=0):
+    """Random smoothed walks rounded to a few levels, so equal-height peaks within distance are common."""
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        n = int(rng.integers(50, 3000))
+        x = np.convolve(rng.standard_normal(n + 20).cumsum(), np.ones(20) / 20, "valid")[:n]
+        x = np.round(x * rng.choice([1, 2, 5]))
+        if rng.random() < 0.3:
+            x[rng.choice(n, int(rng.integers(1, 6)), replace=False)] = np.nan
+        yield rng, x, float(rng.choice([0.0, 0.5, 1.0, 3.0])), int(rng.integers(1, 120))
+
+
+def scipy_peaks(x, prominence, distance):
+    _, props = scipy_signal.find_peaks(x, prominence=prominence, distance=distance, plateau_size=1)
+    return [int((l + r) // 2) for l, r in zip(props["left_edges"], props["right_edges"])]
+
+
+def test_signals_have_ties_that_matter():
+    ties = 0
+    for _, x, _, distance in signals(200):
+        peaks = scipy_peaks(x, 0, 1)
+        heights = x[peaks]
+        close = np.diff(peaks) < distance
+        ties += int(np.sum(close & (heights[1:] == heights[:-1])))
+    assert ties > 100
+
+
+def test_chunked_matches_find_peaks():
+    for rng, x, prominence, distance in signals(2000):
+        peaks = ChunkedPlateauPeaks(prominence, distance)
+        cuts = np.sort(rng.choice(np.arange(1, len(x)), int(rng.integers(0, 8)), replace=False))
+        for chunk in np.split(x, cuts):
+            peaks.extend(chunk)
+        assert peaks.finish() == scipy_peaks(x, prominence, distance)
+
+
+def test_streaming_select_matches_find_peaks():
+    for _, x, prominence, distance in signals(500, seed=1):
+        x = x[~np.isnan(x)]
+        peaks = StreamingPeaks(live=False)
+        for value in x:
+            peaks.push(value)
+        peaks.finish()
+        assert peaks.select(prominence, distance).tolist() == scipy_peaks(x, prominence, distance)
+
+
+def test_find_plateau_peaks_is_find_peaks():
+    for _, x, prominence, distance in signals(2000, seed=2):
+        assert find_plateau_peaks(x, prominence, distance) == scipy_peaks(x, prominence, distance)
+
+
+@pytest.mark.parametrize("window_size", [250, 500, 1200])
+def test_find_plateau_peaks_is_find_peaks_on_recordings(data_dir, window_size):
+    for path, _, _ in find_recordings(data_dir):
+        samples = load_adc_array(path)
+        normalized = normalize(MA_filter(samples, window_size), *filtered_stats(samples, window_size))
+        for x in (normalized[:, 0], -normalized[:, 1]):
+            assert find_plateau_peaks(x, PROMINENCE, PEAK_DISTANCE) == scipy_peaks(x, PROMINENCE, PEAK_DISTANCE)
+
+
+def edge_distance_peaks(x, prominence, distance):
+    """scipy_peaks with the distance filter measured between plateau edges, written out longhand."""
+    peaks, props = scipy_signal.find_peaks(x, plateau_size=1)
+    lefts, rights = props["left_edges"], props["right_edges"]
+    prominences = scipy_signal.peak_prominences(x, peaks)[0] if peaks.size else np.array([])
+    keep = np.ones(peaks.size, dtype=bool)
+    for j in np.argsort(x[peaks])[::-1]:
+        if keep[j]:
+            close = (lefts[j] - rights < distance) & (lefts - rights[j] < distance)
+            close[j] = False
+            keep &= ~close
+    keep &= prominences >= prominence
+    return [int((l + r) // 2) for l, r in zip(lefts[keep], rights[keep])]
+
+
+def test_edge_distance_keeps_wide_plateaus_apart():
+    x = np.zeros(100)
+    x[10:40] = 2  # midpoint 24, right edge 39
+    x[45:47] = 1  # midpoint 45, 21 after the first midpoint but 6 after its edge
+    x[80:82] = 1
+    assert find_plateau_peaks(x, 0, 20) == [24, 45, 80]
+    assert find_plateau_peaks(x, 0, 20, from_edges=True) == [24, 80]
+
+
+def test_edge_distance_matches_longhand():
+    for rng, x, prominence, distance in signals(1000, seed=3):
+        expected = edge_distance_peaks(x, prominence, distance)
+        assert find_plateau_peaks(x, prominence, distance, from_edges=True) == expected
+        peaks = ChunkedPlateauPeaks(prominence, distance, from_edges=True)
+        for chunk in np.array_split(x, int(rng.integers(1, 8))):
+            peaks.extend(chunk)
+        assert peaks.finish() == expected
+        if not np.isnan(x).any():
+            streaming = StreamingPeaks(live=False)
+            streaming.extend(x)
+            streaming.finish()
+            assert streaming.select(prominence, distance, from_edges=True).tolist() == expected
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from psychometric import DELTAS, PARAMS, fit_conditions, fit_responses, sigmoid
+
+
+@pytest.mark.parametrize("errors", [np.zeros(9), np.full(6, 30.0), np.array([-2.0, 2.0, 2.0])],
+                         ids=["all_exact", "all_beyond", "step"])
+def test_constant_responses_are_not_fitted(errors):
+    (result,), boot = fit_conditions({"c": errors}, replicates=200, workers=1)
+    assert not result["converged"]
+    assert all(np.isnan(result[name]) for name in PARAMS)
+    assert np.isnan(result["x0_lo"]) and np.isnan(result["x0_hi"])
+    assert result["failed"] == 1.0
+    assert np.isnan(boot["c"]).all()
+
+
+def test_unpinned_fit_fails():
+    # Only the foot of a curve centred far beyond the largest delta is observed
+    curves = np.array([sigmoid(DELTAS, 1.0, 40.0, 0.1, 0.0), sigmoid(DELTAS, 1.0, 4.0, 1.0, 0.0)])
+    params, converged = fit_responses(DELTAS, curves)
+    assert not converged[0] and np.isnan(params[0]).all()
+    assert converged[1] and abs(params[1, 1] - 4.0) < 1e-3
+
+
+def test_bootstrap_intervals_stay_near_the_deltas():
+    rng = np.random.default_rng(0)
+    errors = {"good": rng.normal(0, 3, 30), "few": np.array([0.0, 0.0, 1.0, 6.0, 9.0, 15.0, 25.0, 40.0])}
+    results, _ = fit_conditions(errors, replicates=500, workers=1)
+    good = next(r for r in results if r["condition"] == "good")
+    assert good["converged"] and good["failed"] < 0.1
+    span = DELTAS[-1] - DELTAS[0]
+    for result in results:
+        assert DELTAS[0] - span <= result["x0_lo"] <= result["x0_hi"] <= DELTAS[-1] + span
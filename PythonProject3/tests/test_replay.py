@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from breath_stream import StreamingBreathRate
+from capture_format import CaptureWriter, open_capture, write_capture
+from frame_parser import FrameParser
+from replay import ReplayFinished, ReplaySerial, encode_frames, open_serial, replay_ingest
+from synthetic import breathing_signal, write_clean_text
+
+
+@pytest.fixture
+def samples():
+    return breathing_signal(20, seed=6)["samples"]
+
+
+def read_all(ser, size=4096):
+    chunks = []
+    try:
+        while True:
+            chunks.append(ser.read(size))
+    except ReplayFinished:
+        return b"".join(chunks)
+
+
+@pytest.mark.parametrize("kind", ["binary", "text", "raw"])
+def test_unpaced_replay_gives_every_frame(tmp_path, samples, kind):
+    path = str(tmp_path / f"rec.{kind}")
+    if kind == "binary":
+        write_capture(path, samples)
+    elif kind == "text":
+        write_clean_text(path, samples)
+    else:
+        with open(path, "wb") as f:
+            f.write(encode_frames(samples))
+    ser = ReplaySerial(path, speed=None)
+    data = read_all(ser)
+    assert data == encode_frames(samples)
+    assert np.array_equal(FrameParser().feed(data), samples)
+    assert ser.frames_released == len(samples)
+
+
+def test_paced_replay_releases_frames_at_the_sample_rate(tmp_path, samples):
+    path = str(tmp_path / "rec.adcb")
+    write_capture(path, samples[:6500])
+    ser = open_serial("replay:" + path, 115200, 0.01, speed=100)
+    assert ser.in_waiting == 0
+    data = ser.read(5 * 1024)
+    assert 0 < len(data) and ser.frames_released < 6500
+    rest = read_all(ser)
+    assert data + rest == encode_frames(samples[:6500])
+
+
+def test_replay_ingest_stores_and_counts_what_was_recorded(tmp_path, samples):
+    path = str(tmp_path / "rec.adcb")
+    write_capture(path, samples)
+    out = str(tmp_path / "copy.adcb")
+    with CaptureWriter(out) as writer:
+        result = replay_ingest(ReplaySerial(path, speed=None), writer, poll=0.01)
+    assert result["error"] is None
+    assert (result["frames"], result["dropped_bytes"], result["bad_frames"]) == (len(samples), 0, 0)
+    assert np.array_equal(open_capture(out)[1], samples)
+    estimator = StreamingBreathRate()
+    estimator.feed(samples)
+    assert result["breaths"] == estimator.current()["breaths"]
@@ -0,0 +1,238 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+serial = pytest.importorskip("serial")
+
+from frame_parser import FrameSink  # noqa: E402
+from replay import encode_frames  # noqa: E402
+from serial_ingest import ByteRingBuffer, SerialIngest  # noqa: E402
+
+TIMEOUT = 10.0  # seconds any wait in these tests may take before it counts as a hang
+
+
+class BlockSink:
+    """File-like sink that keeps every block, optionally blocking until released."""
+
+    def __init__(self, gate=None):
+        self.blocks = []
+        self.flushes = 0
+        self.gate = gate
+
+    def write(self, block):
+        if self.gate is not None:
+            self.gate.wait(TIMEOUT)
+        self.blocks.append(bytes(block))
+        return len(block)
+
+    def flush(self):
+        self.flushes += 1
+
+    def data(self):
+        return b"".join(self.blocks)
+
+
+class FailingPort:
+    """A port that hands out data once and then fails like an unplugged adapter."""
+
+    def __init__(self, data):
+        self.data = data
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, size=1):
+        if not self.data:
+            raise OSError("device disconnected")
+        out, self.data = self.data[:size], self.data[size:]
+        return out
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def stream(n_bytes):
+    return bytes(i % 251 for i in range(n_bytes))
+
+
+def is_subsequence(kept, data):
+    """True if kept is data with some bytes left out and the rest in order."""
+    it = iter(data)
+    return all(byte in it for byte in kept)
+
+
+class SampleSink:
+    def __init__(self):
+        self.samples = []
+
+    def write(self, samples):
+        self.samples.append(samples)
+
+    def flush(self):
+        pass
+
+
+def corrupted_frames(n, seed=0):
+    """n frames with every fifth split in two by a stray newline; returns (bytes, frames that parse)."""
+    rows = np.random.default_rng(seed).integers(0, 4096, (n, 2)).astype(np.uint16)
+    lines = encode_frames(rows).splitlines(keepends=True)
+    bad = np.arange(n) % 5 == 4
+    for i in np.flatnonzero(bad):
+        lines[i] = lines[i].replace(b" ", b"\n", 1)
+    return b"".join(lines), rows[~bad]
+
+
+def test_frame_sink_clocks_only_parsed_frames():
+    data, good = corrupted_frames(2000)
+    sink = FrameSink(SampleSink())
+    # Reads of 37 bytes 10 ms apart, handed over in blocks that cut reads in two
+    reads = list(range(37, len(data), 37)) + [len(data)]
+    arrivals = [(end, i * 0.01) for i, end in enumerate(reads)]
+    start = 0
+    for stop in list(range(1000, len(data), 1000)) + [len(data)]:
+        block = [(end - start, t) for end, t in arrivals if start < end <= stop]
+        sink.write(data[start:stop], block)
+        start = stop
+    np.testing.assert_array_equal(np.concatenate(sink.writer.samples), good)
+    assert sink.clock.frames == len(good)
+    frames_per_second = len(good) / (len(data) / 37 * 0.01)
+    assert sink.clock.rate == pytest.approx(frames_per_second, rel=0.02)
+
+
+def test_ingest_rate_counts_only_parsed_frames():
+    port = serial.serial_for_url("loop://", timeout=0.01)
+    data, good = corrupted_frames(3000)
+    sink = FrameSink(SampleSink())
+    batches = [data[i:i + 2000] for i in range(0, len(data), 2000)]
+    interval = 1.5 / len(batches)
+
+    def feed():
+        start = time.monotonic()
+        for i, batch in enumerate(batches):
+            time.sleep(max(0.0, start + i * interval - time.monotonic()))
+            port.write(batch)
+
+    with SerialIngest(port, sink, block_size=1500) as ingest:
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        feeder.join(TIMEOUT)
+        wait_until(lambda: ingest.bytes_read == len(data))
+    assert ingest.clock is sink.clock
+    assert sink.parser.frames == len(good) and sink.clock.frames == len(good)
+    # Newlines arrive 1.5 times as fast as the frames that parse
+    assert sink.clock.rate == pytest.approx(len(good) / 1.5, rel=0.1)
+    port.close()
+
+
+def test_ring_buffer_wraps_in_order():
+    ring = ByteRingBuffer(16)
+    out = b""
+    for i in range(10):
+        chunk = bytes([i]) * 7
+        assert ring.write(chunk) == 7
+        out += ring.read(7)
+    assert out == b"".join(bytes([i]) * 7 for i in range(10))
+    assert len(ring) == 0
+
+
+def test_ring_buffer_counts_overruns():
+    ring = ByteRingBuffer(10)
+    assert ring.write(b"a" * 6) == 6
+    assert ring.write(b"b" * 6) == 4
+    assert ring.overruns == 1
+    assert ring.dropped_bytes == 2
+    assert ring.high_water == 10
+    assert ring.read(100) == b"a" * 6 + b"b" * 4
+
+
+def test_delivers_every_byte_in_order():
+    port = serial.serial_for_url("loop://", timeout=0.01)
+    data = stream(300_000)
+    sink = BlockSink()
+    with SerialIngest(port, sink, block_size=4096) as ingest:
+        for i in range(0, len(data), 10_000):
+            port.write(data[i:i + 10_000])
+        wait_until(lambda: ingest.bytes_read == len(data))
+    assert sink.data() == data
+    assert ingest.bytes_written == len(data)
+    assert max(len(block) for block in sink.blocks) <= 4096
+    assert ingest.stats()["overruns"] == 0
+    port.close()
+
+
+def test_overflow_is_counted_not_blocking():
+    port = serial.serial_for_url("loop://", timeout=0.01)
+    gate = threading.Event()
+    sink = BlockSink(gate)
+    data = stream(50_000)
+    ingest = SerialIngest(port, sink, capacity=8192, block_size=1024).start()
+    try:
+        port.write(data)
+        # The writer is stuck in the sink, so the reader must drop what does not fit and keep reading
+        wait_until(lambda: ingest.bytes_read == len(data))
+    finally:
+        gate.set()
+        ingest.stop()
+    stats = ingest.stats()
+    assert stats["overruns"] > 0
+    assert stats["bytes_written"] + stats["dropped_bytes"] == len(data)
+    assert len(sink.data()) == stats["bytes_written"]
+    assert is_subsequence(sink.data(), data)
+    port.close()
+
+
+def test_lossless_waits_for_space():
+    port = serial.serial_for_url("loop://", timeout=0.01)
+    data = stream(100_000)
+    sink = BlockSink()
+    with SerialIngest(port, sink, capacity=4096, block_size=1024, lossless=True) as ingest:
+        port.write(data)
+        wait_until(lambda: ingest.bytes_read == len(data))
+    assert sink.data() == data
+    assert ingest.stats()["dropped_bytes"] == 0
+    port.close()
+
+
+def test_stop_is_clean_without_data():
+    port = serial.serial_for_url("loop://", timeout=0.01)
+    sink = BlockSink()
+    ingest = SerialIngest(port, sink).start()
+    time.sleep(0.05)
+    ingest.stop()
+    assert not ingest._reader.is_alive()
+    assert not ingest._writer.is_alive()
+    assert not ingest.running()
+    assert sink.blocks == []
+    assert sink.flushes == 1
+    assert ingest.error is None
+    port.close()
+
+
+def test_stop_flushes_a_partial_block():
+    port = serial.serial_for_url("loop://", timeout=0.01)
+    sink = BlockSink()
+    ingest = SerialIngest(port, sink, block_size=1 << 16).start()
+    port.write(b"short")
+    wait_until(lambda: ingest.bytes_read == 5)
+    ingest.stop()
+    assert sink.data() == b"short"
+    assert sink.flushes == 1
+    port.close()
+
+
+def test_port_error_stops_and_keeps_data():
+    data = stream(5000)
+    sink = BlockSink()
+    ingest = SerialIngest(FailingPort(data), sink).start()
+    wait_until(lambda: not ingest.running())
+    ingest.stop()
+    assert isinstance(ingest.error, OSError)
+    assert sink.data() == data
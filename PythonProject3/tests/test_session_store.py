@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+from session_store import INDEX_SUFFIX, SessionReader, SessionWriter, recover_session
+from synthetic import breathing_signal
+
+CHUNK_ROWS = 6500
+
+
+def write_session(path, samples):
+    with SessionWriter(path, chunk_rows=CHUNK_ROWS) as writer:
+        for i in range(0, len(samples), 325):
+            writer.write(samples[i:i + 325])
+
+
+def corrupt(path, k):
+    """Flip a byte in the rows of chunk k."""
+    with SessionReader(path) as reader:
+        offset = int(reader.index["offset"][k]) + reader._head_size + 100
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+@pytest.fixture
+def session(tmp_path):
+    samples = breathing_signal(60, seed=0)["samples"]
+    path = str(tmp_path / "s.adcs")
+    write_session(path, samples)
+    return path, samples
+
+
+def test_reads_check_the_chunk_crc(session):
+    path, samples = session
+    corrupt(path, 2)
+    with SessionReader(path) as reader:
+        assert len(reader.index) == 6
+        np.testing.assert_array_equal(reader.read(0, 2 * CHUNK_ROWS), samples[:2 * CHUNK_ROWS])
+        with pytest.raises(ValueError, match="chunk 2"):
+            reader.read(2 * CHUNK_ROWS + 10, 2 * CHUNK_ROWS + 20)
+        with pytest.raises(ValueError, match="chunk 2"):
+            reader.read()
+
+
+@pytest.mark.parametrize("with_index", [True, False])
+def test_recover_keeps_the_chunks_before_a_corrupt_one(session, with_index):
+    path, samples = session
+    corrupt(path, 2)
+    if not with_index:
+        os.remove(path + INDEX_SUFFIX)
+    result = recover_session(path)
+    assert result["chunks"] == 2 and result["rows"] == 2 * CHUNK_ROWS
+    with SessionReader(path) as reader:
+        assert len(reader) == 2 * CHUNK_ROWS
+        np.testing.assert_array_equal(reader.read(), samples[:2 * CHUNK_ROWS])
+
+
+def test_corrupt_first_chunk_leaves_an_empty_session(session):
+    path, _ = session
+    corrupt(path, 0)
+    assert recover_session(path)["rows"] == 0
+    with SessionReader(path) as reader:
+        assert len(reader) == 0 and len(reader.read()) == 0
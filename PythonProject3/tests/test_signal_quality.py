@@ -0,0 +1,52 @@
+import numpy as np
+
+import signal_quality
+from breath_pipeline import evaluate_samples
+from signal_quality import (MAX_IRREGULARITY, MODE_ADC1, MODE_ADC2, MODE_FUSED, peak_regularity, window_modes,
+                            window_usable)
+from synthetic import SAMPLE_RATE, breathing_signal
+
+
+def quality_of(good, regularity):
+    good = np.asarray(good, dtype=bool)
+    return {"good": good, "start": np.arange(len(good)) * 100, "regularity": np.asarray(regularity, dtype=float)}
+
+
+def test_regularity_of_steady_and_doubled_peaks():
+    steady = np.arange(0, 1000, 50)
+    assert np.allclose(peak_regularity(steady, [0, 500]), 0.0)
+    # Extra peaks in the second window halve its gaps
+    doubled = np.concatenate((np.arange(0, 1500, 50), np.arange(1500, 2000, 25)))
+    regularity = peak_regularity(doubled, [0, 1500])
+    assert regularity[0] < MAX_IRREGULARITY < regularity[1]
+
+
+def test_regularity_leaves_out_abnormal_gaps_and_empty_windows():
+    peaks = [0, 50, 100, 150, 400, 450, 500]
+    regularity = peak_regularity(peaks, [0, 200, 300, 400])
+    assert np.allclose(regularity[[0, 3]], 0.0)
+    assert np.isnan(regularity[1:3]).all()
+
+
+def test_irregular_channel_gives_way_only_to_a_regular_one():
+    quality = quality_of([[1, 1], [1, 1], [0, 1], [1, 1]], [[0.1, 0.1], [0.1, 0.9], [np.nan, 0.9], [0.9, 0.9]])
+    assert window_usable(quality).tolist() == [[True, True], [True, False], [False, True], [True, True]]
+    assert window_modes(quality).tolist() == [MODE_FUSED, MODE_ADC1, MODE_ADC2, MODE_FUSED]
+
+
+def test_irregular_stretch_is_counted_from_the_other_channel(monkeypatch):
+    errors = {}
+    for threshold in (MAX_IRREGULARITY, np.inf):
+        monkeypatch.setattr(signal_quality, "MAX_IRREGULARITY", threshold)
+        errors[threshold] = 0
+        for seed in range(3):
+            truth = breathing_signal(180, bpm=12, seed=seed)
+            samples = truth["samples"].copy()
+            # ADC2 picks up a faster, unsteady rhythm for 30 s
+            junk = breathing_signal(180, bpm=30, bpm_jitter=0.3, seed=seed + 100)["samples"]
+            samples[80 * SAMPLE_RATE:110 * SAMPLE_RATE, 1] = junk[80 * SAMPLE_RATE:110 * SAMPLE_RATE, 1]
+            result = evaluate_samples(samples)
+            errors[threshold] += abs(result["breaths"] - truth["breaths"])
+            if threshold == MAX_IRREGULARITY:
+                assert MODE_ADC1 in result["quality"]["window_modes"]
+    assert errors[MAX_IRREGULARITY] < errors[np.inf]